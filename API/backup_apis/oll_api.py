@@ -2,29 +2,46 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import requests
 import os
+import re
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ensemble import adaptive_vote, leading_vote
+from llm_cache import cached_completion
+from prompt_registry import FileRegistry
 
 app = Flask(__name__)
 CORS(app)
 
 # Ollama API settings
-OLLAMA_API_URL = "http://127.0.0.1:11434/api/generate"  # Ollama runs locally at this endpoint
+OLLAMA_API_URL = os.getenv('OLLAMA_API_URL', "http://127.0.0.1:11434/api/generate")  # Ollama runs locally at this endpoint
+OLLAMA_MODEL = "gemma:2b-instruct-q2_K"  # Use the model you have installed
+OLLAMA_TEMPERATURE = 0.7
+OLLAMA_MAX_SAMPLES = 5
+
+# Phrases the model uses for each class in its free-text answers
+CLASS_PATTERNS = [
+    ("Battery Drain", re.compile(r"battery drain", re.IGNORECASE)),
+    ("Denial of Service", re.compile(r"denial of service|\bdos\b", re.IGNORECASE)),
+    ("Grid Manipulation", re.compile(r"grid manipulation", re.IGNORECASE)),
+    ("Man-in-the-Middle", re.compile(r"man[ -]in[ -]the[ -]middle|\bmitm\b", re.IGNORECASE)),
+    ("Clean", re.compile(r"\bclean\b|no attack", re.IGNORECASE)),
+]
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'DER Data', 'Logs')
+EXAMPLE_PATHS = [
+    os.path.join(EXAMPLE_DIR, "BD", "bd_log_1.csv"),
+    os.path.join(EXAMPLE_DIR, "CLEAN", "clean_log_1.csv"),
+    os.path.join(EXAMPLE_DIR, "DOS", "dos_log_1.csv"),
+    os.path.join(EXAMPLE_DIR, "GM", "gm_log_1.csv"),
+    os.path.join(EXAMPLE_DIR, "MITM", "mitm_log_1.csv")
+]
 
 def read_examples():
-    bd_path = "../DER Data/Logs/BD/bd_log_1.csv"
-    clean_path = "../DER Data/Logs/CLEAN/clean_log_1.csv"
-    dos_path = "../DER Data/Logs/DOS/dos_log_1.csv"
-    gm_path = "../DER Data/Logs/GM/gm_log_1.csv"
-    mitm_path = "../DER Data/Logs/MITM/mitm_log_1.csv"
-    with open(bd_path, 'r') as file:
-        bd_string = file.read()
-    with open(clean_path, 'r') as file:
-        clean_string = file.read()
-    with open(dos_path, 'r') as file:
-        dos_string = file.read()
-    with open(gm_path, 'r') as file:
-        gm_string = file.read()
-    with open(mitm_path, 'r') as file:
-        mitm_string = file.read()
+    contents = []
+    for path in EXAMPLE_PATHS:
+        with open(path, 'r') as file:
+            contents.append(file.read())
+    bd_string, clean_string, dos_string, gm_string, mitm_string = contents
     return bd_string, clean_string, dos_string, gm_string, mitm_string
 
 def final_output(responses):
@@ -40,9 +57,8 @@ def final_output(responses):
     final_response = query_ollama_llm(prompt)
     return final_response
 
-def multi_query(prompt):
-    """Query the Ollama model multiple times"""
-    responses = []
+def render_in_context_prompt():
+    """Build the few-shot part of the prompt, which is the same for every query"""
     bd_string, clean_string, dos_string, gm_string, mitm_string = read_examples()
     in_context_prompt = "We are about to pass you log data from a DER system. We aim to determine in the system is under attack. Below are some examples of log data, both clean and under attack. Use the examples and example output to classify and describe the given log.\n"
     in_context_prompt += "Example of Battery Drain Attack File:\n"
@@ -62,25 +78,42 @@ def multi_query(prompt):
     in_context_prompt += "\n. Example Output for Clean: This is a clean log file that exhibits no attacks!\n"
     in_context_prompt += "OUTPUT FORMAT: Only respond with whether or not the file shows some type of attack, and a brief description of the type and reasoning.\n"
     in_context_prompt += "Classify this file:\n"
-    in_context_prompt += prompt
-    for i in range(5):
-        responses.append(query_ollama_llm(in_context_prompt))
-    return responses
+    return in_context_prompt
+
+# Rendered once at startup and re-rendered in the background when an example file changes
+in_context_examples = FileRegistry(EXAMPLE_PATHS, render_in_context_prompt)
+
+def classify_response(response):
+    """Label a free-text answer by the class it names first"""
+    matches = [(match.start(), label) for label, pattern in CLASS_PATTERNS
+               for match in [pattern.search(response)] if match]
+    return min(matches)[1] if matches else "Unknown"
 
-def query_ollama_llm(prompt):
-    """Query local Ollama API for text generation with proper formatting and debugging."""
+def multi_query(prompt):
+    """Query the Ollama model until enough answers agree (up to OLLAMA_MAX_SAMPLES)"""
+    in_context_prompt = in_context_examples.get() + prompt
+    return adaptive_vote(lambda sample: query_ollama_llm(in_context_prompt, sample=sample),
+                         classify_response, max_samples=OLLAMA_MAX_SAMPLES)
+
+def query_ollama_llm(prompt, sample=0):
+    """Query local Ollama API for text generation, reusing cached responses for identical requests."""
+    return cached_completion("ollama", OLLAMA_MODEL, prompt, OLLAMA_TEMPERATURE, None, sample,
+                             lambda: request_ollama_llm(prompt))
+
+def request_ollama_llm(prompt):
+    """Send one generation request to the local Ollama API with proper formatting and debugging."""
     payload = {
-        "model": "gemma:2b-instruct-q2_K",  # Use the model you have installed
+        "model": OLLAMA_MODEL,
         "prompt": prompt,
         "stream": False,
         "options": {
-            "temperature": 0.7,  # Adds variation
+            "temperature": OLLAMA_TEMPERATURE,  # Adds variation
             "top_p": 0.95,  # Nucleus sampling
         }
     }
     
     print(f"🔹 Sending request to: {OLLAMA_API_URL}")
-    print(f"🔹 Using model: gemma:2b-instruct-q2_K")
+    print(f"🔹 Using model: {OLLAMA_MODEL}")
     
     try:
         response = requests.post(OLLAMA_API_URL, json=payload)
@@ -110,7 +143,13 @@ def ask_llm():
     try:
         # Generate response using the local Ollama API
         responses = multi_query(user_query)
-        response = final_output(responses)
+        classifications = [classify_response(r) for r in responses]
+        label, count = leading_vote(classifications)
+        if count == len(responses):
+            # Every answer agrees, so the majority-vote call has nothing to decide
+            response = next(r for r, c in zip(responses, classifications) if c == label)
+        else:
+            response = final_output(responses)
         return jsonify({"query": user_query, "response": response})
     except Exception as e:
         return jsonify({"error": f"⚠️ Internal server error: {str(e)}"}), 500
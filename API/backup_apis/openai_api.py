@@ -4,6 +4,10 @@ from openai import OpenAI
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from llm_cache import cached_completion
+
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # Initialize OpenAI with your API key
@@ -82,25 +86,28 @@ def multi_query(prompt):
 
     # Create a ThreadPoolExecutor to run queries in parallel
     with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(query_openai, in_context_prompt) for _ in range(5)]  # 5 parallel requests
+        futures = [executor.submit(query_openai, in_context_prompt, i) for i in range(5)]  # 5 parallel requests
         for future in as_completed(futures):
             responses.append(future.result())
     return responses
 
 # Function to query OpenAI's GPT-4 API for text generation
-def query_openai(prompt):
-    """Query OpenAI's GPT-4 API for text generation."""
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=150,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()  # Access the correct field in the response
-    except Exception as e:
-        print(f"⚠️ Error: {e}")
-        return f"⚠️ Error: {str(e)}"
+def query_openai(prompt, sample=0):
+    """Query OpenAI's GPT-4 API for text generation (cached per prompt and sample index)."""
+    def request_completion():
+        try:
+            response = client.chat.completions.create(
+                model="gpt-4-turbo",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=150,
+                temperature=0.7
+            )
+            return response.choices[0].message.content.strip()  # Access the correct field in the response
+        except Exception as e:
+            print(f"⚠️ Error: {e}")
+            return f"⚠️ Error: {str(e)}"
+
+    return cached_completion("openai", "gpt-4-turbo", prompt, 0.7, 150, sample, request_completion)
 
 # Flask route to handle incoming queries
 @app.route('/ask_llm', methods=['POST'])
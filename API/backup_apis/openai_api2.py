@@ -5,6 +5,9 @@ from collections import Counter
 import os
 import concurrent.futures
 import random
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from llm_cache import cached_completion
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
@@ -44,17 +47,20 @@ def final_output(responses):
     return query_openai(final_output_prompt)
         
 
-def query_openai(prompt, max_tokens=100, temperature=0.2):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"⚠️ Error: {str(e)}"
+def query_openai(prompt, max_tokens=100, temperature=0.2, sample=0):
+    def request_completion():
+        try:
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            return f"⚠️ Error: {str(e)}"
+
+    return cached_completion("openai", "gpt-3.5-turbo", prompt, temperature, max_tokens, sample, request_completion)
 
 def multi_query(prompt):
     responses = []
@@ -70,7 +76,7 @@ def multi_query(prompt):
         f"Example 6:\n{examples['Clean1'][0]}\nOUTPUT: CLASSIFICATION: Clean log file. DESCRIPTION: The file exhibits no unordinary behavior.\nCONFIDENCE: 91%.\n"
     ]
 
-    def single_query():
+    def single_query(sample):
         # Randomize example order to prevent bias
         random.shuffle(example_snippets)
         in_context_prompt = (
@@ -85,11 +91,11 @@ def multi_query(prompt):
             + ''.join(example_snippets) +
             "\nNow, classify this log:\n" + prompt
         )
-        return query_openai(in_context_prompt)
+        return query_openai(in_context_prompt, sample=sample)
 
     # Run 5 threaded queries
     with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(single_query) for _ in range(5)]
+        futures = [executor.submit(single_query, i) for i in range(5)]
         for future in concurrent.futures.as_completed(futures):
             try:
                 responses.append(future.result())
@@ -0,0 +1,129 @@
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import tarfile
+import zipfile
+
+from der_binary import MAGIC, SUFFIX, BinaryStreamParser
+from der_logs import iter_text_chunks
+from indicators import analyze_log_stream
+from log_summary import LogSummary
+
+BATCH_WORKERS = int(os.getenv('DER_BATCH_WORKERS', os.cpu_count() or 1))
+BATCH_MAX_FILES = int(os.getenv('DER_BATCH_MAX_FILES', 1000))
+# Uncompressed size limits for one log and for a whole batch, checked before
+# archive members are read so a zip or tar bomb is refused up front
+BATCH_MAX_FILE_BYTES = int(os.getenv('DER_BATCH_MAX_FILE_BYTES', 256 << 20))
+BATCH_MAX_BYTES = int(os.getenv('DER_BATCH_MAX_BYTES', 1 << 30))
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+# Archives can also be posted as the raw request body with one of these types
+ARCHIVE_MIMETYPES = {
+    'application/zip': 'batch.zip',
+    'application/x-zip-compressed': 'batch.zip',
+    'application/x-tar': 'batch.tar',
+    'application/gzip': 'batch.tar.gz',
+    'application/x-gzip': 'batch.tar.gz'
+}
+
+_score_pool = None
+
+
+def score_pool():
+    """Process pool for parsing and rule-scoring, started on first use"""
+    global _score_pool
+    if _score_pool is None:
+        # Forking the threaded server would copy its held locks, connection pools and
+        # SQLite handles into the workers; forkserver starts them from a clean process
+        _score_pool = concurrent.futures.ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                                             mp_context=multiprocessing.get_context('forkserver'))
+    return _score_pool
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_log_member(name):
+    """CSV and binary logs inside an archive, skipping macOS metadata entries"""
+    base = os.path.basename(name)
+    return name.lower().endswith(('.csv', SUFFIX)) and not base.startswith('._') and '__MACOSX/' not in name
+
+
+def read_limited(fileobj, limit):
+    """Read at most limit + 1 bytes of a file object, enough to tell it is too large"""
+    return fileobj.read(limit + 1)
+
+
+def archive_members(fileobj, filename):
+    """Yield (name, size, reader) for every log in a zip or tar archive.
+
+    size is the uncompressed size the archive declares; reader(limit) reads
+    the member, never more than limit + 1 bytes of it.
+    """
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_log_member(info.filename):
+                    def read(limit, info=info):
+                        with archive.open(info) as member:
+                            return read_limited(member, limit)
+                    yield info.filename, info.file_size, read
+    else:
+        with tarfile.open(fileobj=fileobj, mode='r:*') as archive:
+            for member in archive:
+                if member.isfile() and is_log_member(member.name):
+                    yield member.name, member.size, lambda limit, member=member: read_limited(
+                        archive.extractfile(member), limit)
+
+
+def collect_logs(uploads):
+    """Expand (filename, file object) uploads into a list of (name, bytes) logs.
+
+    Archives are unpacked; any other upload is taken as a single log.
+    Raises ValueError past BATCH_MAX_FILES logs, for a log larger than
+    BATCH_MAX_FILE_BYTES or once the logs add up to more than BATCH_MAX_BYTES.
+    Sizes declared in the archive are checked before a member is read, and
+    the read itself stops past the limit, so a member cannot exceed it by
+    misstating its size.
+    """
+    logs = []
+    total = 0
+    for filename, fileobj in uploads:
+        if is_archive(filename):
+            members = archive_members(fileobj, filename)
+        else:
+            members = [(filename, 0, lambda limit, fileobj=fileobj: read_limited(fileobj, limit))]
+        for name, size, read in members:
+            if size > BATCH_MAX_FILE_BYTES:
+                raise ValueError(f"{name} is larger than the {BATCH_MAX_FILE_BYTES}-byte limit per log")
+            if total + size > BATCH_MAX_BYTES:
+                raise ValueError(f"Batch is limited to {BATCH_MAX_BYTES} bytes of logs")
+            data = read(min(BATCH_MAX_FILE_BYTES, BATCH_MAX_BYTES - total))
+            if len(data) > BATCH_MAX_FILE_BYTES:
+                raise ValueError(f"{name} is larger than the {BATCH_MAX_FILE_BYTES}-byte limit per log")
+            total += len(data)
+            if total > BATCH_MAX_BYTES:
+                raise ValueError(f"Batch is limited to {BATCH_MAX_BYTES} bytes of logs")
+            logs.append((name, data))
+            if len(logs) > BATCH_MAX_FILES:
+                raise ValueError(f"Batch is limited to {BATCH_MAX_FILES} logs")
+    return logs
+
+
+def score_log(data, digest_seed, chunk_size, summarize=False, evidence=None):
+    """Parse and rule-score one log; runs in a worker process.
+
+    Returns (analysis results, log sample, row count, cache key, summary),
+    the same values /ask_llm computes, so batch and single-file results
+    share the classification cache. summary is a LogSummary if summarize
+    is set, else None; evidence is an EvidenceExtractor for the log sample.
+    Binary logs are told apart from CSVs by their magic bytes.
+    """
+    digest = hashlib.sha256(digest_seed.encode('utf-8'))
+    summary = LogSummary() if summarize else None
+    parser = BinaryStreamParser() if data[:len(MAGIC)] == MAGIC else None
+    analysis_results, log_sample, row_count = analyze_log_stream(iter_text_chunks(data, chunk_size), digest=digest,
+                                                                 observers=[summary] if summary else (),
+                                                                 evidence=evidence, parser=parser)
+    return analysis_results, log_sample, row_count, digest.hexdigest(), summary
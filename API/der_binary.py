@@ -0,0 +1,211 @@
+"""Compact binary DER log format.
+
+A log is a 32-byte header followed by fixed-width little-endian records:
+
+    header   magic b'DERB', schema version (uint16), header size (uint16),
+             record size (uint16), column count (uint16), row count (uint64),
+             12 reserved bytes
+    record   timestamp as int64 epoch seconds, then the LOG_COLUMNS as float32
+
+np.memmap (read_binary_log) or np.frombuffer (BinaryStreamParser) view the
+records in place, so a log is scored without any text parsing.
+
+Usage (from API/):
+    python der_binary.py ../Data2/Logs2/gm/gm_simulation_log_1.csv     # writes gm_simulation_log_1.derlog
+    python der_binary.py log.derlog --out converted/                   # writes converted/log.csv
+"""
+import argparse
+import os
+import struct
+
+import numpy as np
+
+from der_logs import LOG_COLUMNS, LOG_HEADERS, parse_csv_log
+
+MAGIC = b'DERB'
+SCHEMA_VERSION = 1
+HEADER = struct.Struct('<4sHHHHQ12x')
+RECORD_DTYPE = np.dtype([('timestamp', '<i8')] + [(name, '<f4') for name in LOG_COLUMNS])
+MEDIA_TYPE = 'application/vnd.der-log'
+SUFFIX = '.derlog'
+# float32 keeps 6 significant decimal digits exactly
+FLOAT32_DIGITS = 6
+
+
+class BinaryLogError(ValueError):
+    """Raised for data that is not a binary DER log of a supported schema"""
+
+
+def pack_header(row_count):
+    return HEADER.pack(MAGIC, SCHEMA_VERSION, HEADER.size, RECORD_DTYPE.itemsize, len(LOG_COLUMNS), row_count)
+
+
+def is_binary_upload(filename, mimetype):
+    """Whether an uploaded file is a binary log rather than a CSV"""
+    return mimetype == MEDIA_TYPE or (filename or '').lower().endswith(SUFFIX)
+
+
+def unpack_header(data):
+    """Validate a header and return its row count"""
+    if len(data) < HEADER.size:
+        raise BinaryLogError("Binary log is shorter than its header")
+    magic, version, header_size, record_size, column_count, row_count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise BinaryLogError("Not a binary DER log")
+    if version != SCHEMA_VERSION or header_size != HEADER.size or record_size != RECORD_DTYPE.itemsize \
+            or column_count != len(LOG_COLUMNS):
+        raise BinaryLogError(f"Unsupported binary log schema (version {version}, {column_count} columns)")
+    return row_count
+
+
+def widen(values):
+    """float32 values as float64 at the precision float32 holds, so 2.27 comes back as 2.27, not 2.2699999809"""
+    values = values.astype(np.float64)
+    magnitude = np.abs(values)
+    exponent = np.floor(np.log10(magnitude, out=np.zeros_like(values), where=magnitude > 0))
+    scale = 10.0 ** (FLOAT32_DIGITS - 1 - exponent)
+    return np.round(values * scale) / scale
+
+
+def records_to_columns(records):
+    """Columnar log (as parse_csv_log returns in 'columns') for a record array"""
+    timestamps = records['timestamp'].view('datetime64[s]')
+    columns = {
+        'timestamp': timestamps,
+        'hour': (records['timestamp'] // 3600 % 24).astype(np.int64)
+    }
+    for name in LOG_COLUMNS:
+        columns[name] = widen(records[name])
+    return columns
+
+
+def columns_to_records(columns):
+    records = np.empty(len(columns['timestamp']), dtype=RECORD_DTYPE)
+    records['timestamp'] = columns['timestamp'].astype('datetime64[s]').astype(np.int64)
+    for name in LOG_COLUMNS:
+        records[name] = columns[name]
+    return records
+
+
+def csv_lines(columns):
+    """CSV data lines for a columnar batch, in the layout the generators write"""
+    if len(columns['timestamp']) == 0:
+        return []
+    timestamps = np.char.replace(np.datetime_as_string(columns['timestamp'], unit='s'), 'T', ' ')
+    values = np.column_stack([columns[name] for name in LOG_COLUMNS]).tolist()
+    return [f"{timestamp},{','.join(map(str, row))}" for timestamp, row in zip(timestamps, values)]
+
+
+def read_binary_log(path):
+    """Records of a binary log file as a read-only np.memmap (no copy)"""
+    with open(path, 'rb') as f:
+        row_count = unpack_header(f.read(HEADER.size))
+    size = os.path.getsize(path)
+    if size != HEADER.size + row_count * RECORD_DTYPE.itemsize:
+        raise BinaryLogError(f"Binary log should hold {row_count} records but is {size} bytes")
+    if row_count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(row_count,))
+
+
+def write_binary_log(columns, path):
+    records = columns_to_records(columns)
+    with open(path, 'wb') as f:
+        f.write(pack_header(len(records)))
+        f.write(records.tobytes())
+
+
+def csv_to_binary(csv_path, binary_path):
+    """Convert a CSV log; returns the number of records written"""
+    with open(csv_path) as f:
+        parsed = parse_csv_log(f.read())
+    if parsed is None:
+        raise BinaryLogError(f"Could not read {csv_path}")
+    write_binary_log(parsed['columns'], binary_path)
+    return parsed['row_count']
+
+
+def binary_to_csv(binary_path, csv_path, batch_rows=65536):
+    """Convert a binary log to the CSV layout, batch by batch; returns the number of rows written"""
+    records = read_binary_log(binary_path)
+    with open(csv_path, 'w', newline='') as f:
+        f.write(",".join(LOG_HEADERS) + "\n")
+        for start in range(0, len(records), batch_rows):
+            lines = csv_lines(records_to_columns(records[start:start + batch_rows]))
+            f.write("\n".join(lines) + "\n")
+    return len(records)
+
+
+class BinaryStreamParser:
+    """Incremental parser for a binary log delivered in byte chunks.
+
+    Same interface as der_logs.CsvStreamParser, so analyze_log_stream can
+    take either: feed() returns the columnar batch of the complete records
+    in a chunk, viewed in place with np.frombuffer, and a partial record is
+    held for the next chunk. head holds the CSV rendering of the first
+    records, as it would appear in the equivalent CSV log.
+    Raises BinaryLogError for a bad header or a truncated log.
+    """
+
+    def __init__(self, head_lines=15):
+        self.headers = None
+        self.head = []
+        self.head_lines = head_lines
+        self.row_count = 0
+        self.expected_rows = None
+        self._partial = b''
+
+    def _columns(self, data):
+        records = np.frombuffer(data, dtype=RECORD_DTYPE)
+        columns = records_to_columns(records)
+        if len(records) and len(self.head) < self.head_lines:
+            self.head.extend(csv_lines({name: values[:self.head_lines - len(self.head)]
+                                        for name, values in columns.items()}))
+        self.row_count += len(records)
+        return columns
+
+    def feed(self, chunk):
+        """Parse the complete records in chunk and return them as a columnar batch"""
+        if self._partial:
+            chunk = self._partial + chunk
+        if self.headers is None:
+            if len(chunk) < HEADER.size:
+                self._partial = chunk
+                return self._columns(b'')
+            self.expected_rows = unpack_header(chunk)
+            self.headers = list(LOG_HEADERS)
+            self.head.append(",".join(LOG_HEADERS))
+            chunk = memoryview(chunk)[HEADER.size:]
+        usable = len(chunk) - len(chunk) % RECORD_DTYPE.itemsize
+        self._partial = bytes(chunk[usable:])
+        return self._columns(chunk[:usable])
+
+    def close(self):
+        if self.headers is None and self._partial:
+            unpack_header(self._partial)
+        if self._partial or (self.expected_rows is not None and self.row_count != self.expected_rows):
+            raise BinaryLogError(f"Truncated binary log: {self.row_count} of {self.expected_rows} records")
+        return self._columns(b'')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='+', help=f"CSV logs to convert to {SUFFIX}, or {SUFFIX} logs to convert to CSV")
+    parser.add_argument('--out', help="directory for the converted logs (default: next to each input)")
+    args = parser.parse_args()
+
+    for path in args.logs:
+        base, suffix = os.path.splitext(path)
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            base = os.path.join(args.out, os.path.basename(base))
+        if suffix == SUFFIX:
+            rows = binary_to_csv(path, base + '.csv')
+            print(f"[✓] {path} -> {base}.csv ({rows} rows)")
+        else:
+            rows = csv_to_binary(path, base + SUFFIX)
+            print(f"[✓] {path} -> {base}{SUFFIX} ({rows} rows, {os.path.getsize(path)} -> {os.path.getsize(base + SUFFIX)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import base64
+import codecs
+import csv
+from io import StringIO
+from datetime import datetime
+
+import numpy as np
+
+# Column order of the DER simulation logs (after the Timestamp column)
+LOG_COLUMNS = (
+    'solar_generation',
+    'home_load',
+    'tesla_charger',
+    'battery_charge',
+    'battery_discharge',
+    'grid_import',
+    'grid_export'
+)
+# Header row of the CSV layout
+LOG_HEADERS = ("Timestamp", "Solar_Generation_kW", "Home_Load_kW", "Tesla_Charger_kW", "Battery_Charge_kWh",
+               "Battery_Discharge_kW", "Grid_Import_kW", "Grid_Export_kW")
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIMESTAMP_LENGTH = 19
+
+# Character positions of the fixed '%Y-%m-%d %H:%M:%S' layout
+_DIGIT_POSITIONS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_SEPARATORS = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':'}
+
+
+def empty_columns():
+    """Return a columnar log with zero rows"""
+    columns = {
+        'timestamp': np.empty(0, dtype='datetime64[s]'),
+        'hour': np.empty(0, dtype=np.int64)
+    }
+    for name in LOG_COLUMNS:
+        columns[name] = np.empty(0, dtype=np.float64)
+    return columns
+
+
+def _fast_timestamps(stamps):
+    """Vectorized parse of fixed-width '%Y-%m-%d %H:%M:%S' strings.
+
+    Returns (datetime64[s] array, hour array, ok mask). Entries that do not
+    strictly match the layout are flagged as not ok so the caller can hand
+    them to datetime.strptime, which keeps error handling identical.
+    """
+    n = len(stamps)
+    codes = np.array(stamps, dtype=f'U{TIMESTAMP_LENGTH}').view(np.uint32).reshape(n, TIMESTAMP_LENGTH)
+    lengths = np.fromiter(map(len, stamps), dtype=np.int64, count=n)
+
+    digits = codes[:, _DIGIT_POSITIONS].astype(np.int64) - ord('0')
+    ok = (lengths == TIMESTAMP_LENGTH) & np.all((digits >= 0) & (digits <= 9), axis=1)
+    for position, char in _SEPARATORS.items():
+        ok &= codes[:, position] == ord(char)
+
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    hour = digits[:, 8] * 10 + digits[:, 9]
+    minute = digits[:, 10] * 10 + digits[:, 11]
+    second = digits[:, 12] * 10 + digits[:, 13]
+
+    ok &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+    ok &= (hour <= 23) & (minute <= 59) & (second <= 59)
+
+    # Only build dates from rows that passed the checks so invalid fields
+    # cannot overflow the datetime64 arithmetic
+    year = np.where(ok, year, 1970)
+    month = np.where(ok, month, 1)
+    day = np.where(ok, day, 1)
+    months = ((year - 1970) * 12 + (month - 1)).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + (day - 1)
+    # Reject days past the end of the month (e.g. 2025-02-30)
+    ok &= dates.astype('datetime64[M]') == months
+
+    timestamps = dates.astype('datetime64[s]') + (hour * 3600 + minute * 60 + second)
+    return timestamps, hour, ok
+
+
+def _float_column(values):
+    """Convert one column of CSV cells to float64, treating empty cells as 0.0.
+
+    Returns (array, ok mask). Cells that cannot be converted are reported
+    through the mask instead of raising.
+    """
+    try:
+        # float() is the same conversion the row parser used; an empty or
+        # malformed cell raises and sends the column down the slow path
+        return np.fromiter(map(float, values), dtype=np.float64, count=len(values)), np.ones(len(values), dtype=bool)
+    except ValueError:
+        pass
+    # Slow path: substitute empty cells and locate the offending ones
+    result = np.zeros(len(values), dtype=np.float64)
+    ok = np.ones(len(values), dtype=bool)
+    for i, val in enumerate(values):
+        try:
+            result[i] = float(val) if val != '' else 0.0
+        except ValueError:
+            ok[i] = False
+    return result, ok
+
+
+def _parse_row(row):
+    """Parse a single CSV row the same way the original dict-of-rows parser did"""
+    timestamp = datetime.strptime(row[0], TIMESTAMP_FORMAT)
+    # Convert numerical values, treating empty values as 0.0
+    numerical_values = [float(val) if val != '' else 0.0 for val in row[1:]]
+    return timestamp, [numerical_values[i] for i in range(len(LOG_COLUMNS))]
+
+
+def rows_to_columns(rows):
+    """Convert raw CSV rows (lists of strings) into a columnar log.
+
+    Rows that fail to parse are skipped with the same message as before.
+    Returns (columns dict, row_count).
+    """
+    n = len(rows)
+    if n == 0:
+        return empty_columns(), 0
+
+    width = len(LOG_COLUMNS) + 1
+    regular = np.fromiter((len(row) == width for row in rows), dtype=bool, count=n)
+    regular_idx = np.flatnonzero(regular)
+
+    timestamps = np.empty(n, dtype='datetime64[s]')
+    hours = np.zeros(n, dtype=np.int64)
+    values = np.zeros((len(LOG_COLUMNS), n), dtype=np.float64)
+    keep = np.zeros(n, dtype=bool)
+    # Rows with the regular width that still need the per-row path
+    fallback = []
+
+    if len(regular_idx):
+        regular_rows = [rows[i] for i in regular_idx] if len(regular_idx) < n else rows
+        fields = list(zip(*regular_rows))
+        stamps, stamp_hours, good = _fast_timestamps(fields[0])
+        for col, cells in enumerate(fields[1:]):
+            values[col, regular_idx], col_ok = _float_column(cells)
+            good &= col_ok
+        timestamps[regular_idx] = stamps
+        hours[regular_idx] = stamp_hours
+        keep[regular_idx] = good
+        fallback = regular_idx[~good].tolist()
+
+    for i in sorted(fallback + np.flatnonzero(~regular).tolist()):
+        try:
+            timestamp, numbers = _parse_row(rows[i])
+        except (ValueError, IndexError) as e:
+            print(f"Error parsing row: {e}")
+            continue  # Skip rows with parsing errors
+        timestamps[i] = np.datetime64(timestamp, 's')
+        hours[i] = timestamp.hour
+        values[:, i] = numbers
+        keep[i] = True
+
+    columns = {'timestamp': timestamps[keep], 'hour': hours[keep]}
+    for col, name in enumerate(LOG_COLUMNS):
+        columns[name] = values[col, keep]
+    return columns, int(np.count_nonzero(keep))
+
+
+def row_bytes(columns):
+    """Row-major bytes of a columnar batch, independent of how a log was split into batches"""
+    table = np.column_stack([columns['timestamp'].astype(np.int64)] +
+                            [columns[name].view(np.int64) for name in LOG_COLUMNS])
+    return np.ascontiguousarray(table).tobytes()
+
+
+def parse_csv_log(log_data):
+    """Parse CSV log data into a columnar structure.
+
+    Returns {'headers', 'columns', 'row_count'} where 'columns' maps
+    'timestamp' (datetime64[s]), 'hour' and each name in LOG_COLUMNS to a
+    NumPy array with one entry per valid row. Returns None if the log
+    cannot be read at all.
+    """
+    try:
+        # If passed a file-like object, read and decode
+        if hasattr(log_data, 'read'):
+            log_data = log_data.read()
+            if isinstance(log_data, bytes):  # Handle binary reads
+                log_data = log_data.decode('utf-8')
+        # Parse CSV
+        reader = csv.reader(StringIO(log_data))
+        headers = next(reader)
+        rows = list(reader)
+        columns, row_count = rows_to_columns(rows)
+        return {
+            'headers': headers,
+            'columns': columns,
+            'row_count': row_count
+        }
+    except Exception as e:
+        print(f"Error parsing CSV: {e}")
+        return None
+
+
+class CsvStreamParser:
+    """Incremental CSV parser fed with text or byte chunks of a log.
+
+    feed() returns the columnar batch for every complete line in the chunk;
+    a trailing partial line is held until the next chunk. The first
+    head_lines raw lines (header included) are kept for prompt building.
+    """
+
+    def __init__(self, head_lines=15):
+        self.headers = None
+        self.head = []
+        self.head_lines = head_lines
+        self.row_count = 0
+        self._partial = ''
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def _parse_lines(self, lines):
+        if len(self.head) < self.head_lines:
+            self.head.extend(lines[:self.head_lines - len(self.head)])
+        rows = list(csv.reader(lines))
+        if self.headers is None and rows:
+            self.headers = rows[0]
+            rows = rows[1:]
+        columns, row_count = rows_to_columns(rows)
+        self.row_count += row_count
+        return columns
+
+    def feed(self, chunk):
+        """Parse the complete lines in chunk and return them as a columnar batch"""
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        lines = (self._partial + chunk).split('\n')
+        self._partial = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self):
+        """Flush the final line (if the log does not end with a newline)"""
+        tail = self._partial + self._decoder.decode(b'', final=True)
+        self._partial = ''
+        if tail:
+            return self._parse_lines([tail])
+        # Keep the head identical to log.split("\n") for short logs ending in a newline
+        if len(self.head) < self.head_lines:
+            self.head.append(tail)
+        return self._parse_lines([])
+
+
+def head_lines(text, count=15):
+    """The first count lines of text, same as "\n".join(text.split("\n")[:count]) but without splitting all of it"""
+    if count <= 0:
+        return ''
+    end = -1
+    for _ in range(count):
+        end = text.find("\n", end + 1)
+        if end < 0:
+            return text
+    return text[:end]
+
+
+def iter_text_chunks(text, chunk_size):
+    """Yield successive slices of an in-memory string"""
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+
+def iter_stream_chunks(stream, chunk_size):
+    """Yield chunks read from a file-like object until it is exhausted"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_base64_chunks(encoded, chunk_size):
+    """Decode a base64 string piece by piece instead of all at once.
+
+    Whitespace is dropped and each piece is cut on a 4-character boundary so
+    it decodes on its own; leftover characters carry into the next piece.
+    Raises binascii.Error on invalid input, like base64.b64decode.
+    """
+    carry = ''
+    for piece in iter_text_chunks(encoded, chunk_size):
+        piece = carry + ''.join(piece.split())
+        usable = len(piece) - len(piece) % 4
+        carry = piece[usable:]
+        if usable:
+            yield base64.b64decode(piece[:usable], validate=True)
+    if carry:
+        yield base64.b64decode(carry, validate=True)
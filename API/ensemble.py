@@ -0,0 +1,127 @@
+import asyncio
+import concurrent.futures
+import os
+from collections import Counter
+
+# Adaptive voting: start with ENSEMBLE_INITIAL samples, stop as soon as
+# ENSEMBLE_AGREEMENT of them give the same classification, and only add
+# samples (up to ENSEMBLE_MAX) while the votes are split.
+# DER_ENSEMBLE_INITIAL=3 DER_ENSEMBLE_MAX=3 restores the fixed three-call ensemble.
+ENSEMBLE_INITIAL = int(os.getenv('DER_ENSEMBLE_INITIAL', 2))
+ENSEMBLE_AGREEMENT = int(os.getenv('DER_ENSEMBLE_AGREEMENT', 2))
+ENSEMBLE_MAX = int(os.getenv('DER_ENSEMBLE_MAX', 3))
+
+
+def leading_vote(classifications):
+    """Return the most common classification other than Unknown and its count"""
+    votes = Counter(c for c in classifications if c != "Unknown")
+    if not votes:
+        return None, 0
+    return votes.most_common(1)[0]
+
+
+def adaptive_vote(query, classify, initial=None, agreement=None, max_samples=None, executor=None, accept=None):
+    """Call query(sample) until `agreement` responses share a classification.
+
+    classify maps a response to a label ("Unknown" never counts as a vote).
+    accept(label), when given, can reject an early consensus: sampling then
+    goes on up to max_samples, as if the votes were split.
+    The first `initial` samples run in parallel; more are submitted, up to
+    max_samples in total, only when all outstanding samples are done and
+    the votes are still split. Once agreement is reached, queued samples
+    are cancelled and still-running ones are ignored.
+    Returns the completed responses in completion order.
+    """
+    initial = initial or ENSEMBLE_INITIAL
+    agreement = agreement or ENSEMBLE_AGREEMENT
+    max_samples = max(max_samples or ENSEMBLE_MAX, 1)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_samples)
+
+    responses = []
+    classifications = []
+    pending = set()
+    submitted = 0
+
+    def submit(count):
+        nonlocal submitted
+        for sample in range(submitted, min(submitted + count, max_samples)):
+            pending.add(executor.submit(query, sample))
+        submitted = min(submitted + count, max_samples)
+
+    try:
+        submit(initial)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    print(f"Thread error: {e}")
+                    response = f"Error in thread: {str(e)}"
+                responses.append(response)
+                classifications.append(classify(response))
+
+            label, count = leading_vote(classifications)
+            if count >= agreement and (accept is None or accept(label)):
+                break
+            if not pending:
+                # Split vote: add just enough samples to possibly reach agreement
+                submit(max(agreement - count, 1))
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    print(f"Ensemble used {len(responses)} of {max_samples} samples: {classifications}")
+    return responses
+
+
+async def adaptive_vote_async(query, classify, initial=None, agreement=None, max_samples=None, accept=None):
+    """adaptive_vote for a coroutine function query(sample), run as asyncio tasks.
+
+    Tasks still running once agreement is reached are cancelled.
+    """
+    initial = initial or ENSEMBLE_INITIAL
+    agreement = agreement or ENSEMBLE_AGREEMENT
+    max_samples = max(max_samples or ENSEMBLE_MAX, 1)
+
+    responses = []
+    classifications = []
+    pending = set()
+    submitted = 0
+
+    def submit(count):
+        nonlocal submitted
+        for sample in range(submitted, min(submitted + count, max_samples)):
+            pending.add(asyncio.ensure_future(query(sample)))
+        submitted = min(submitted + count, max_samples)
+
+    try:
+        submit(initial)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    response = task.result()
+                except Exception as e:
+                    print(f"Task error: {e}")
+                    response = f"Error in task: {str(e)}"
+                responses.append(response)
+                classifications.append(classify(response))
+
+            label, count = leading_vote(classifications)
+            if count >= agreement and (accept is None or accept(label)):
+                break
+            if not pending:
+                # Split vote: add just enough samples to possibly reach agreement
+                submit(max(agreement - count, 1))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    print(f"Ensemble used {len(responses)} of {max_samples} samples: {classifications}")
+    return responses
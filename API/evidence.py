@@ -0,0 +1,150 @@
+import numpy as np
+
+from der_logs import LOG_COLUMNS
+from indicators import DEFAULT_RULES, SECONDS_PER_HOUR
+from log_summary import FLAGS, reading_masks, format_row
+
+# Row flags in column order: the FLAGS masks, then "reading follows missing hours"
+ROW_FLAGS = list(FLAGS) + ['after_gap']
+
+
+class EvidenceExtractor:
+    """Pick the most anomalous readings of a log, with their neighbours, for the prompt.
+
+    Fed columnar batches as an analyze_log_stream observer. Every reading
+    is scored by the number of flags it raises (the FLAGS masks plus a gap
+    of missing hours before it); for each flag only the top_n best rows are
+    kept, so the pass is linear in the log and memory does not grow with
+    it. render() then takes rows round-robin across the flags, so that one
+    common anomaly does not crowd out the others, and prints each with
+    `context` readings either side.
+    """
+
+    def __init__(self, thresholds=None, top_n=5, context=1):
+        self.thresholds = thresholds or DEFAULT_RULES.thresholds
+        self.top_n = top_n
+        self.context = context
+        # (score, row index) of the best rows per flag, best first
+        self.best = {flag: [] for flag in ROW_FLAGS}
+        # Row index -> [(row index, text)] for the rows in its window
+        self.windows = {}
+        # Rows kept from the previous batch: left context plus rows still
+        # waiting for their right context
+        self._tail = None
+        self._pending = 0
+        self._base = 0
+        self._last_battery = None
+        self._last_time = None
+
+    def _score_batch(self, columns):
+        timestamps = columns['timestamp']
+        masks = reading_masks(columns, self.thresholds, self._last_battery)
+        flags = np.column_stack([masks[flag] for flag in FLAGS] + [np.zeros(len(timestamps), dtype=bool)])
+        times = timestamps if self._last_time is None else np.concatenate(([self._last_time], timestamps))
+        missing = np.diff(times).astype(np.int64) // SECONDS_PER_HOUR - 1
+        if self._last_time is None:
+            missing = np.concatenate(([0], missing))
+        missing = np.maximum(missing, 0)
+        flags[:, -1] = missing > 0
+        self._last_battery = columns['battery_charge'][-1]
+        self._last_time = timestamps[-1]
+        return {
+            'timestamp': timestamps,
+            'values': np.column_stack([columns[name] for name in LOG_COLUMNS]),
+            'flags': flags,
+            'missing': missing
+        }
+
+    def _row_text(self, buf, i):
+        text = format_row(buf['timestamp'][i], buf['values'][i])
+        notes = [FLAGS[flag][0] for flag, raised in zip(FLAGS, buf['flags'][i]) if raised]
+        if buf['missing'][i]:
+            notes.append(f"after {buf['missing'][i]} missing hours")
+        return text + ("  <- " + ", ".join(notes) if notes else "")
+
+    def _decide(self, buf, start, end):
+        """Offer rows start..end-1 of buf (all of whose neighbours are in buf) as candidates"""
+        if end <= start:
+            return
+        flags = buf['flags'][start:end]
+        scores = flags.sum(axis=1)
+        # Higher score first, earlier row on ties
+        keys = -scores + np.arange(end - start) / (end - start)
+        new_rows = set()
+        for f, flag in enumerate(ROW_FLAGS):
+            rows = np.flatnonzero(flags[:, f])
+            if len(rows) == 0:
+                continue
+            if len(rows) > self.top_n:
+                rows = rows[np.argpartition(keys[rows], self.top_n - 1)[:self.top_n]]
+            candidates = self.best[flag] + [(int(scores[i]), self._base + start + int(i)) for i in rows]
+            candidates.sort(key=lambda c: (-c[0], c[1]))
+            self.best[flag] = candidates[:self.top_n]
+            new_rows.update(index for _, index in self.best[flag] if index not in self.windows)
+
+        for index in new_rows:
+            i = index - self._base
+            self.windows[index] = [(self._base + j, self._row_text(buf, j))
+                                   for j in range(max(i - self.context, 0), min(i + self.context + 1, len(buf['flags'])))]
+        kept = {index for best in self.best.values() for _, index in best}
+        for index in [index for index in self.windows if index not in kept]:
+            del self.windows[index]
+
+    def update(self, columns):
+        """Score one columnar batch and keep its best rows"""
+        if len(columns['timestamp']) == 0:
+            return
+        batch = self._score_batch(columns)
+        if self._tail is None:
+            buf = batch
+        else:
+            buf = {key: np.concatenate((self._tail[key], batch[key])) for key in batch}
+        length = len(buf['flags'])
+        start = len(self._tail['flags']) - self._pending if self._tail is not None else 0
+        end = max(length - self.context, start)
+        self._decide(buf, start, end)
+
+        cut = max(end - self.context, 0)
+        self._tail = {key: value[cut:] for key, value in buf.items()}
+        self._pending = length - end
+        self._base += cut
+
+    def finish(self):
+        """Decide the last rows, which have no readings after them"""
+        if self._tail is not None and self._pending:
+            length = len(self._tail['flags'])
+            self._decide(self._tail, length - self._pending, length)
+            self._pending = 0
+
+    def selected_rows(self):
+        """Up to top_n row indexes, taken round-robin across the flags, best flags first"""
+        self.finish()
+        order = sorted((flag for flag in ROW_FLAGS if self.best[flag]), key=lambda flag: -self.best[flag][0][0])
+        queues = {flag: [index for _, index in self.best[flag]] for flag in order}
+        chosen = []
+        while len(chosen) < self.top_n and any(queues.values()):
+            for flag in order:
+                while queues[flag] and queues[flag][0] in chosen:
+                    queues[flag].pop(0)
+                if queues[flag] and len(chosen) < self.top_n:
+                    chosen.append(queues[flag].pop(0))
+        return chosen
+
+    def render(self, headers=None):
+        """CSV header plus the selected readings and their neighbours in log order.
+
+        Flagged readings are annotated and "..." marks skipped readings.
+        Returns None if no reading was flagged.
+        """
+        chosen = self.selected_rows()
+        if not chosen:
+            return None
+        rows = dict(row for index in chosen for row in self.windows[index])
+        lines = [",".join(headers or ["Timestamp"] + list(LOG_COLUMNS))]
+        previous = None
+        for index in sorted(rows):
+            if previous is not None and index != previous + 1:
+                lines.append("...")
+            lines.append(rows[index])
+            previous = index
+        return "\n".join(lines)
@@ -0,0 +1,504 @@
+import hashlib
+import json
+import operator
+import os
+import time
+
+import numpy as np
+
+from der_logs import CsvStreamParser, row_bytes
+
+# Rule table loaded at startup; point DER_RULES_PATH at a copy to use site-specific rules
+RULES_PATH = os.getenv('DER_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detection_rules.json'))
+
+# Indicators produced by compute_indicators, in the order they are evaluated
+INDICATOR_NAMES = (
+    'complete_data',
+    'high_home_load_pct',
+    'tesla_charging_outside_normal',
+    'missing_data_count',
+    'peak_hour_missing_data',
+    'multiple_zeroed_values',
+    'negative_grid_values_count',
+    'high_grid_values_count',
+    'night_solar_count',
+    'erratic_battery'
+)
+
+COMPARISONS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+SECONDS_PER_HOUR = 3600
+
+
+class CompiledRules:
+    """A rule table compiled into arrays so scoring costs the same for any number of rules.
+
+    Every distinct (indicator, op, value) condition is evaluated once per
+    comparison operator as a vector; rules are rows of a condition matrix and
+    fire when all of their conditions hold; scores are one matrix product of
+    the fired rules with the per-label weights.
+    """
+
+    def __init__(self, table):
+        # Identifies the table in cache keys so edited rules never reuse old results
+        self.fingerprint = hashlib.sha256(json.dumps(table, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.labels = list(table['labels'])
+        self.fallback_label = table.get('fallback_label', "Unknown")
+        self.thresholds = dict(table['thresholds'])
+        self.min_score = table['selection']['min_score']
+        # Optional {'min_score', 'min_margin'} above which the rules alone are trusted
+        self.fast_path = table.get('fast_path')
+
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        conditions = {}
+        memberships = []
+        self.rule_conditions = []
+        weights = np.zeros((len(table['rules']), len(self.labels)), dtype=np.int64)
+        for r, rule in enumerate(table['rules']):
+            if rule['label'] not in label_index:
+                raise ValueError(f"Rule {r} scores unknown label: {rule['label']}")
+            if not rule['when']:
+                raise ValueError(f"Rule {r} has no conditions")
+            members = []
+            for indicator, op, value in rule['when']:
+                if indicator not in INDICATOR_NAMES:
+                    raise ValueError(f"Rule {r} uses unknown indicator: {indicator}")
+                if op not in COMPARISONS:
+                    raise ValueError(f"Rule {r} uses unknown comparison: {op}")
+                key = (indicator, op, float(value))
+                members.append(conditions.setdefault(key, len(conditions)))
+            memberships.append(members)
+            self.rule_conditions.append((rule['label'], [tuple(c) for c in rule['when']]))
+            weights[r, label_index[rule['label']]] = rule['score']
+
+        self.membership = np.zeros((len(memberships), len(conditions)), dtype=np.int64)
+        for r, members in enumerate(memberships):
+            self.membership[r, members] = 1
+        self.conditions_per_rule = self.membership.sum(axis=1)
+        self.weights = weights
+
+        # Group conditions by comparison so evaluation is one vector op per operator
+        indicator_index = {name: i for i, name in enumerate(INDICATOR_NAMES)}
+        self.condition_groups = []
+        for op, compare in COMPARISONS.items():
+            keys = [(key, i) for key, i in conditions.items() if key[1] == op]
+            if keys:
+                self.condition_groups.append((
+                    compare,
+                    np.array([i for _, i in keys]),
+                    np.array([indicator_index[key[0]] for key, _ in keys]),
+                    np.array([key[2] for key, _ in keys])
+                ))
+        self.condition_count = len(conditions)
+
+        # Gates zero a label's score unless every other label stays below a ceiling
+        self.gates = []
+        for gate in table.get('gates', []):
+            if gate['label'] not in label_index:
+                raise ValueError(f"Gate uses unknown label: {gate['label']}")
+            gated = label_index[gate['label']]
+            others = np.array([i for i in range(len(self.labels)) if i != gated])
+            self.gates.append((gated, others, gate['others_below'], gate.get('min_score', 0)))
+
+    def evaluate(self, indicators):
+        """Return the raw (ungated) score of every label as an int array"""
+        return self.fired_rules(indicators).astype(np.int64) @ self.weights
+
+    def fired_rules(self, indicators):
+        """Boolean array with one entry per rule, True where all of its conditions hold"""
+        values = np.array([float(indicators[name]) for name in INDICATOR_NAMES])
+        satisfied = np.zeros(self.condition_count, dtype=np.int64)
+        for compare, condition_idx, indicator_idx, thresholds in self.condition_groups:
+            satisfied[condition_idx] = compare(values[indicator_idx], thresholds)
+        return (self.membership @ satisfied) == self.conditions_per_rule
+
+    def evidence(self, indicators, label):
+        """Conditions of the fired rules that scored label, as (indicator, op, threshold) tuples"""
+        fired = self.fired_rules(indicators)
+        return [condition
+                for (rule_label, conditions), hit in zip(self.rule_conditions, fired)
+                if hit and rule_label == label
+                for condition in conditions]
+
+    def margin(self, attack_likelihood):
+        """Gap between the best and second-best label scores"""
+        scores = sorted(attack_likelihood.values(), reverse=True) + [0]
+        return scores[0] - scores[1]
+
+    def is_decisive(self, attack_likelihood, likely_attack):
+        """True when the fast_path settings say the rule scores alone are conclusive"""
+        if not self.fast_path or likely_attack not in attack_likelihood:
+            return False
+        return (attack_likelihood[likely_attack] >= self.fast_path['min_score'] and
+                self.margin(attack_likelihood) >= self.fast_path['min_margin'])
+
+    def score(self, indicators):
+        """Score indicators, apply gates and pick the most likely label"""
+        scores = self.evaluate(indicators)
+        for gated, others, ceiling, min_score in self.gates:
+            # Gates are checked against the raw scores of the other labels
+            if scores[others].max() >= ceiling or scores[gated] < min_score:
+                scores[gated] = 0
+        attack_likelihood = {label: int(s) for label, s in zip(self.labels, scores)}
+
+        best = int(np.argmax(scores))  # ties go to the earliest label
+        likely_attack = self.labels[best] if scores[best] >= self.min_score else self.fallback_label
+        return attack_likelihood, likely_attack
+
+    def score_table(self, table):
+        """score() for many indicator sets at once.
+
+        table is (n, len(INDICATOR_NAMES)) with booleans as 0/1. Returns the
+        gated scores as an (n, len(labels)) int array and the likely label
+        of each row, identical to calling score() row by row.
+        """
+        satisfied = np.zeros((len(table), self.condition_count), dtype=np.int64)
+        for compare, condition_idx, indicator_idx, thresholds in self.condition_groups:
+            satisfied[:, condition_idx] = compare(table[:, indicator_idx], thresholds)
+        fired = (satisfied @ self.membership.T) == self.conditions_per_rule
+        scores = fired.astype(np.int64) @ self.weights
+        for gated, others, ceiling, min_score in self.gates:
+            closed = (scores[:, others].max(axis=1) >= ceiling) | (scores[:, gated] < min_score)
+            scores[closed, gated] = 0
+        best = np.argmax(scores, axis=1)
+        labels = np.array(self.labels + [self.fallback_label], dtype=object)
+        likely = labels[np.where(scores[np.arange(len(scores)), best] >= self.min_score, best, len(self.labels))]
+        return scores, likely.tolist()
+
+
+def load_rules(path=RULES_PATH):
+    """Load a JSON rule table and compile it"""
+    with open(path, 'r') as f:
+        return CompiledRules(json.load(f))
+
+
+DEFAULT_RULES = load_rules()
+
+
+def empty_likelihood(rules=None):
+    """Return an attack_likelihood dict with every label at zero"""
+    rules = rules or DEFAULT_RULES
+    return {label: 0 for label in rules.labels}
+
+
+def hour_mask(hours, hour_list):
+    """Boolean mask of readings whose hour of day is in hour_list (lookup table, no np.isin sort)"""
+    table = np.zeros(24, dtype=bool)
+    table[hour_list] = True
+    return table[hours]
+
+
+def hours_in_slots(first_hour, length, hour_list):
+    """Count the hours of day in hour_list among `length` consecutive hours starting at first_hour.
+
+    Works elementwise on arrays using a cumulative count over the 24-hour cycle.
+    """
+    in_list = np.zeros(24, dtype=np.int64)
+    in_list[hour_list] = 1
+    prefix = np.concatenate(([0], np.cumsum(in_list)))
+    per_day = prefix[-1]
+
+    def count_before(hour_index):
+        return (hour_index // 24) * per_day + prefix[hour_index % 24]
+
+    return count_before(first_hour + length) - count_before(first_hour)
+
+
+def missing_hour_gaps(timestamps, start_hour, hour_list):
+    """Count hourly slots between the first and last reading that have no reading.
+
+    Slots are start, start + 1h, ... up to the last timestamp, matching the
+    expected-timestamp set the old implementation built one timedelta at a
+    time. Instead of materializing that set this sorts the on-grid readings
+    and counts gaps with np.diff. Returns (missing count, number of missing
+    slots whose hour of day is in hour_list).
+    """
+    start = timestamps[0]
+    end = timestamps[-1]
+    if end < start:
+        return 0, 0
+    last_slot = int((end - start).astype(np.int64)) // SECONDS_PER_HOUR
+
+    offsets = (timestamps - start).astype(np.int64)
+    on_grid = (offsets >= 0) & (offsets % SECONDS_PER_HOUR == 0) & (offsets <= last_slot * SECONDS_PER_HOUR)
+    slots = offsets[on_grid] // SECONDS_PER_HOUR
+    steps = np.diff(slots)
+    if np.all(steps >= 0):
+        slots = slots[np.concatenate(([True], steps > 0))]  # sorted: drop repeats
+    else:
+        slots = np.unique(slots)
+
+    bounds = np.concatenate(([-1], slots, [last_slot + 1]))
+    gaps = np.diff(bounds) - 1
+    has_gap = gaps > 0
+    # Slot k falls at hour (start_hour + k) % 24
+    matching = hours_in_slots(start_hour + bounds[:-1][has_gap] + 1, gaps[has_gap], hour_list)
+    return int(gaps.sum()), int(matching.sum())
+
+
+def indicator_masks(columns, thresholds):
+    """Boolean per-reading masks behind the mask-based indicators of one columnar batch"""
+    t = thresholds
+    hours = columns['hour']
+    solar = columns['solar_generation']
+    grid_import = columns['grid_import']
+    charging = columns['tesla_charger'] > t['tesla_charging_kw']  # Significant Tesla charging
+    return {
+        'high_home_load': columns['home_load'] > t['high_home_load_kw'],
+        'charging': charging,
+        'charging_in_expected': charging & hour_mask(hours, t['expected_charging_hours']),
+        'zeroed': (solar == 0) & (columns['battery_charge'] == 0),
+        'negative_grid': grid_import < t['negative_grid_kw'],  # Allow small measurement errors
+        'high_grid': (grid_import > t['high_grid_kw']) | (columns['grid_export'] > t['high_grid_kw']),
+        'night_solar': hour_mask(hours, t['night_hours']) & (solar > t['night_solar_kw'])
+    }
+
+
+def mask_counts(columns, thresholds):
+    """Count the readings behind each mask-based indicator in one columnar batch"""
+    return {name: int(np.count_nonzero(mask)) for name, mask in indicator_masks(columns, thresholds).items()}
+
+
+def build_indicators(row_count, counts, missing_count, peak_hour_missing, erratic_battery, thresholds):
+    """Assemble the indicators dict from raw counts"""
+    t = thresholds
+    charging_in_unexpected = counts['charging'] - counts['charging_in_expected']
+    return {
+        'complete_data': row_count >= t['expected_hours'] * t['complete_data_ratio'],  # Allow 10% missing
+        'high_home_load_pct': counts['high_home_load'] / row_count,
+        'tesla_charging_outside_normal': charging_in_unexpected > counts['charging_in_expected'],
+        'missing_data_count': missing_count,
+        'peak_hour_missing_data': peak_hour_missing > len(t['peak_hours']) * t['peak_missing_ratio'],
+        'multiple_zeroed_values': counts['zeroed'] > t['zeroed_values_min_count'],
+        'negative_grid_values_count': counts['negative_grid'],
+        'high_grid_values_count': counts['high_grid'],
+        'night_solar_count': counts['night_solar'],
+        'erratic_battery': erratic_battery
+    }
+
+
+def compute_indicators(columns, row_count, thresholds=None):
+    """Compute every rule-based indicator from a columnar log in a single pass"""
+    t = thresholds or DEFAULT_RULES.thresholds
+    counts = mask_counts(columns, t)
+
+    missing_count, peak_hour_missing = 0, 0
+    if row_count >= 2:
+        missing_count, peak_hour_missing = missing_hour_gaps(columns['timestamp'], int(columns['hour'][0]), t['peak_hours'])
+
+    erratic_battery = False
+    if row_count >= 3:
+        erratic_battery = bool(np.any(np.abs(np.diff(columns['battery_charge'])) > t['erratic_battery_kwh']))
+
+    return build_indicators(row_count, counts, missing_count, peak_hour_missing, erratic_battery, t)
+
+
+class IndicatorAccumulator:
+    """Running indicator state fed one columnar batch at a time.
+
+    Produces the same indicators as compute_indicators over the concatenated
+    batches. Memory is bounded by the number of distinct hourly slots the
+    log spans, not by its row count.
+    """
+
+    def __init__(self, thresholds=None):
+        self.thresholds = thresholds or DEFAULT_RULES.thresholds
+        self.row_count = 0
+        self.counts = dict.fromkeys(('high_home_load', 'charging', 'charging_in_expected', 'zeroed',
+                                     'negative_grid', 'high_grid', 'night_solar'), 0)
+        self.erratic_battery = False
+        self.last_battery = None
+        self.start = None
+        self.start_hour = 0
+        self.end = None
+        # Hourly slots (hours since the first reading) that have a reading
+        self.seen_slots = set()
+        self.max_slot = -1
+        self.peak_slots_seen = 0
+        self._peak_table = hour_mask(np.arange(24), self.thresholds['peak_hours'])
+
+    def update(self, columns):
+        """Fold one columnar batch into the running state"""
+        timestamps = columns['timestamp']
+        n = len(timestamps)
+        if n == 0:
+            return
+        t = self.thresholds
+        for key, value in mask_counts(columns, t).items():
+            self.counts[key] += value
+
+        if self.start is None:
+            self.start = timestamps[0]
+            self.start_hour = int(columns['hour'][0])
+        self.end = timestamps[-1]
+        self.row_count += n
+
+        offsets = (timestamps - self.start).astype(np.int64)
+        slots = offsets[(offsets >= 0) & (offsets % SECONDS_PER_HOUR == 0)] // SECONDS_PER_HOUR
+        new_slots = [s for s in np.unique(slots).tolist() if s not in self.seen_slots]
+        if new_slots:
+            self.seen_slots.update(new_slots)
+            self.max_slot = max(self.max_slot, new_slots[-1])
+            self.peak_slots_seen += int(np.count_nonzero(self._peak_table[(self.start_hour + np.array(new_slots)) % 24]))
+
+        battery = columns['battery_charge']
+        if self.last_battery is not None:
+            battery = np.concatenate(([self.last_battery], battery))
+        if not self.erratic_battery and len(battery) >= 2:
+            self.erratic_battery = bool(np.any(np.abs(np.diff(battery)) > t['erratic_battery_kwh']))
+        self.last_battery = battery[-1]
+
+    def missing_hours(self):
+        """Return (missing slot count, missing slots in peak hours) up to the latest reading"""
+        if self.row_count < 2 or self.end < self.start:
+            return 0, 0
+        last_slot = int((self.end - self.start).astype(np.int64)) // SECONDS_PER_HOUR
+        if last_slot >= self.max_slot:
+            seen, peak_seen = len(self.seen_slots), self.peak_slots_seen
+        else:
+            # The latest reading arrived out of order; only slots up to it count
+            slots = np.fromiter((s for s in self.seen_slots if s <= last_slot), dtype=np.int64)
+            seen = len(slots)
+            peak_seen = int(np.count_nonzero(self._peak_table[(self.start_hour + slots) % 24]))
+        expected_peak = int(hours_in_slots(self.start_hour, last_slot + 1, self.thresholds['peak_hours']))
+        return last_slot + 1 - seen, expected_peak - peak_seen
+
+    def indicators(self):
+        """Return the indicators dict for everything seen so far"""
+        missing_count, peak_hour_missing = self.missing_hours()
+        erratic_battery = self.erratic_battery if self.row_count >= 3 else False
+        return build_indicators(self.row_count, self.counts, missing_count, peak_hour_missing,
+                                erratic_battery, self.thresholds)
+
+
+def analyze_log_data(parsed_log, rules=None):
+    """Performs rule-based analysis on the parsed log data"""
+    rules = rules or DEFAULT_RULES
+    if not parsed_log or parsed_log['row_count'] == 0:
+        return {
+            'analysis': "Unable to analyze: Invalid or empty log data",
+            'indicators': {},
+            'likely_attack': rules.fallback_label,
+            'attack_likelihood': empty_likelihood(rules)
+        }
+
+    print(f"Analyzing {parsed_log['row_count']} rows of log data")
+
+    indicators = compute_indicators(parsed_log['columns'], parsed_log['row_count'], rules.thresholds)
+    return report_indicators(indicators, rules)
+
+
+def report_indicators(indicators, rules, verbose=True):
+    """Score indicators and package them as analysis results"""
+    attack_likelihood, likely_attack = rules.score(indicators)
+
+    if verbose:
+        print(f"Attack scores: {attack_likelihood}")
+        print(f"Most likely attack: {likely_attack}")
+        print(f"indicators: {indicators}")
+
+    return {
+        'analysis': f"Most likely classification: {likely_attack}",
+        'indicators': indicators,
+        'attack_likelihood': attack_likelihood,
+        'likely_attack': likely_attack
+    }
+
+
+def analyze_log_stream(chunks, rules=None, head_lines=15, digest=None, timings=None, observers=(), evidence=None,
+                       parser=None):
+    """Parse and analyze a CSV log delivered as an iterable of text or byte chunks.
+
+    Each chunk is parsed and folded into an IndicatorAccumulator as it
+    arrives, so peak memory does not grow with the size of the log.
+    If a hashlib object is passed as digest it is fed the parsed rows and
+    the head lines, giving a content hash that ignores line endings.
+    If a dict is passed as timings, the seconds spent parsing and analyzing
+    are added to its 'parse' and 'analyze' entries. Every object in
+    observers gets each parsed batch through its update(columns) method.
+    If an EvidenceExtractor is passed as evidence, it is fed the same way
+    and the sample it renders replaces the head lines, unless no reading
+    was flagged. parser defaults to a der_logs.CsvStreamParser; pass a
+    der_binary.BinaryStreamParser for a binary log.
+    Returns (analysis results, log sample, row count), or (None, head, 0)
+    if the log has no header.
+    """
+    observers = list(observers) + ([evidence] if evidence is not None else [])
+    rules = rules or DEFAULT_RULES
+    parser = parser or CsvStreamParser(head_lines)
+    accumulator = IndicatorAccumulator(rules.thresholds)
+    parse_seconds = analyze_seconds = 0.0
+    clock = time.perf_counter
+    for chunk in chunks:
+        start = clock()
+        columns = parser.feed(chunk)
+        if digest is not None:
+            digest.update(row_bytes(columns))
+        parsed = clock()
+        accumulator.update(columns)
+        for observer in observers:
+            observer.update(columns)
+        parse_seconds += parsed - start
+        analyze_seconds += clock() - parsed
+    start = clock()
+    columns = parser.close()
+    parsed = clock()
+    accumulator.update(columns)
+    for observer in observers:
+        observer.update(columns)
+    parse_seconds += parsed - start
+
+    head = "\n".join(parser.head)
+    if digest is not None:
+        digest.update(row_bytes(columns))
+        digest.update(head.replace('\r', '').encode('utf-8'))
+    if parser.headers is None:
+        results, row_count = None, 0
+    elif accumulator.row_count == 0:
+        results, row_count = analyze_log_data(None, rules), 0
+    else:
+        print(f"Analyzing {accumulator.row_count} rows of log data")
+        results, row_count = report_indicators(accumulator.indicators(), rules), accumulator.row_count
+        if evidence is not None:
+            head = evidence.render(parser.headers) or head
+    analyze_seconds += clock() - parsed
+
+    if timings is not None:
+        timings['parse'] = timings.get('parse', 0.0) + parse_seconds
+        timings['analyze'] = timings.get('analyze', 0.0) + analyze_seconds
+    return results, head, row_count
+
+
+class OnlineScorer:
+    """Classify a live telemetry feed as readings arrive.
+
+    Each reading (or micro-batch of readings) is folded into an
+    IndicatorAccumulator, which updates every indicator in constant time
+    per reading, so the current attack_likelihood is available at any
+    moment without re-reading history.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules or DEFAULT_RULES
+        self.accumulator = IndicatorAccumulator(self.rules.thresholds)
+
+    @property
+    def row_count(self):
+        return self.accumulator.row_count
+
+    def update(self, columns):
+        """Add a columnar batch of readings (one or more rows)"""
+        self.accumulator.update(columns)
+
+    def analysis(self):
+        """Return analysis results for every reading seen so far"""
+        if self.accumulator.row_count == 0:
+            return analyze_log_data(None, self.rules)
+        return report_indicators(self.accumulator.indicators(), self.rules, verbose=False)
@@ -0,0 +1,60 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from result_cache import ResultCache
+
+# One response cache shared by every LLM backend. DER_LLM_CACHE_DB adds a
+# persistent SQLite tier (use a different file from DER_RESULT_CACHE_DB).
+llm_cache = ResultCache(
+    max_entries=int(os.getenv('DER_LLM_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('DER_LLM_CACHE_TTL', 7 * 86400)),
+    db_path=os.getenv('DER_LLM_CACHE_DB') or None
+)
+
+
+def prompt_key(backend, model, prompt, temperature, max_tokens, sample):
+    """Hash everything that determines an LLM response into a cache key.
+
+    sample is the index of the call within an ensemble, so repeated
+    identical prompts in one request still get independent responses.
+    """
+    payload = json.dumps([backend, model, prompt, temperature, max_tokens, sample])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def is_error_response(response):
+    """True for the error strings the backends return instead of raising"""
+    return response.removeprefix('⚠️ ').startswith("Error")
+
+
+def cached_completion(backend, model, prompt, temperature, max_tokens, sample, call):
+    """Return the cached response for this exact request, or run call() and cache its result"""
+    key = prompt_key(backend, model, prompt, temperature, max_tokens, sample)
+    response = llm_cache.get(key)
+    if response is None:
+        response = call()
+        if not is_error_response(response):
+            llm_cache.set(key, response)
+    return response
+
+
+async def cached_completion_async(backend, model, prompt, temperature, max_tokens, sample, call):
+    """cached_completion for coroutine functions: await call() on a cache miss.
+
+    Cache lookups and writes run in a worker thread, so a SQLite-backed
+    cache does not block the event loop.
+    """
+    key = prompt_key(backend, model, prompt, temperature, max_tokens, sample)
+    response = await asyncio.to_thread(llm_cache.get, key)
+    if response is None:
+        response = await call()
+        if not is_error_response(response):
+            await asyncio.to_thread(llm_cache.set, key, response)
+    return response
+
+
+def cache_stats():
+    """Hit/miss counters of the shared LLM response cache"""
+    return llm_cache.stats()
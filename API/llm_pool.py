@@ -0,0 +1,189 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+import httpx
+
+from metrics import llm_retries
+
+# One bounded worker pool and one keep-alive connection pool for every LLM
+# call in the process. DER_LLM_WORKERS is the global limit on concurrent
+# LLM requests; calls beyond it wait in the executor's FIFO queue.
+LLM_WORKERS = int(os.getenv('DER_LLM_WORKERS', 16))
+LLM_MAX_CONNECTIONS = int(os.getenv('DER_LLM_MAX_CONNECTIONS', LLM_WORKERS))
+LLM_KEEPALIVE_SECONDS = float(os.getenv('DER_LLM_KEEPALIVE_SECONDS', 60))
+LLM_TIMEOUT_SECONDS = float(os.getenv('DER_LLM_TIMEOUT_SECONDS', 60))
+# The asyncio service has no threads to bound, so it caps in-flight calls
+# with a semaphore instead
+LLM_ASYNC_CONCURRENCY = int(os.getenv('DER_LLM_ASYNC_CONCURRENCY', 256))
+LLM_ASYNC_MAX_CONNECTIONS = int(os.getenv('DER_LLM_MAX_CONNECTIONS', LLM_ASYNC_CONCURRENCY))
+
+
+class LLMExecutor:
+    """Shared ThreadPoolExecutor that counts queued, running and finished calls"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs); same contract as ThreadPoolExecutor.submit"""
+        enqueued = time.perf_counter()
+
+        def run():
+            waited = time.perf_counter() - enqueued
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.queue_seconds += waited
+                self.max_queue_seconds = max(self.max_queue_seconds, waited)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.failed += failed
+
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+        future = self._executor.submit(run)
+        future.add_done_callback(self._count_cancelled)
+        return future
+
+    def _count_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+                self.cancelled += 1
+
+    def stats(self):
+        """Return the pool size and call counters"""
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "avg_queue_ms": round(1000 * self.queue_seconds / started, 2) if started else 0.0,
+                "max_queue_ms": round(1000 * self.max_queue_seconds, 2)
+            }
+
+
+class HttpStats:
+    """Counts HTTP requests, responses and new connections through httpx event hooks.
+
+    Requests without a response failed at the connection level. New
+    connections are counted from the httpcore trace extension, so a
+    response that did not open one reused a keep-alive connection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.responses = 0
+        self.connections_opened = 0
+
+    def on_request(self, request, trace=None):
+        with self._lock:
+            self.requests += 1
+        request.extensions['trace'] = trace or self.trace
+        # The OpenAI client numbers its attempts in this header
+        if request.headers.get('x-stainless-retry-count', '0') != '0':
+            llm_retries.inc(backend="openai")
+
+    def on_response(self, response):
+        with self._lock:
+            self.responses += 1
+
+    def trace(self, event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            with self._lock:
+                self.connections_opened += 1
+
+    def stats(self, client=None, max_connections=LLM_MAX_CONNECTIONS):
+        """Counters, plus the live connections of client's pool when given"""
+        with self._lock:
+            result = {
+                "max_connections": max_connections,
+                "keepalive_seconds": LLM_KEEPALIVE_SECONDS,
+                "requests": self.requests,
+                "responses": self.responses,
+                "connections_opened": self.connections_opened,
+                "reused_responses": max(self.responses - self.connections_opened, 0)
+            }
+        if client is not None:
+            result.update(connection_counts(client))
+        return result
+
+
+def connection_counts(client):
+    """Open, idle and in-use connections in the pool of an httpx client's transport"""
+    pool = getattr(client._transport, '_pool', None)
+    connections = [c for c in getattr(pool, 'connections', []) if not c.is_closed()]
+    idle = sum(1 for c in connections if c.is_idle())
+    return {"open_connections": len(connections), "idle_connections": idle, "active_connections": len(connections) - idle}
+
+
+llm_executor = LLMExecutor(LLM_WORKERS)
+http_stats = HttpStats()
+
+
+def http_limits(max_connections):
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS
+    )
+
+
+# Passed to OpenAI(http_client=...) so connections (and their TLS sessions)
+# are reused across requests instead of being opened per call
+http_client = httpx.Client(
+    limits=http_limits(LLM_MAX_CONNECTIONS),
+    timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+    event_hooks={"request": [http_stats.on_request], "response": [http_stats.on_response]}
+)
+
+
+def async_http_client():
+    """Keep-alive connection pool for AsyncOpenAI, sized for the asyncio service"""
+
+    async def trace(event_name, info):
+        http_stats.trace(event_name, info)
+
+    async def on_request(request):
+        http_stats.on_request(request, trace)
+
+    async def on_response(response):
+        http_stats.on_response(response)
+
+    return httpx.AsyncClient(
+        limits=http_limits(LLM_ASYNC_MAX_CONNECTIONS),
+        timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+        event_hooks={"request": [on_request], "response": [on_response]}
+    )
+
+
+def pool_stats():
+    """Executor and HTTP connection pool metrics"""
+    return {"executor": llm_executor.stats(), "http": http_stats.stats(http_client)}
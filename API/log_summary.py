@@ -0,0 +1,132 @@
+import numpy as np
+
+from der_logs import LOG_COLUMNS
+from indicators import DEFAULT_RULES, indicator_masks, SECONDS_PER_HOUR
+
+# Readings flagged for the compact prompt, in the order they are listed,
+# with the attack each one points to
+FLAGS = {
+    'negative_grid': ("negative grid import", "Grid Manipulation"),
+    'high_grid': ("grid import/export above limit", "Grid Manipulation"),
+    'night_solar': ("solar generation at night", "Man-in-the-Middle"),
+    'erratic_battery': ("battery charge jump", "Man-in-the-Middle"),
+    'charging_outside': ("Tesla charging outside normal hours", "Battery Drain"),
+    'high_home_load': ("high home load", "Battery Drain"),
+    'zeroed': ("solar and battery both zero", "Denial of Service"),
+}
+
+
+def reading_masks(columns, thresholds, previous_battery=None):
+    """Per-reading masks for every flag in FLAGS over one columnar batch.
+
+    previous_battery is the last battery reading of the previous batch, so
+    battery jumps across batch boundaries are caught.
+    """
+    masks = indicator_masks(columns, thresholds)
+    masks['charging_outside'] = masks['charging'] & ~masks['charging_in_expected']
+    battery = columns['battery_charge']
+    previous = np.concatenate(([battery[0] if previous_battery is None else previous_battery], battery[:-1]))
+    masks['erratic_battery'] = np.abs(battery - previous) > thresholds['erratic_battery_kwh']
+    return masks
+
+
+def format_timestamp(timestamp):
+    return str(timestamp).replace('T', ' ')
+
+
+def format_row(timestamp, values):
+    return format_timestamp(timestamp) + "," + ",".join(f"{v:.2f}" for v in values)
+
+
+class LogSummary:
+    """Per-column statistics and a few flagged readings, gathered batch by batch.
+
+    Pass it to analyze_log_stream as an observer to build it in the same
+    pass as the indicators. Memory is bounded by rows_per_flag, not by the
+    length of the log.
+    """
+
+    def __init__(self, thresholds=None, rows_per_flag=5):
+        self.thresholds = thresholds or DEFAULT_RULES.thresholds
+        self.rows_per_flag = rows_per_flag
+        self.row_count = 0
+        self.sums = np.zeros(len(LOG_COLUMNS))
+        self.mins = np.full(len(LOG_COLUMNS), np.inf)
+        self.maxs = np.full(len(LOG_COLUMNS), -np.inf)
+        self.zeros = np.zeros(len(LOG_COLUMNS), dtype=np.int64)
+        self.first = None
+        self.last = None
+        self.flag_counts = dict.fromkeys(FLAGS, 0)
+        self.flagged = {flag: [] for flag in FLAGS}
+        # Stretches of more than an hour without a reading: (last before, first after)
+        self.gap_count = 0
+        self.gaps = []
+        self._last_battery = None
+
+    def update(self, columns):
+        """Fold one columnar batch into the summary"""
+        timestamps = columns['timestamp']
+        n = len(timestamps)
+        if n == 0:
+            return
+        values = np.column_stack([columns[name] for name in LOG_COLUMNS])
+        self.row_count += n
+        self.sums += values.sum(axis=0)
+        self.mins = np.minimum(self.mins, values.min(axis=0))
+        self.maxs = np.maximum(self.maxs, values.max(axis=0))
+        self.zeros += np.count_nonzero(values == 0, axis=0)
+
+        masks = reading_masks(columns, self.thresholds, self._last_battery)
+        self._last_battery = columns['battery_charge'][-1]
+
+        for flag in FLAGS:
+            rows = np.flatnonzero(masks[flag])
+            self.flag_counts[flag] += len(rows)
+            room = self.rows_per_flag - len(self.flagged[flag])
+            for i in rows[:max(room, 0)]:
+                self.flagged[flag].append(format_row(timestamps[i], values[i]))
+
+        times = timestamps if self.last is None else np.concatenate(([self.last], timestamps))
+        steps = np.diff(times).astype(np.int64)
+        gap_ends = np.flatnonzero(steps > SECONDS_PER_HOUR)
+        self.gap_count += len(gap_ends)
+        for i in gap_ends[:max(self.rows_per_flag - len(self.gaps), 0)]:
+            self.gaps.append((format_timestamp(times[i]), format_timestamp(times[i + 1])))
+
+        if self.first is None:
+            self.first = timestamps[0]
+        self.last = timestamps[-1]
+
+    def render(self, headers=None, rows_per_flag=None, labels=None):
+        """Text summary for a prompt.
+
+        rows_per_flag caps the example readings listed per flag (the counts
+        are always given); labels, if given, lists the flags that point to
+        those attacks first.
+        """
+        if self.row_count == 0:
+            return "LOG SUMMARY: no readings"
+        rows_per_flag = self.rows_per_flag if rows_per_flag is None else rows_per_flag
+        headers = list(headers or ["Timestamp"] + list(LOG_COLUMNS))
+        means = self.sums / self.row_count
+
+        lines = [f"LOG SUMMARY: {self.row_count} readings from {format_timestamp(self.first)} to {format_timestamp(self.last)}",
+                 "column: min / mean / max (zero readings)"]
+        for i, name in enumerate(headers[1:len(LOG_COLUMNS) + 1]):
+            lines.append(f"{name}: {self.mins[i]:.2f} / {means[i]:.2f} / {self.maxs[i]:.2f} ({self.zeros[i]})")
+        if self.gap_count:
+            spans = ", ".join(f"{start} -> {end}" for start, end in self.gaps[:rows_per_flag])
+            lines.append(f"Gaps of more than an hour: {self.gap_count}" + (f" ({spans})" if spans else ""))
+
+        order = list(FLAGS)
+        if labels:
+            order.sort(key=lambda flag: FLAGS[flag][1] not in labels)
+        flagged = [flag for flag in order if self.flag_counts[flag]]
+        if flagged:
+            lines.append(f"FLAGGED READINGS ({','.join(headers[:len(LOG_COLUMNS) + 1])}):")
+            for flag in flagged:
+                lines.append(f"- {FLAGS[flag][0]}: {self.flag_counts[flag]} readings")
+                lines.extend(f"  {row}" for row in self.flagged[flag][:rows_per_flag])
+        else:
+            lines.append("FLAGGED READINGS: none")
+        return "\n".join(lines)
@@ -0,0 +1,152 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition without the client library: a few counters and
+# histograms kept in dicts under one lock, rendered on scrape.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labelnames + ('le',), key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames + ('le',), key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class CallbackMetric:
+    """Values read from existing counters (e.g. cache stats) at scrape time.
+
+    collect() returns a list of (label values tuple, value).
+    """
+
+    def __init__(self, name, documentation, metric_type, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in self.collect():
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render():
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Metrics shared by the Flask and asyncio services
+stage_seconds = register(Histogram(
+    "der_stage_seconds", "Time spent in each stage of a classification request", ["stage"]))
+request_seconds = register(Histogram(
+    "der_request_seconds", "End-to-end request latency", ["endpoint", "status"]))
+llm_calls = register(Counter(
+    "der_llm_calls_total", "LLM requests sent (cache misses)", ["backend", "model", "outcome"]))
+llm_seconds = register(Histogram(
+    "der_llm_call_seconds", "Latency of LLM requests", ["backend", "model"]))
+llm_tokens = register(Counter(
+    "der_llm_tokens_total", "Tokens reported by the LLM API", ["backend", "model", "kind"]))
+llm_retries = register(Counter(
+    "der_llm_retries_total", "HTTP retries made by the LLM client", ["backend"]))
+prompt_tokens = register(Histogram(
+    "der_prompt_tokens", "Input tokens per LLM prompt", ["mode"],
+    buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)))
+classifications = register(Counter(
+    "der_classifications_total", "Classifications returned, by label and answering tier", ["label", "tier", "cached"]))
+
+
+def record_llm_response(backend, model, response, seconds):
+    """Count one chat-completions response: outcome, latency and token usage"""
+    llm_calls.inc(backend=backend, model=model, outcome="ok")
+    llm_seconds.observe(seconds, backend=backend, model=model)
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        llm_tokens.inc(usage.prompt_tokens or 0, backend=backend, model=model, kind="prompt")
+        llm_tokens.inc(usage.completion_tokens or 0, backend=backend, model=model, kind="completion")
@@ -1,21 +1,102 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from openai import OpenAI
 from collections import Counter
 import os
 import concurrent.futures
+import json
 import re
+import binascii
 import csv
-from io import StringIO
+import hashlib
+import tarfile
+import zipfile
+import threading
+import time
+from io import BytesIO, StringIO
 from io import TextIOWrapper
-from datetime import datetime
-from datetime import timedelta
-
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from der_logs import parse_csv_log, rows_to_columns, head_lines, iter_text_chunks, iter_stream_chunks, iter_base64_chunks
+from der_binary import BinaryLogError, BinaryStreamParser, MEDIA_TYPE as BINARY_MEDIA_TYPE, is_binary_upload
+from indicators import analyze_log_data, analyze_log_stream, OnlineScorer, DEFAULT_RULES
+from result_cache import ResultCache
+from telemetry_store import StoreIngest, StoreWriter, TelemetryStore, parse_time
+from windowed import WindowedDetector, detect_windows, window_options
+from batch import ARCHIVE_MIMETYPES, collect_logs, score_log, score_pool
+from ensemble import adaptive_vote
+from llm_pool import llm_executor, http_client, pool_stats
+from llm_cache import cached_completion, cache_stats as llm_cache_stats
+from prompt_registry import FileRegistry, read_first_lines
+from log_summary import LogSummary
+from evidence import EvidenceExtractor
+from token_count import count_tokens
+import metrics
+
+# Shares the process-wide keep-alive connection pool from llm_pool
+client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=http_client)
+
+OPENAI_MODEL = "gpt-4-turbo"
+# Bump when create_smart_prompt or final_output change so cached classifications are not reused
+PROMPT_VERSION = "smart-prompt-2"
+
+# Final classifications keyed by log content + model + prompt version + rule table
+result_cache = ResultCache(
+    max_entries=int(os.getenv('DER_RESULT_CACHE_SIZE', 256)),
+    ttl=int(os.getenv('DER_RESULT_CACHE_TTL', 86400)),
+    db_path=os.getenv('DER_RESULT_CACHE_DB') or None
+)
+
+# Rule-confidence fast path when the rule scores pass fast_path in detection_rules.json:
+#   "rules"    - answer from the rules alone, no LLM call
+#   "describe" - answer from the rules, one call to DESCRIBE_MODEL writes the description
+#   "off"      - always run the full LLM ensemble
+FAST_PATH_MODE = os.getenv('DER_FAST_PATH', 'rules')
+DESCRIBE_MODEL = os.getenv('DER_DESCRIBE_MODEL', 'gpt-3.5-turbo')
+
+# "full" sends create_smart_prompt; "compact" sends create_compact_prompt, which
+# summarizes the whole log and is trimmed to PROMPT_TOKEN_BUDGET tokens
+PROMPT_MODE = os.getenv('DER_PROMPT_MODE', 'full')
+PROMPT_TOKEN_BUDGET = int(os.getenv('DER_PROMPT_TOKEN_BUDGET', 700))
+
+# The log sample in prompts: the EVIDENCE_ROWS most anomalous readings with
+# EVIDENCE_CONTEXT readings either side; 0 rows sends the first 15 lines instead
+EVIDENCE_ROWS = int(os.getenv('DER_EVIDENCE_ROWS', 5))
+EVIDENCE_CONTEXT = int(os.getenv('DER_EVIDENCE_CONTEXT', 1))
+
+# Uploads are read and parsed in pieces of this many bytes/characters
+STREAM_CHUNK_SIZE = int(os.getenv('DER_STREAM_CHUNK_SIZE', 1 << 20))
+
+# Unique logs of a /ask_llm/batch request classified at the same time
+BATCH_CONCURRENCY = int(os.getenv('DER_BATCH_CONCURRENCY', 8))
+batch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+
+# Live monitoring sessions are dropped after this many idle seconds
+MONITOR_SESSION_TTL = int(os.getenv('DER_MONITOR_SESSION_TTL', 3600))
+
+# Readings of logs and /monitor sessions analyzed for a site (?site=...) are kept in
+# this SQLite database for /analyze; the store is disabled unless a path is set
+TELEMETRY_DB = os.getenv('DER_TELEMETRY_DB', '')
+telemetry_store = TelemetryStore(TELEMETRY_DB) if TELEMETRY_DB else None
+# /monitor readings are written in the background, batched across requests
+telemetry_writer = StoreWriter(telemetry_store) if telemetry_store is not None else None
 
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    if 'request_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.request_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint, status=response.status_code)
+    return response
+
+# session id -> {'scorer': OnlineScorer, 'lock': Lock, 'last_seen': time}
+monitor_sessions = {}
+monitor_sessions_lock = threading.Lock()
+
 # Attack signatures based on the simulation code
 ATTACK_SIGNATURES = {
     "Battery Drain": {
@@ -94,229 +175,6 @@ ATTACK_SIGNATURES = {
     }
 }
 
-def parse_csv_log(log_data):
-    """Parse CSV log data into a structured format"""
-    try:
-        # If passed a file-like object, read and decode
-        if hasattr(log_data, 'read'):
-            log_data = log_data.read()
-            if isinstance(log_data, bytes):  # Handle binary reads
-                log_data = log_data.decode('utf-8')
-        # Parse CSV
-        reader = csv.reader(StringIO(log_data))
-        headers = next(reader)
-        rows = list(reader)
-        # Convert to numerical values where appropriate
-        parsed_data = []
-        for row in rows:
-            try:
-                # Convert timestamp to datetime
-                timestamp = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S')
-                # Convert numerical values, treating empty values as 0.0
-                numerical_values = [float(val) if val != '' else 0.0 for val in row[1:]]
-                
-                parsed_data.append({
-                    'timestamp': timestamp,
-                    'hour': timestamp.hour,
-                    'solar_generation': numerical_values[0],
-                    'home_load': numerical_values[1],
-                    'tesla_charger': numerical_values[2],
-                    'battery_charge': numerical_values[3],
-                    'battery_discharge': numerical_values[4],
-                    'grid_import': numerical_values[5],
-                    'grid_export': numerical_values[6]
-                })
-            except (ValueError, IndexError) as e:
-                print(f"Error parsing row: {e}")
-                continue  # Skip rows with parsing errors
-        
-        return {
-            'headers': headers,
-            'rows': parsed_data,
-            'row_count': len(parsed_data)
-        }
-    except Exception as e:
-        print(f"Error parsing CSV: {e}")
-        return None
-
-def analyze_log_data(parsed_log):
-    """Performs rule-based analysis on the parsed log data"""
-    if not parsed_log or parsed_log['row_count'] == 0:
-        return {
-            'analysis': "Unable to analyze: Invalid or empty log data",
-            'indicators': {},
-            'likely_attack': "Unknown",
-            'attack_likelihood': {
-                "Battery Drain": 0,
-                "Denial of Service": 0,
-                "Grid Manipulation": 0,
-                "Man-in-the-Middle": 0,
-                "Clean": 0
-            }
-        }
-
-    rows = parsed_log['rows']
-    indicators = {}
-    
-    print(f"Analyzing {len(rows)} rows of log data")
-    
-    # Complete data check
-    total_expected_hours = 24
-    indicators['complete_data'] = len(rows) >= total_expected_hours * 0.9  # Allow 10% missing
-    
-    # ----- BATTERY DRAIN INDICATORS -----
-    # Calculate high home load percentage
-    high_home_load_count = sum(1 for row in rows if row['home_load'] > 3.0)
-    indicators['high_home_load_pct'] = high_home_load_count / len(rows) if rows else 0
-    
-    # Calculate Tesla charging outside normal hours
-    expected_charging_hours = [11, 12, 13, 18, 19]
-    charging_in_expected = 0
-    charging_in_unexpected = 0
-    
-    for row in rows:
-        if row['tesla_charger'] > 5.0:  # Significant Tesla charging
-            if row['hour'] in expected_charging_hours:
-                charging_in_expected += 1
-            else:
-                charging_in_unexpected += 1
-    
-    indicators['tesla_charging_outside_normal'] = charging_in_unexpected > charging_in_expected
-    
-    # ----- DOS INDICATORS -----
-    # Check for missing data in critical periods
-    if len(rows) >= 2:
-        start_time = rows[0]['timestamp']
-        end_time = rows[-1]['timestamp']
-        expected_timestamps = set()
-        current_time = start_time
-        while current_time <= end_time:
-            expected_timestamps.add(current_time)
-            current_time += timedelta(hours=1)
-        
-        actual_timestamps = set(row['timestamp'] for row in rows)
-        missing_timestamps = expected_timestamps - actual_timestamps
-        indicators['missing_data_count'] = len(missing_timestamps)
-        
-        # Check specifically for peak hour missing data (10-14h & 18-20h)
-        peak_hours = [10, 11, 12, 13, 14, 18, 19, 20]
-        peak_hour_missing = sum(1 for ts in missing_timestamps if ts.hour in peak_hours)
-        indicators['peak_hour_missing_data'] = peak_hour_missing > len(peak_hours) * 0.3
-    else:
-        indicators['missing_data_count'] = 0
-        indicators['peak_hour_missing_data'] = False
-    
-    # Check for zeroed critical values
-    zeroed_entries = [row for row in rows if (row['solar_generation'] == 0 and 
-                                             row['battery_charge'] == 0)]
-    indicators['multiple_zeroed_values'] = len(zeroed_entries) > 3
-    
-    # ----- GRID MANIPULATION INDICATORS -----
-    # Check for impossible negative grid import values
-    negative_grid = [row for row in rows if row['grid_import'] < -0.1]  # Allow small measurement errors
-    indicators['negative_grid_values_count'] = len(negative_grid)
-    
-    # Check for abnormally high grid values
-    high_grid_values = [row for row in rows if row['grid_import'] > 12.0 or row['grid_export'] > 12.0]
-    indicators['high_grid_values_count'] = len(high_grid_values)
-    
-    # ----- MAN-IN-THE-MIDDLE INDICATORS -----
-    # Check for impossible solar generation at night
-    night_hours = [0, 1, 2, 3, 4, 5, 20, 21, 22, 23]
-    night_solar = [row for row in rows if row['hour'] in night_hours and row['solar_generation'] > 1.0]
-    indicators['night_solar_count'] = len(night_solar)
-    
-    # Check for erratic battery behavior
-    battery_values = [row['battery_charge'] for row in rows]
-    if len(battery_values) >= 3:
-        battery_diffs = [abs(battery_values[i] - battery_values[i-1]) for i in range(1, len(battery_values))]
-        indicators['erratic_battery'] = any(diff > 2.0 for diff in battery_diffs)
-    else:
-        indicators['erratic_battery'] = False
-    
-    # ----- Calculate attack scores -----
-    attack_likelihood = {
-        "Battery Drain": 0,
-        "Denial of Service": 0,
-        "Grid Manipulation": 0,
-        "Man-in-the-Middle": 0,
-        "Clean": 0
-    }
-    
-    # BATTERY DRAIN CRITERIA
-    # Must have both high home load and Tesla charging issues
-    if indicators['high_home_load_pct'] > 0.5:  # More than half of readings show high load
-        attack_likelihood["Battery Drain"] += 5
-    if indicators['tesla_charging_outside_normal']:
-        attack_likelihood["Battery Drain"] += 5
-    
-    # DOS CRITERIA
-    # Either significant missing data or zeroed values
-    if indicators['missing_data_count'] > 5:
-        attack_likelihood["Denial of Service"] += 3
-    if indicators['peak_hour_missing_data']:
-        attack_likelihood["Denial of Service"] += 3
-    if indicators['multiple_zeroed_values']:
-        attack_likelihood["Denial of Service"] += 4
-    
-    # GRID MANIPULATION CRITERIA
-    # Either negative grid values or very high grid values
-    if indicators['negative_grid_values_count'] > 0:
-        attack_likelihood["Grid Manipulation"] += 8  # Strong indicator
-    if indicators['high_grid_values_count'] > 2:
-        attack_likelihood["Grid Manipulation"] += 5
-    
-    # MAN-IN-THE-MIDDLE CRITERIA
-    # Must have impossible night solar AND erratic battery behavior
-    if indicators['night_solar_count'] > 0 and indicators['erratic_battery']:
-        attack_likelihood["Man-in-the-Middle"] += 5
-    
-    # CLEAN CRITERIA
-    clean_score = 0
-    if indicators['complete_data']:
-        clean_score += 2
-    if indicators['high_home_load_pct'] < 0.1:
-        clean_score += 2
-    if not indicators['tesla_charging_outside_normal']:
-        clean_score += 2
-    if indicators['negative_grid_values_count'] == 0:
-        clean_score += 2
-    if indicators['night_solar_count'] == 0:
-        clean_score += 2
-    if not indicators['erratic_battery']:
-        clean_score += 2
-    if indicators['missing_data_count'] < 3:
-        clean_score += 2
-    if not indicators['multiple_zeroed_values']:
-        clean_score += 2
-    
-    # Only set Clean score if no other attack has significant likelihood
-    max_attack_score = max(
-        attack_likelihood["Battery Drain"],
-        attack_likelihood["Denial of Service"],
-        attack_likelihood["Grid Manipulation"],
-        attack_likelihood["Man-in-the-Middle"]
-    )
-    
-    if max_attack_score < 5 and clean_score >= 10:
-        attack_likelihood["Clean"] = clean_score
-    
-    # Select most likely attack
-    likely_attack = max(attack_likelihood, key=attack_likelihood.get)
-    if attack_likelihood[likely_attack] < 5:
-        likely_attack = "Unknown"
-    
-    print(f"Attack scores: {attack_likelihood}")
-    print(f"Most likely attack: {likely_attack}")
-    print(f"indicators: {indicators}")
-    
-    return {
-        'analysis': f"Most likely classification: {likely_attack}",
-        'indicators': indicators,
-        'attack_likelihood': attack_likelihood,
-        'likely_attack': likely_attack
-    }
-
 def extract_classification(response):
     """Extract classification from a response string"""
     match = re.search(r"CLASSIFICATION:\s*(.*?)(?:\n|$)", response, re.IGNORECASE)
@@ -348,114 +206,94 @@ def extract_confidence(response):
     match = re.search(r"CONFIDENCE:\s*(\d+)%", response, re.IGNORECASE)
     return int(match.group(1)) if match else 0
 
-def query_openai(prompt, max_tokens=200, temperature=0.1):
-
-    try:
-        # Replace all smart quotes and other common non-ASCII characters
+def query_openai(prompt, max_tokens=200, temperature=0.1, sample=0, model=None):
+    """Query OpenAI, reusing a cached response for an identical request.
 
-        prompt = prompt.encode('ascii', errors='ignore').decode('ascii')
+    sample is the index of this call within an ensemble of identical prompts.
+    """
+    model = model or OPENAI_MODEL
+    # Replace all smart quotes and other common non-ASCII characters
+    prompt = prompt.encode('ascii', errors='ignore').decode('ascii')
 
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"OpenAI API Error: {str(e)}")
-        return f"Error: {str(e)}"
+    def request_completion():
+        start = time.perf_counter()
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            metrics.record_llm_response("openai", model, response, time.perf_counter() - start)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            metrics.llm_calls.inc(backend="openai", model=model, outcome="error")
+            print(f"OpenAI API Error: {str(e)}")
+            return f"Error: {str(e)}"
+
+    return cached_completion("openai", model, prompt, temperature, max_tokens, sample, request_completion)
+
+# Example logs used as few-shot examples in the prompt
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Data2', 'Logs')
+EXAMPLE_PATHS = {
+    "Battery Drain": [os.path.join(EXAMPLE_DIR, "bd", "bd_simulation_log_1.csv")],
+    "Denial of Service": [os.path.join(EXAMPLE_DIR, "dos", "dos_simulation_log_1.csv")],
+    "Grid Manipulation": [os.path.join(EXAMPLE_DIR, "gm", "gm_simulation_log_1.csv")],
+    "Man-in-the-Middle": [os.path.join(EXAMPLE_DIR, "mitm", "mitm_simulation_log_1.csv")],
+    "Clean": [os.path.join(EXAMPLE_DIR, "clean", "clean_simulation_log_1.csv")],
+    "Clean1": [os.path.join(EXAMPLE_DIR, "clean", "clean_simulation_log_2.csv")]
+}
 
 def read_examples():
-    paths = {
-        "Battery Drain": ["../Data2/Logs/bd/bd_simulation_log_1.csv"],
-        "Denial of Service": ["../Data2/Logs/dos/dos_simulation_log_1.csv"],
-        "Grid Manipulation": ["../Data2/Logs/gm/gm_simulation_log_1.csv"],
-        "Man-in-the-Middle": ["../Data2/Logs/mitm/mitm_simulation_log_1.csv"],
-        "Clean": ["../Data2/Logs/clean/clean_simulation_log_1.csv"],
-        "Clean1": ["../Data2/Logs/clean/clean_simulation_log_2.csv"]
-    }
-
+    """Read the first lines of each example log; labels whose files are missing are skipped"""
     examples = {}
-    def read_first_lines(file_path, num_lines=5):
-        with open(file_path, 'r') as f:
-            return '\n'.join([f.readline().strip() for _ in range(num_lines)])
-
-    for label, file_list in paths.items():
-        examples[label] = [read_first_lines(fp) for fp in file_list]
+    for label, file_list in EXAMPLE_PATHS.items():
+        try:
+            examples[label] = [read_first_lines(fp) for fp in file_list]
+        except OSError as e:
+            print(f"Example for {label} not available: {e}")
     return examples
 
-def create_smart_prompt(log_data, analysis_results):
-    """Create a smart prompt with log data, analysis results, and examples"""
-    indicators = analysis_results['indicators']
-    log_sample = "\n".join(log_data.split("\n")[:15])
-    
-    likely_attack = analysis_results['likely_attack']
-    
-    # Get attack signatures for the likely attack
-    # attack_signatures = ATTACK_SIGNATURES.get(likely_attack, {}).get('key_indicators', [])
-    # signature_text = "\n".join([f"- {sig}" for sig in attack_signatures])
-    bd_sig = ATTACK_SIGNATURES.get("Battery Drain", {}).get('key_indicators', [])
-    bd_signature_text = "\n".join([f"- {sig}" for sig in bd_sig])
-    clean_sig = ATTACK_SIGNATURES.get("Clean", {}).get('key_indicators', [])
-    clean_signature_text = "\n".join([f"- {sig}" for sig in clean_sig])
-    mitm_sig = ATTACK_SIGNATURES.get("Man-in-the-Middle", {}).get('key_indicators', [])
-    mitm_signature_text = "\n".join([f"- {sig}" for sig in mitm_sig])
-    dos_sig = ATTACK_SIGNATURES.get("Denial of Service", {}).get('key_indicators', [])
-    dos_signature_text = "\n".join([f"- {sig}" for sig in dos_sig])
-    gm_sig = ATTACK_SIGNATURES.get("Grid Manipulation", {}).get('key_indicators', [])
-    gm_signature_text = "\n".join([f"- {sig}" for sig in gm_sig])
-
-    
-    # Get example logs
+def signature_text(label):
+    """Bullet list of the key indicators for one attack signature"""
+    signatures = ATTACK_SIGNATURES.get(label, {}).get('key_indicators', [])
+    return "\n".join([f"- {sig}" for sig in signatures])
+
+def render_prompt_fragments():
+    """Pre-render the parts of the smart prompt that do not depend on the uploaded log"""
     example_logs = read_examples()
     
-    # Initialize example variables with safe defaults
-    battery_drain_example = "Example not available"
-    grid_manipulation_example = "Example not available"
-    clean_example = "Example not available"
-    dos_example = "Example not available"
-    mitm_example = "Example not available"
-    
-    # Safely extract examples if they exist
-    if "Battery Drain" in example_logs and example_logs["Battery Drain"]:
-        battery_drain_example = example_logs["Battery Drain"][0]
-    if "Grid Manipulation" in example_logs and example_logs["Grid Manipulation"]:
-        grid_manipulation_example = example_logs["Grid Manipulation"][0]
-    if "Clean" in example_logs and example_logs["Clean"]:
-        clean_example = example_logs["Clean"][0]
-    if "Denial of Service" in example_logs and example_logs["Denial of Service"]:
-        dos_example = example_logs["Denial of Service"][0]
-    if "Man-in-the-Middle" in example_logs and example_logs["Man-in-the-Middle"]:
-        mitm_example = example_logs["Man-in-the-Middle"][0]
+    def first_example(label):
+        if label in example_logs and example_logs[label]:
+            return example_logs[label][0]
+        return "Example not available"
     
     # Format examples with explanations
     examples_format = f"""
 EXAMPLE LOGS:
 
 BATTERY DRAIN EXAMPLE:
-{battery_drain_example}
+{first_example("Battery Drain")}
 Key indicators: Home load consistently >3.5kW, Tesla charging outside normal hours, rapid battery depletion
 
 GRID MANIPULATION EXAMPLE:
-{grid_manipulation_example}
+{first_example("Grid Manipulation")}
 Key indicators: Negative grid import values (physically impossible), abnormally high grid values
 
 CLEAN EXAMPLE:
-{clean_example}
+{first_example("Clean")}
 Key indicators: Normal solar generation curve, appropriate Tesla charging hours, balanced energy equations
 
 DENIAL OF SERVICE EXAMPLE:
-{dos_example}
+{first_example("Denial of Service")}
 Key indicators: Multiple zero values during peak hours, missing data in sequential time periods
 
 MAN-IN-THE-MIDDLE EXAMPLE:
-{mitm_example}
+{first_example("Man-in-the-Middle")}
 Key indicators: Solar generation at night (impossible), random battery fluctuations, unnatural energy patterns
 """
     
-    # Create a detailed prompt with analysis context and examples
-    prompt = f"""
+    preamble = f"""
 As a cybersecurity expert specializing in Distributed Energy Resource (DER) systems, analyze this log data to identify any security threats.
 
 DER security threats include:
@@ -468,7 +306,40 @@ DER security threats include:
 Look carefully at each metric and time pattern. ONLY select the classification that BEST matches the primary attack signature.
 
 {examples_format}
+"""
+    
+    signatures = f"""
+Key indicators for Battery Drain:
+{signature_text("Battery Drain")}
+
+Key indicators for Denial of Service:
+{signature_text("Denial of Service")}
 
+Key indicators for Grid Manipulation:
+{signature_text("Grid Manipulation")}
+
+Key indicators for Man-in-the-Middle:
+{signature_text("Man-in-the-Middle")}
+
+Key indicators for Clean Files (no attack):
+{signature_text("Clean")}
+"""
+    return {'preamble': preamble, 'signatures': signatures}
+
+# Rendered once at startup and re-rendered in the background when an example file changes
+prompt_fragments = FileRegistry(
+    [fp for file_list in EXAMPLE_PATHS.values() for fp in file_list],
+    render_prompt_fragments,
+    refresh_seconds=float(os.getenv('DER_EXAMPLE_REFRESH_SECONDS', 5))
+)
+
+def create_smart_prompt(log_data, analysis_results):
+    """Create a smart prompt with log data, analysis results, and examples"""
+    indicators = analysis_results['indicators']
+    fragments = prompt_fragments.get()
+    
+    # Only the log-specific parts are interpolated per request
+    prompt = f"""{fragments['preamble']}
 Initial analysis indicates these observations:
 - Complete data coverage: {indicators.get('complete_data', 'Unknown')}
 - Tesla charging outside normal hours: {indicators.get('tesla_charging_outside_normal', 'Unknown')}
@@ -480,56 +351,90 @@ Initial analysis indicates these observations:
 - High grid values count: {indicators.get('high_grid_values_count', 'Unknown')}
 - Nighttime solar generation count: {indicators.get('night_solar_count', 'Unknown')}
 - Erratic battery behavior: {indicators.get('erratic_battery', 'Unknown')}
+{fragments['signatures']}
+Based on your expertise and the example logs provided, analyze this log sample:
+{log_data}
 
-Key indicators for Battery Drain:
-{bd_signature_text}
+Respond with ONLY the following format:
+CLASSIFICATION: [select ONE from: "Battery Drain", "Denial of Service", "Grid Manipulation", "Man-in-the-Middle", "Clean"]
+DESCRIPTION: [key indicators observed in the log data]
+CONFIDENCE: [percentage]%
+"""
+    return prompt
 
-Key indicators for Denial of Service:
-{dos_signature_text}
+# One line per threat, as in the full prompt's preamble
+THREAT_DEFINITIONS = {
+    "Battery Drain": "Home load >3kW AND Tesla charging outside hours [11,12,13,18,19]. Normal grid values.",
+    "Denial of Service": "Data outages 10-14h & 18-20h OR zeroed values. Missing sequential data points.",
+    "Grid Manipulation": "Import/export amplified 1.8-3x OR negative grid values (physically impossible).",
+    "Man-in-the-Middle": "Solar/battery altered by 50-150% AND random fluctuations throughout day.",
+    "Clean": "Normal operation with no security threats - solar generation follows expected curve, normal grid values."
+}
 
-Key indicators for Grid Manipulation:
-{gm_signature_text}
+def create_compact_prompt(log_data, analysis_results, summary, budget=PROMPT_TOKEN_BUDGET, top_labels=2):
+    """Token-budgeted prompt: threats and signatures for the top rule scores only,
+    and a summary of the whole log (column stats + flagged readings) instead of its head.
 
-Key indicators for Man-in-the-Middle:
-{mitm_signature_text}
+    Flagged readings are dropped until the prompt fits the budget.
+    """
+    scores = analysis_results['attack_likelihood']
+    ranked = sorted(THREAT_DEFINITIONS, key=lambda label: -scores.get(label, 0))
+    labels = [label for label in ranked if scores.get(label, 0) > 0][:top_labels] or ["Clean"]
+    headers = log_data.split("\n", 1)[0].strip().split(",")
+    
+    threats = "\n".join(f"- {label}: {THREAT_DEFINITIONS[label]}\n{signature_text(label)}" for label in labels)
+    indicators = "; ".join(f"{name}={value}" for name, value in analysis_results['indicators'].items())
+    
+    for rows_per_flag in range(summary.rows_per_flag, -1, -1):
+        prompt = f"""As a DER cybersecurity expert, classify this log. Rule-based scores point to: {", ".join(labels)}.
+{threats}
 
-Key indicators for Clean Files (no attack):
-{clean_signature_text}
+Rule indicators: {indicators}
 
-Based on your expertise and the example logs provided, analyze this log sample:
-{log_sample}
+{summary.render(headers, rows_per_flag, labels)}
 
-Respond with ONLY the following format:
-CLASSIFICATION: [select ONE from: "Battery Drain", "Denial of Service", "Grid Manipulation", "Man-in-the-Middle", "Clean"]
+Respond with ONLY:
+CLASSIFICATION: [ONE of "Battery Drain", "Denial of Service", "Grid Manipulation", "Man-in-the-Middle", "Clean"]
 DESCRIPTION: [key indicators observed in the log data]
 CONFIDENCE: [percentage]%
 """
+        if count_tokens(prompt) <= budget:
+            break
     return prompt
 
-def multi_query(log):
-    """Perform multiple queries with different prompts and approaches"""
-    # First, parse and analyze the log data
-    parsed_log = parse_csv_log(log)
-    analysis_results = analyze_log_data(parsed_log)
+def build_prompt(log, analysis_results, summary=None):
+    """The prompt for PROMPT_MODE; compact mode needs the log's LogSummary"""
+    if PROMPT_MODE == 'compact' and summary is not None:
+        return create_compact_prompt(log, analysis_results, summary), 'compact'
+    return create_smart_prompt(log, analysis_results), 'full'
+
+def multi_query(log, analysis_results=None, summary=None):
+    """Perform multiple queries with different prompts and approaches.
+
+    `log` is the log sample used in the prompt when analysis_results are
+    passed in; otherwise it is the whole log, which is parsed here.
+    """
+    if analysis_results is None:
+        parsed_log = parse_csv_log(log)
+        analysis_results = analyze_log_data(parsed_log)
+        log = sample_from_parsed(log, parsed_log)
     
     print(f"Initial analysis indicates: {analysis_results['likely_attack']}")
     print(f"Attack likelihood scores: {analysis_results['attack_likelihood']}")
     
-    responses = []
-    
     # Create a smart prompt using the analysis results
-    smart_prompt = create_smart_prompt(log, analysis_results)
+    with metrics.stage_seconds.time(stage="prompt"):
+        smart_prompt, mode = build_prompt(log, analysis_results, summary)
+    tokens = count_tokens(smart_prompt)
+    metrics.prompt_tokens.observe(tokens, mode=mode)
+    print(f"Prompt tokens: {tokens} ({mode})")
     # print(smart_prompt)
     
-    # Run multiple queries with the smart prompt
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(lambda: query_openai(smart_prompt, max_tokens=250)) for _ in range(3)]
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                responses.append(future.result())
-            except Exception as e:
-                print(f"Thread error: {e}")
-                responses.append(f"Error in thread: {str(e)}")
+    # Query until enough samples agree, adding samples only on split votes
+    with metrics.stage_seconds.time(stage="llm"):
+        responses = adaptive_vote(lambda sample: query_openai(smart_prompt, max_tokens=250, sample=sample),
+                                  extract_classification, executor=llm_executor,
+                                  accept=rules_accept(analysis_results))
     # for i, response in enumerate(responses):
     #     print(f"Response {i+1}:")
     #     print(response)
@@ -538,6 +443,20 @@ def multi_query(log):
     #     print("---")
     return responses, analysis_results
 
+# final_output lets a rule-based score above RULE_OVERRIDE_SCORE override an LLM
+# majority of fewer than RULE_OVERRIDE_VOTES votes
+RULE_OVERRIDE_SCORE = 3
+RULE_OVERRIDE_VOTES = 3
+
+def rules_accept(analysis_results):
+    """accept() for adaptive_vote: an early consensus against a strong rule-based
+    result is only final with RULE_OVERRIDE_VOTES votes, so keep sampling"""
+    rule_classification = analysis_results['likely_attack']
+    rule_score = analysis_results['attack_likelihood'].get(rule_classification, 0)
+    if rule_classification == "Unknown" or rule_score <= RULE_OVERRIDE_SCORE:
+        return None
+    return lambda label: label == rule_classification
+
 def final_output(responses, analysis_results):
     """Generate final classification output"""
     # Extract classifications and count occurrences
@@ -573,7 +492,7 @@ def final_output(responses, analysis_results):
         rule_score = analysis_results['attack_likelihood'].get(rule_based_classification, 0)
         
         # If rule-based score is significantly higher, override
-        if rule_score > 3 and llm_count < 3:
+        if rule_score > RULE_OVERRIDE_SCORE and llm_count < RULE_OVERRIDE_VOTES:
             final_classification = rule_based_classification
             print(f"Rule-based classification ({rule_based_classification}, score {rule_score}) overrode LLM classification ({majority_classification}, count {llm_count})")
     
@@ -615,67 +534,478 @@ def final_output(responses, analysis_results):
         "confidence": final_confidence
     }
 
+def rule_based_output(analysis_results):
+    """Build a final_output-shaped result from the rule scores alone"""
+    indicators = analysis_results['indicators']
+    attack_likelihood = analysis_results['attack_likelihood']
+    classification = analysis_results['likely_attack']
+    
+    # Report the indicator values behind the rules that scored this label
+    evidence = DEFAULT_RULES.evidence(indicators, classification)
+    observed = [f"{name.replace('_', ' ')} = {indicators[name]}" for name in dict.fromkeys(c[0] for c in evidence)]
+    signatures = ATTACK_SIGNATURES.get(classification, {}).get('key_indicators', [])
+    description = f"Rule-based detection ({classification}, score {attack_likelihood[classification]}): {'; '.join(observed)}. {'; '.join(signatures)}"
+    
+    confidence = min(98, 70 + 2 * DEFAULT_RULES.margin(attack_likelihood))
+    return {
+        "classification": classification,
+        "description": description,
+        "confidence": confidence,
+        "tier": "rules"
+    }
+
+def create_description_prompt(log_data, analysis_results):
+    """Short prompt asking only for a description of an already-classified log"""
+    indicators = "\n".join(f"- {name}: {value}" for name, value in analysis_results['indicators'].items())
+    return f"""
+As a cybersecurity expert specializing in Distributed Energy Resource (DER) systems, explain why this log shows {analysis_results['likely_attack']}.
+
+Rule-based indicators:
+{indicators}
+
+Log sample:
+{log_data}
+
+Respond with ONLY the following format:
+DESCRIPTION: [key indicators observed in the log data]
+"""
+
+def classify_log(log_sample, analysis_results, summary=None):
+    """Answer with the cheapest tier that is confident enough.
+
+    Returns (result dict, LLM responses); result['tier'] says which tier answered.
+    summary is the log's LogSummary, used by the compact prompt.
+    """
+    if FAST_PATH_MODE != 'off' and DEFAULT_RULES.is_decisive(analysis_results['attack_likelihood'], analysis_results['likely_attack']):
+        with metrics.stage_seconds.time(stage="rule_output"):
+            result_dict = rule_based_output(analysis_results)
+        print(f"Rule-based fast path: {result_dict['classification']} (margin {DEFAULT_RULES.margin(analysis_results['attack_likelihood'])})")
+        if FAST_PATH_MODE != 'describe':
+            return result_dict, []
+        with metrics.stage_seconds.time(stage="llm"):
+            response = llm_executor.submit(query_openai, create_description_prompt(log_sample, analysis_results),
+                                           max_tokens=150, model=DESCRIBE_MODEL).result()
+        description = extract_description(response)
+        if not response.startswith("Error") and len(description) >= 20:
+            result_dict['description'] = description
+            result_dict['tier'] = "rules+description"
+        return result_dict, [response]
+    
+    # Step 1: Run multi-query with analysis
+    responses, analysis_results = multi_query(log_sample, analysis_results, summary)
+    if not responses or not analysis_results:
+        return None, responses
+    
+    # Step 2: Use final_output to process the responses
+    with metrics.stage_seconds.time(stage="final_output"):
+        result_dict = final_output(responses, analysis_results)
+    result_dict['tier'] = "llm"
+    return result_dict, responses
+
+def cache_key_seed():
+    """Everything besides the log content that determines a classification"""
+    return (f"{OPENAI_MODEL}|{PROMPT_VERSION}|{DEFAULT_RULES.fingerprint}|{FAST_PATH_MODE}|"
+            f"{PROMPT_MODE}:{PROMPT_TOKEN_BUDGET}|{EVIDENCE_ROWS}:{EVIDENCE_CONTEXT}|")
+
+def format_result(result_dict):
+    return f"CLASSIFICATION: {result_dict['classification']}\nDESCRIPTION: {result_dict['description']}\nCONFIDENCE: {result_dict['confidence']}%"
+
+def count_classification(result_dict, cached):
+    metrics.classifications.inc(label=result_dict['classification'], tier=result_dict.get('tier', "llm"),
+                                cached=str(cached).lower())
+
+def new_summary():
+    """A LogSummary to collect while parsing, when the prompt mode needs one"""
+    return LogSummary(DEFAULT_RULES.thresholds) if PROMPT_MODE == 'compact' else None
+
+def new_evidence():
+    """An EvidenceExtractor choosing the prompt's log sample, or None to send the head of the log"""
+    return EvidenceExtractor(DEFAULT_RULES.thresholds, EVIDENCE_ROWS, EVIDENCE_CONTEXT) if EVIDENCE_ROWS > 0 else None
+
+def new_ingest(site):
+    """A StoreIngest writing a log's readings to the telemetry store, or None without a site or store"""
+    return StoreIngest(telemetry_store, site) if site and telemetry_store is not None else None
+
+def sample_from_parsed(log, parsed_log):
+    """Prompt log sample for a log already parsed with parse_csv_log"""
+    evidence = new_evidence()
+    if evidence is None or not parsed_log or parsed_log['row_count'] == 0:
+        return head_lines(log)
+    evidence.update(parsed_log['columns'])
+    return evidence.render(parsed_log['headers']) or head_lines(log)
+
+def classify_and_cache(cache_key, log_sample, analysis_results, summary=None):
+    """classify_log, caching the result only if every LLM call succeeded"""
+    result_dict, responses = classify_log(log_sample, analysis_results, summary)
+    if result_dict is not None and not any(r.startswith("Error") for r in responses):
+        result_cache.set(cache_key, result_dict)
+    return result_dict
+
 @app.route('/ask_llm', methods=['POST'])
 def ask_llm():
-    file_contents = None
+    chunks = None
+    parser = None
+    # Readings are stored under this site when one is given
+    site = request.args.get('site')
+    try:
+        windows = window_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid window: {str(e)}"}), 400
+    windowed = WindowedDetector(*windows) if windows else None
     
     # Check if content is JSON format
     if request.is_json:
         data = request.get_json()
         if 'file' not in data:
             return jsonify({"error": "No file content provided."}), 400
+        site = site or data.get('site')
         
         file_contents = data['file']
-        # Handle base64 encoded content
+        # Handle base64 encoded content, decoded piece by piece as it is parsed
         if data.get('isBase64', False):
-            import base64
-            try:
-                file_contents = base64.b64decode(file_contents).decode('utf-8')
-            except Exception as e:
-                return jsonify({"error": f"Failed to decode base64 content: {str(e)}"}), 400
+            chunks = iter_base64_chunks(file_contents, STREAM_CHUNK_SIZE)
+            decode_error = "Failed to decode base64 content"
+        else:
+            chunks = iter_text_chunks(file_contents, STREAM_CHUNK_SIZE)
+            decode_error = "Failed to read file"
     
     # Check if content is form data with file
     elif 'file' in request.files:
         file = request.files['file']
         if file.filename == '':
             return jsonify({"error": "No file selected."}), 400
+        site = site or request.form.get('site')
         
-        try:
-            file_contents = file.read().decode('utf-8')
-        except Exception as e:
-            return jsonify({"error": f"Failed to read file: {str(e)}"}), 400
+        # Read the upload in chunks instead of loading it all into memory
+        chunks = iter_stream_chunks(file.stream, STREAM_CHUNK_SIZE)
+        decode_error = "Failed to read file"
+        if is_binary_upload(file.filename, file.mimetype):
+            parser, decode_error = BinaryStreamParser(), "Invalid binary log"
+    
+    # Binary log posted as the raw body
+    elif request.mimetype == BINARY_MEDIA_TYPE:
+        chunks = iter_stream_chunks(request.stream, STREAM_CHUNK_SIZE)
+        parser, decode_error = BinaryStreamParser(), "Invalid binary log"
     
     else:
-        return jsonify({"error": "Expected JSON data or file upload."}), 400
+        return jsonify({"error": "Expected JSON data, file upload or a binary log."}), 400
     
     try:
-        # Use StringIO to simulate a file object for parsing
-        decoded_file = StringIO(file_contents)
-        parsed = parse_csv_log(decoded_file)
-
-        if parsed is None or parsed.get("row_count", 0) == 0:
+        # Parse and analyze the log once, chunk by chunk, hashing the content as it goes
+        digest = hashlib.sha256(cache_key_seed().encode('utf-8'))
+        timings = {}
+        summary = new_summary()
+        observers = [observer for observer in (summary, new_ingest(site), windowed) if observer]
+        try:
+            analysis_results, log_sample, row_count = analyze_log_stream(chunks, digest=digest, timings=timings,
+                                                                         observers=observers,
+                                                                         evidence=new_evidence(), parser=parser)
+        except (binascii.Error, UnicodeDecodeError, BinaryLogError) as e:
+            return jsonify({"error": f"{decode_error}: {str(e)}"}), 400
+        finally:
+            for stage, seconds in timings.items():
+                metrics.stage_seconds.observe(seconds, stage=stage)
+
+        if analysis_results is None or row_count == 0:
             return jsonify({"error": "CSV log appears empty or invalid."}), 400
 
-        print(f"Received file with {parsed['row_count']} rows")
-
-        # Step 1: Run multi-query with analysis
-        responses, analysis_results = multi_query(file_contents)
+        print(f"Received file with {row_count} rows")
 
-        if not responses or not analysis_results:
-            return jsonify({"error": "Failed to analyze the CSV data"}), 500
+        cache_key = digest.hexdigest()
+        with metrics.stage_seconds.time(stage="cache_lookup"):
+            result_dict = result_cache.get(cache_key)
+        cached = result_dict is not None
+        if not cached:
+            result_dict = classify_and_cache(cache_key, log_sample, analysis_results, summary)
 
-        # Step 2: Use final_output to process the responses
-        result_dict = final_output(responses, analysis_results)
+            if result_dict is None:
+                return jsonify({"error": "Failed to analyze the CSV data"}), 500
 
-        final_result = f"CLASSIFICATION: {result_dict['classification']}\nDESCRIPTION: {result_dict['description']}\nCONFIDENCE: {result_dict['confidence']}%"
-        print(f"Final classification: {final_result}")
+        final_result = format_result(result_dict)
+        count_classification(result_dict, cached)
+        print(f"Final classification{' (cached)' if cached else ''}: {final_result}")
         # print(f"Sending response: {final_result}")
         
-        return jsonify({"response": final_result})
+        response = {"response": final_result, "tier": result_dict.get('tier', "llm"), "cached": cached}
+        if windowed is not None:
+            response["windowed"] = windowed.result()
+        return jsonify(response)
     
     except Exception as e:
         print(f"Exception in ask_llm: {str(e)}")
         return jsonify({"error": f"Exception occurred: {str(e)}"}), 500
 
+@app.route('/ask_llm/batch', methods=['POST'])
+def ask_llm_batch():
+    """Classify many logs in one request, streaming one NDJSON line per file.
+
+    Accepts multipart CSVs and/or zip/tar archives (fields 'files' or
+    'file'), or a zip/tar archive as the raw body. Logs are parsed and
+    rule-scored in worker processes and identical logs are classified only
+    once. Lines are sent as files finish; the last line is a summary.
+    """
+    if request.files:
+        uploads = [(f.filename, f.stream) for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    elif request.mimetype in ARCHIVE_MIMETYPES:
+        uploads = [(ARCHIVE_MIMETYPES[request.mimetype], BytesIO(request.get_data()))]
+    else:
+        return jsonify({"error": "Expected a zip/tar archive or multipart CSV files."}), 400
+
+    try:
+        logs = collect_logs(uploads)
+    except (ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+        return jsonify({"error": f"Failed to read batch: {str(e)}"}), 400
+    if not logs:
+        return jsonify({"error": "No CSV logs found in the upload."}), 400
+
+    print(f"Received batch of {len(logs)} logs")
+    pool = score_pool()
+    seed = cache_key_seed()
+    summarize = PROMPT_MODE == 'compact'
+    scoring = {pool.submit(score_log, data, seed, STREAM_CHUNK_SIZE, summarize, new_evidence()): name for name, data in logs}
+
+    def generate():
+        counts = Counter()
+        errors = 0
+        results = {}      # cache key -> result_dict, for logs finished in this batch
+        waiting = {}      # cache key -> names of files waiting on that classification
+        classifying = {}  # future -> cache key
+        pending = set(scoring)
+
+        def result_line(name, result_dict, cached, duplicate):
+            counts[result_dict['classification']] += 1
+            count_classification(result_dict, cached or duplicate)
+            return json.dumps({
+                "file": name,
+                "response": format_result(result_dict),
+                "classification": result_dict['classification'],
+                "confidence": result_dict['confidence'],
+                "tier": result_dict.get('tier', "llm"),
+                "cached": cached,
+                "duplicate": duplicate
+            }) + "\n"
+
+        while pending or classifying:
+            done, _ = concurrent.futures.wait(pending | set(classifying), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future in pending:
+                    pending.discard(future)
+                    name = scoring[future]
+                    try:
+                        analysis_results, log_sample, row_count, cache_key, summary = future.result()
+                    except Exception as e:
+                        errors += 1
+                        yield json.dumps({"file": name, "error": f"Failed to read file: {str(e)}"}) + "\n"
+                        continue
+                    if analysis_results is None or row_count == 0:
+                        errors += 1
+                        yield json.dumps({"file": name, "error": "CSV log appears empty or invalid."}) + "\n"
+                        continue
+
+                    # Identical content: reuse the result instead of prompting again
+                    if cache_key in results:
+                        yield result_line(name, results[cache_key], False, True)
+                        continue
+                    if cache_key in waiting:
+                        waiting[cache_key].append(name)
+                        continue
+                    result_dict = result_cache.get(cache_key)
+                    if result_dict is not None:
+                        results[cache_key] = result_dict
+                        yield result_line(name, result_dict, True, False)
+                        continue
+                    waiting[cache_key] = [name]
+                    classifying[batch_executor.submit(classify_and_cache, cache_key, log_sample, analysis_results, summary)] = cache_key
+                else:
+                    cache_key = classifying.pop(future)
+                    names = waiting.pop(cache_key)
+                    try:
+                        result_dict = future.result()
+                    except Exception as e:
+                        print(f"Exception in ask_llm_batch: {str(e)}")
+                        result_dict = None
+                    if result_dict is None:
+                        errors += len(names)
+                        for name in names:
+                            yield json.dumps({"file": name, "error": "Failed to analyze the CSV data"}) + "\n"
+                        continue
+                    results[cache_key] = result_dict
+                    for i, name in enumerate(names):
+                        yield result_line(name, result_dict, False, i > 0)
+
+        summary = {
+            "files": len(scoring),
+            "classified": sum(counts.values()),
+            "errors": errors,
+            "unique_logs": len(results),
+            "classifications": dict(counts)
+        }
+        print(f"Batch summary: {summary}")
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the classification and LLM response caches"""
+    return jsonify({"results": result_cache.stats(), "llm": llm_cache_stats()})
+
+def cache_metrics():
+    samples = []
+    for name, stats in (("results", result_cache.stats()), ("llm", llm_cache_stats())):
+        samples += [((name, "hit"), stats['hits']), ((name, "miss"), stats['misses'])]
+    return samples
+
+def executor_metrics():
+    stats = llm_executor.stats()
+    return [(("queued",), stats['queued']), (("active",), stats['active'])]
+
+metrics.register(metrics.CallbackMetric(
+    "der_cache_requests_total", "Cache lookups by cache and result", "counter", ["cache", "result"], cache_metrics))
+metrics.register(metrics.CallbackMetric(
+    "der_llm_executor_calls", "LLM calls waiting for or holding a worker", "gauge", ["state"], executor_metrics))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text-format metrics"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/pool_stats', methods=['GET'])
+def get_pool_stats():
+    """Queue, concurrency and connection counters of the shared LLM pools"""
+    return jsonify(pool_stats())
+
+def get_monitor_session(session_id, create=False):
+    """Look up (or create) a live monitoring session, expiring idle ones"""
+    now = time.time()
+    with monitor_sessions_lock:
+        for sid in [sid for sid, s in monitor_sessions.items() if now - s['last_seen'] > MONITOR_SESSION_TTL]:
+            del monitor_sessions[sid]
+        session = monitor_sessions.get(session_id)
+        if session is None and create:
+            session = {'scorer': OnlineScorer(), 'lock': threading.Lock(), 'last_seen': now}
+            monitor_sessions[session_id] = session
+        if session is not None:
+            session['last_seen'] = now
+        return session
+
+def monitor_response(session_id, scorer):
+    analysis = scorer.analysis()
+    return jsonify({
+        "session": session_id,
+        "row_count": scorer.row_count,
+        "likely_attack": analysis['likely_attack'],
+        "attack_likelihood": analysis['attack_likelihood'],
+        "indicators": analysis['indicators']
+    })
+
+@app.route('/monitor/<session_id>', methods=['POST'])
+def monitor_append(session_id):
+    """Append readings to a live session and return the updated classification.
+
+    Accepts JSON {"rows": [[timestamp, solar, home, tesla, battery_charge,
+    battery_discharge, grid_import, grid_export], ...]}, JSON {"csv": "..."}
+    or a raw text/csv body. A leading header row is ignored. With a site
+    (?site=... or "site" in the JSON body) the session's readings are also
+    kept in the telemetry store under that site.
+    """
+    site = request.args.get('site')
+    if request.is_json:
+        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object."}), 400
+        site = site or data.get('site')
+        if 'rows' in data:
+            if not isinstance(data['rows'], list) or not all(isinstance(row, list) for row in data['rows']):
+                return jsonify({"error": "'rows' must be a list of rows, each a list of values."}), 400
+            rows = [[str(val) for val in row] for row in data['rows']]
+        elif 'csv' in data:
+            if not isinstance(data['csv'], str):
+                return jsonify({"error": "'csv' must be a string."}), 400
+            rows = list(csv.reader(StringIO(data['csv'])))
+        else:
+            return jsonify({"error": "Expected 'rows' or 'csv' in JSON body."}), 400
+    elif request.mimetype == 'text/csv':
+        rows = list(csv.reader(StringIO(request.get_data(as_text=True))))
+    else:
+        return jsonify({"error": "Expected JSON data or a text/csv body."}), 400
+
+    if rows and rows[0] and rows[0][0] == "Timestamp":
+        rows = rows[1:]
+
+    session = get_monitor_session(session_id, create=True)
+    columns, _ = rows_to_columns(rows)
+    with session['lock']:
+        session['scorer'].update(columns)
+        if site and telemetry_writer is not None:
+            telemetry_writer.submit(site, columns)
+        return monitor_response(session_id, session['scorer'])
+
+@app.route('/monitor/<session_id>', methods=['GET'])
+def monitor_status(session_id):
+    """Return the current classification of a live session"""
+    session = get_monitor_session(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown monitoring session."}), 404
+    with session['lock']:
+        return monitor_response(session_id, session['scorer'])
+
+@app.route('/monitor/<session_id>', methods=['DELETE'])
+def monitor_end(session_id):
+    """Discard a live session"""
+    with monitor_sessions_lock:
+        session = monitor_sessions.pop(session_id, None)
+    if session is None:
+        return jsonify({"error": "Unknown monitoring session."}), 404
+    return jsonify({"session": session_id, "row_count": session['scorer'].row_count})
+
+def analyze_range_response(args):
+    """(JSON body, status) for GET /analyze, shared with the async API"""
+    if telemetry_store is None:
+        return {"error": "The telemetry store is disabled (DER_TELEMETRY_DB)."}, 404
+    site = args.get('site')
+    if not site:
+        return {"sites": telemetry_store.sites()}, 200
+    try:
+        start = parse_time(args['from']) if args.get('from') else None
+        end = parse_time(args['to'], end=True) if args.get('to') else None
+        windows = window_options(args)
+    except ValueError as e:
+        return {"error": f"Invalid time range or window: {str(e)}"}, 400
+    # Include /monitor readings still waiting to be written
+    telemetry_writer.flush()
+    query_start = time.perf_counter()
+    analysis_results, row_count, source = telemetry_store.analyze(site, start, end)
+    query_ms = round((time.perf_counter() - query_start) * 1000, 2)
+    if analysis_results is None:
+        return {"error": f"No readings for site {site!r} in that range."}, 404
+    body = {
+        "site": site,
+        "from": args.get('from'),
+        "to": args.get('to'),
+        "row_count": row_count,
+        "likely_attack": analysis_results['likely_attack'],
+        "attack_likelihood": analysis_results['attack_likelihood'],
+        "indicators": analysis_results['indicators'],
+        "source": source,
+        "query_ms": query_ms
+    }
+    if windows:
+        # Windows need every reading, not the daily aggregates
+        body["windowed"] = detect_windows(telemetry_store.readings(site, start, end), *windows)
+    return body, 200
+
+@app.route('/analyze', methods=['GET'])
+def analyze_range():
+    """Rule-based analysis of a site's stored readings between ?from= and ?to= (ISO dates or times).
+
+    from is inclusive and to exclusive; a bare date as to includes that
+    whole day. With ?window=<hours>[&stride=<hours>] the attack intervals
+    found by sliding-window detection are added. Without ?site= the stored
+    sites are listed.
+    """
+    body, status = analyze_range_response(request.args)
+    return jsonify(body), status
+
 if __name__ == '__main__':
     app.run(debug=True, port=8000)
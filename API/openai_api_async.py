@@ -0,0 +1,313 @@
+# Asyncio (ASGI) version of the /ask_llm service in openai_api3.py, with the
+# same request/response contract. LLM calls are coroutines on an AsyncOpenAI
+# client, so one process can hold hundreds of in-flight classifications;
+# parsing runs in a worker thread to keep the event loop free.
+#
+# Run with:  uvicorn openai_api_async:app --port 8000
+import asyncio
+import binascii
+import hashlib
+import os
+import time
+
+from openai import AsyncOpenAI
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import metrics
+from der_binary import BinaryLogError, BinaryStreamParser, MEDIA_TYPE as BINARY_MEDIA_TYPE, is_binary_upload
+from der_logs import iter_text_chunks, iter_stream_chunks, iter_base64_chunks
+from indicators import analyze_log_stream, DEFAULT_RULES
+from ensemble import adaptive_vote_async
+from llm_cache import cached_completion_async, cache_stats as llm_cache_stats
+from token_count import count_tokens
+from windowed import WindowedDetector, window_options
+from llm_pool import LLM_ASYNC_CONCURRENCY, LLM_ASYNC_MAX_CONNECTIONS, async_http_client, http_stats
+from openai_api3 import (
+    OPENAI_MODEL, FAST_PATH_MODE, DESCRIBE_MODEL, STREAM_CHUNK_SIZE,
+    result_cache, extract_classification, extract_description, build_prompt, cache_key_seed, new_summary, new_evidence,
+    new_ingest, final_output, rules_accept, rule_based_output, create_description_prompt, count_classification, analyze_range_response
+)
+
+llm_http_client = async_http_client()
+async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=llm_http_client)
+# Limits LLM calls in flight across all requests; further calls wait their turn
+llm_slots = asyncio.Semaphore(LLM_ASYNC_CONCURRENCY)
+llm_in_flight = 0
+
+
+async def query_openai_async(prompt, max_tokens=200, temperature=0.1, sample=0, model=None):
+    """Async query_openai: same prompt cleaning, cache key and error strings"""
+    model = model or OPENAI_MODEL
+    # Replace all smart quotes and other common non-ASCII characters
+    prompt = prompt.encode('ascii', errors='ignore').decode('ascii')
+
+    async def request_completion():
+        global llm_in_flight
+        async with llm_slots:
+            llm_in_flight += 1
+            start = time.perf_counter()
+            try:
+                response = await async_client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+                metrics.record_llm_response("openai", model, response, time.perf_counter() - start)
+                return response.choices[0].message.content.strip()
+            except Exception as e:
+                metrics.llm_calls.inc(backend="openai", model=model, outcome="error")
+                print(f"OpenAI API Error: {str(e)}")
+                return f"Error: {str(e)}"
+            finally:
+                llm_in_flight -= 1
+
+    return await cached_completion_async("openai", model, prompt, temperature, max_tokens, sample, request_completion)
+
+
+async def multi_query_async(log_sample, analysis_results, summary=None):
+    """Async multi_query: adaptive voting over concurrent LLM calls"""
+    print(f"Initial analysis indicates: {analysis_results['likely_attack']}")
+    print(f"Attack likelihood scores: {analysis_results['attack_likelihood']}")
+
+    with metrics.stage_seconds.time(stage="prompt"):
+        smart_prompt, mode = build_prompt(log_sample, analysis_results, summary)
+    tokens = count_tokens(smart_prompt)
+    metrics.prompt_tokens.observe(tokens, mode=mode)
+    print(f"Prompt tokens: {tokens} ({mode})")
+    with metrics.stage_seconds.time(stage="llm"):
+        return await adaptive_vote_async(lambda sample: query_openai_async(smart_prompt, max_tokens=250, sample=sample),
+                                         extract_classification, accept=rules_accept(analysis_results))
+
+
+async def classify_log_async(log_sample, analysis_results, summary=None):
+    """Async classify_log: rule fast path first, then the LLM ensemble"""
+    if FAST_PATH_MODE != 'off' and DEFAULT_RULES.is_decisive(analysis_results['attack_likelihood'], analysis_results['likely_attack']):
+        with metrics.stage_seconds.time(stage="rule_output"):
+            result_dict = rule_based_output(analysis_results)
+        print(f"Rule-based fast path: {result_dict['classification']} (margin {DEFAULT_RULES.margin(analysis_results['attack_likelihood'])})")
+        if FAST_PATH_MODE != 'describe':
+            return result_dict, []
+        with metrics.stage_seconds.time(stage="llm"):
+            response = await query_openai_async(create_description_prompt(log_sample, analysis_results),
+                                                max_tokens=150, model=DESCRIBE_MODEL)
+        description = extract_description(response)
+        if not response.startswith("Error") and len(description) >= 20:
+            result_dict['description'] = description
+            result_dict['tier'] = "rules+description"
+        return result_dict, [response]
+
+    responses = await multi_query_async(log_sample, analysis_results, summary)
+    if not responses:
+        return None, responses
+
+    with metrics.stage_seconds.time(stage="final_output"):
+        result_dict = final_output(responses, analysis_results)
+    result_dict['tier'] = "llm"
+    return result_dict, responses
+
+
+def iter_async_chunks(stream, loop, chunk_size):
+    """Yield an async byte stream's data, for a worker thread, in pieces of about chunk_size bytes.
+
+    Each part is awaited on the event loop only when the consumer needs it,
+    so at most one piece of the body is held in memory at a time.
+    """
+    iterator = stream.__aiter__()
+    buffer = bytearray()
+    while True:
+        try:
+            part = asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+        except StopAsyncIteration:
+            break
+        buffer += part
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def is_json_request(request):
+    """Same test as Flask's request.is_json"""
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    return mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+
+async def ask_llm(request):
+    upload = None
+    parser = None
+    # Readings are stored under this site when one is given
+    site = request.query_params.get('site')
+    try:
+        windows = window_options(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid window: {str(e)}"}, status_code=400)
+    windowed = WindowedDetector(*windows) if windows else None
+
+    # Check if content is JSON format
+    if is_json_request(request):
+        try:
+            data = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "Invalid JSON body."}, status_code=400)
+        if not isinstance(data, dict) or 'file' not in data:
+            return JSONResponse({"error": "No file content provided."}, status_code=400)
+        site = site or data.get('site')
+
+        file_contents = data['file']
+        # Handle base64 encoded content, decoded piece by piece as it is parsed
+        if data.get('isBase64', False):
+            chunks = iter_base64_chunks(file_contents, STREAM_CHUNK_SIZE)
+            decode_error = "Failed to decode base64 content"
+        else:
+            chunks = iter_text_chunks(file_contents, STREAM_CHUNK_SIZE)
+            decode_error = "Failed to read file"
+
+    # Binary log posted as the raw body
+    elif request.headers.get('content-type', '').split(';')[0].strip().lower() == BINARY_MEDIA_TYPE:
+        # Read from the event loop piece by piece while the parser runs in its thread
+        chunks = iter_async_chunks(request.stream(), asyncio.get_running_loop(), STREAM_CHUNK_SIZE)
+        parser, decode_error = BinaryStreamParser(), "Invalid binary log"
+
+    # Check if content is form data with file
+    else:
+        form = await request.form() if request.headers.get('content-type', '').startswith('multipart/form-data') else {}
+        upload = form.get('file')
+        if not isinstance(upload, UploadFile):
+            return JSONResponse({"error": "Expected JSON data, file upload or a binary log."}, status_code=400)
+        if not upload.filename:
+            return JSONResponse({"error": "No file selected."}, status_code=400)
+        site = site or form.get('site')
+
+        # The upload is spooled by the form parser; read it back in chunks
+        chunks = iter_stream_chunks(upload.file, STREAM_CHUNK_SIZE)
+        decode_error = "Failed to read file"
+        if is_binary_upload(upload.filename, upload.content_type):
+            parser, decode_error = BinaryStreamParser(), "Invalid binary log"
+
+    try:
+        # Parse and analyze off the event loop, hashing the content as it goes
+        digest = hashlib.sha256(cache_key_seed().encode('utf-8'))
+        timings = {}
+        summary = new_summary()
+        observers = [observer for observer in (summary, new_ingest(site), windowed) if observer]
+        try:
+            analysis_results, log_sample, row_count = await asyncio.to_thread(analyze_log_stream, chunks, digest=digest, timings=timings,
+                                                                              observers=observers,
+                                                                              evidence=new_evidence(), parser=parser)
+        except (binascii.Error, UnicodeDecodeError, BinaryLogError) as e:
+            return JSONResponse({"error": f"{decode_error}: {str(e)}"}, status_code=400)
+        finally:
+            if upload is not None:
+                await upload.close()
+            for stage, seconds in timings.items():
+                metrics.stage_seconds.observe(seconds, stage=stage)
+
+        if analysis_results is None or row_count == 0:
+            return JSONResponse({"error": "CSV log appears empty or invalid."}, status_code=400)
+
+        print(f"Received file with {row_count} rows")
+
+        cache_key = digest.hexdigest()
+        with metrics.stage_seconds.time(stage="cache_lookup"):
+            # The cache may be SQLite-backed; keep its I/O off the event loop
+            result_dict = await asyncio.to_thread(result_cache.get, cache_key)
+        cached = result_dict is not None
+        if not cached:
+            result_dict, responses = await classify_log_async(log_sample, analysis_results, summary)
+
+            if result_dict is None:
+                return JSONResponse({"error": "Failed to analyze the CSV data"}, status_code=500)
+
+            # Only keep results where every LLM call succeeded
+            if not any(r.startswith("Error") for r in responses):
+                await asyncio.to_thread(result_cache.set, cache_key, result_dict)
+
+        final_result = f"CLASSIFICATION: {result_dict['classification']}\nDESCRIPTION: {result_dict['description']}\nCONFIDENCE: {result_dict['confidence']}%"
+        count_classification(result_dict, cached)
+        print(f"Final classification{' (cached)' if cached else ''}: {final_result}")
+
+        response = {"response": final_result, "tier": result_dict.get('tier', "llm"), "cached": cached}
+        if windowed is not None:
+            response["windowed"] = await asyncio.to_thread(windowed.result)
+        return JSONResponse(response)
+
+    except Exception as e:
+        print(f"Exception in ask_llm: {str(e)}")
+        return JSONResponse({"error": f"Exception occurred: {str(e)}"}, status_code=500)
+
+
+async def analyze_range(request):
+    """Rule-based analysis of a site's stored readings, as GET /analyze in openai_api3.py"""
+    body, status = await asyncio.to_thread(analyze_range_response, request.query_params)
+    return JSONResponse(body, status_code=status)
+
+
+async def cache_stats(request):
+    """Hit/miss counters for the classification and LLM response caches"""
+    return JSONResponse({"results": result_cache.stats(), "llm": llm_cache_stats()})
+
+
+async def get_metrics(request):
+    """Prometheus text-format metrics"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+class RequestTimer:
+    """ASGI middleware recording der_request_seconds for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope; label by its path template,
+            # as the Flask app uses url_rule.rule, so the label set stays bounded
+            route = scope.get('route')
+            endpoint = getattr(route, 'path', None) or "unmatched"
+            metrics.request_seconds.observe(time.perf_counter() - start, endpoint=endpoint, status=status.get('code', 500))
+
+
+async def pool_stats(request):
+    """In-flight LLM calls and HTTP counters of the async client"""
+    return JSONResponse({
+        "llm": {"max_in_flight": LLM_ASYNC_CONCURRENCY, "in_flight": llm_in_flight},
+        "http": http_stats.stats(llm_http_client, LLM_ASYNC_MAX_CONNECTIONS)
+    })
+
+
+app = Starlette(
+    routes=[
+        Route('/ask_llm', ask_llm, methods=['POST']),
+        Route('/analyze', analyze_range, methods=['GET']),
+        Route('/cache_stats', cache_stats, methods=['GET']),
+        Route('/pool_stats', pool_stats, methods=['GET']),
+        Route('/metrics', get_metrics, methods=['GET'])
+    ],
+    middleware=[
+        Middleware(RequestTimer),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ]
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=8000)
@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+
+
+class FileRegistry:
+    """A value built from a set of files, rebuilt when any of the files changes.
+
+    build() runs once at construction; after that a daemon thread polls the
+    files' modification times every refresh_seconds and rebuilds on change,
+    so get() never touches the filesystem.
+    """
+
+    def __init__(self, paths, build, refresh_seconds=5.0):
+        self.paths = list(paths)
+        self.build = build
+        self._lock = threading.Lock()
+        self._mtimes = self._stat()
+        self._value = build()
+        if refresh_seconds:
+            watcher = threading.Thread(target=self._watch, args=(refresh_seconds,), daemon=True)
+            watcher.start()
+
+    def _stat(self):
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def _watch(self, refresh_seconds):
+        while True:
+            time.sleep(refresh_seconds)
+            self.refresh()
+
+    def refresh(self):
+        """Rebuild the value if any file was added, removed or modified; return True if rebuilt"""
+        mtimes = self._stat()
+        if mtimes == self._mtimes:
+            return False
+        try:
+            value = self.build()
+        except Exception as e:
+            print(f"Error rebuilding from {self.paths}: {e}")
+            return False
+        with self._lock:
+            self._value = value
+            self._mtimes = mtimes
+        print(f"Reloaded {len(self.paths)} example files")
+        return True
+
+    def get(self):
+        with self._lock:
+            return self._value
+
+
+def read_first_lines(file_path, num_lines=5):
+    """Return the first num_lines lines of a file, stripped and newline-joined"""
+    with open(file_path, 'r') as f:
+        return '\n'.join([f.readline().strip() for _ in range(num_lines)])
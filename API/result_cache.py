@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Bounded LRU cache with a TTL and an optional SQLite backing store.
+
+    Values must be JSON serializable. The in-memory tier holds at most
+    max_entries items; when db_path is set every entry is also written to
+    SQLite so cached results survive restarts (the database is trimmed to
+    the same size and TTL).
+    """
+
+    def __init__(self, max_entries=256, ttl=86400, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+            self._db.commit()
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0], now):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT stored_at, value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[0], now):
+                    entry = (row[0], json.loads(row[1]))
+                    self._store_memory(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if self._db is not None:
+                self._db.execute("UPDATE results SET used_at = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._store_memory(key, (now, value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                if self.ttl is not None:
+                    self._db.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+
+    def _store_memory(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return hit/miss counters and the current in-memory size"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
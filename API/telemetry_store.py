@@ -0,0 +1,322 @@
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from der_logs import LOG_COLUMNS
+from indicators import (
+    DEFAULT_RULES, IndicatorAccumulator, SECONDS_PER_HOUR, build_indicators, hours_in_slots, indicator_masks,
+    report_indicators
+)
+
+SECONDS_PER_DAY = 86400
+# Per-day counts of the mask-based indicators, as IndicatorAccumulator keeps them
+COUNT_NAMES = ('high_home_load', 'charging', 'charging_in_expected', 'zeroed', 'negative_grid', 'high_grid', 'night_solar')
+DAY_FIELDS = ('day', 'row_count') + COUNT_NAMES + ('hour_bits', 'first_ts', 'last_ts', 'first_battery',
+                                                    'last_battery', 'erratic_battery')
+
+
+def parse_time(text, end=False):
+    """Epoch seconds of an ISO date or date-time; a bare date as `end` means the end of that day"""
+    value = datetime.fromisoformat(text)
+    seconds = int(np.datetime64(value, 's').astype(np.int64))
+    if end and len(text) <= 10:
+        seconds += SECONDS_PER_DAY
+    return seconds
+
+
+def day_aggregates(columns, thresholds):
+    """One row of DAY_FIELDS per day of a time-sorted columnar batch.
+
+    hour_bits has bit h set when the day has a reading exactly at h:00:00;
+    together with the counts this is all the indicators need, so a range of
+    whole days can be scored from these rows alone.
+    """
+    seconds = columns['timestamp'].astype(np.int64)
+    if len(seconds) == 0:
+        return []
+    days = seconds // SECONDS_PER_DAY
+    starts = np.flatnonzero(np.diff(days, prepend=days[0] - 1))
+    ends = np.append(starts[1:], len(days))
+    masks = indicator_masks(columns, thresholds)
+    counts = {name: np.add.reduceat(masks[name].astype(np.int64), starts) for name in COUNT_NAMES}
+    on_hour = seconds % SECONDS_PER_HOUR == 0
+    bits = np.where(on_hour, np.left_shift(1, columns['hour'].astype(np.int64)), 0)
+    hour_bits = np.bitwise_or.reduceat(bits, starts)
+    battery = columns['battery_charge']
+    # A jump between consecutive readings, attributed to the day of the later one
+    jumps = np.abs(np.diff(battery)) > thresholds['erratic_battery_kwh']
+    jumps &= days[1:] == days[:-1]
+    erratic = np.add.reduceat(np.concatenate(([False], jumps)).astype(np.int64), starts) > 0
+    rows = []
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        rows.append((int(days[start]), end - start) + tuple(int(counts[name][i]) for name in COUNT_NAMES) +
+                    (int(hour_bits[i]), int(seconds[start]), int(seconds[end - 1]), float(battery[start]),
+                     float(battery[end - 1]), int(erratic[i])))
+    return rows
+
+
+class TelemetryStore:
+    """SQLite store of every ingested reading, keyed by (site, timestamp), with per-day indicator aggregates.
+
+    Readings are upserted, so ingesting the same log twice keeps one copy.
+    A batch that follows a day's stored readings, as streamed uploads and
+    live feeds do, is folded into that day's aggregates from the batch
+    alone; any other day the batch touches is recomputed from its stored
+    readings. A range query adds up the aggregates of the
+    whole days inside it and reads raw readings only for the partial days
+    at its ends, so scoring months of data touches a few hundred rows.
+    Aggregates are rebuilt when the detection thresholds change.
+    """
+
+    def __init__(self, db_path, rules=None):
+        self.rules = rules or DEFAULT_RULES
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        # One commit per ingest; WAL keeps those cheap and lets readers of other connections continue
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS readings (site TEXT NOT NULL, ts INTEGER NOT NULL, " +
+            ", ".join(f"{name} REAL NOT NULL" for name in LOG_COLUMNS) +
+            ", PRIMARY KEY (site, ts)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS daily (site TEXT NOT NULL, day INTEGER NOT NULL, row_count INTEGER NOT NULL, " +
+            ", ".join(f"{name} INTEGER NOT NULL" for name in COUNT_NAMES) +
+            ", hour_bits INTEGER NOT NULL, first_ts INTEGER NOT NULL, last_ts INTEGER NOT NULL, "
+            "first_battery REAL NOT NULL, last_battery REAL NOT NULL, erratic_battery INTEGER NOT NULL, "
+            "PRIMARY KEY (site, day)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'rules'").fetchone()
+        if row is None or row[0] != self.rules.fingerprint:
+            self._rebuild_aggregates()
+        self._db.commit()
+
+    def _rebuild_aggregates(self):
+        self._db.execute("DELETE FROM daily")
+        for (site,) in self._db.execute("SELECT DISTINCT site FROM readings").fetchall():
+            self._update_days(site, None, None)
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)", (self.rules.fingerprint,))
+
+    def _select(self, site, start, end):
+        """Readings of a site with start <= ts < end, as a time-sorted columnar batch"""
+        query = f"SELECT ts, {', '.join(LOG_COLUMNS)} FROM readings WHERE site = ?"
+        params = [site]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(end)
+        table = np.array(self._db.execute(query + " ORDER BY ts", params).fetchall(), dtype=np.float64)
+        table = table.reshape(-1, len(LOG_COLUMNS) + 1)
+        seconds = table[:, 0].astype(np.int64)
+        columns = {'timestamp': seconds.astype('datetime64[s]'), 'hour': seconds // SECONDS_PER_HOUR % 24}
+        for i, name in enumerate(LOG_COLUMNS):
+            columns[name] = table[:, i + 1]
+        return columns
+
+    def _write_days(self, site, rows):
+        self._db.executemany(f"INSERT OR REPLACE INTO daily (site, {', '.join(DAY_FIELDS)}) "
+                             f"VALUES ({', '.join('?' * (len(DAY_FIELDS) + 1))})", [(site,) + row for row in rows])
+
+    def _update_days(self, site, first_day, last_day):
+        """Recompute the aggregates of a site's days first_day..last_day (all days if None)"""
+        start = None if first_day is None else first_day * SECONDS_PER_DAY
+        end = None if last_day is None else (last_day + 1) * SECONDS_PER_DAY
+        self._write_days(site, day_aggregates(self._select(site, start, end), self.rules.thresholds))
+
+    def _merge(self, stored, batch):
+        """Aggregates of a day whose stored readings (stored) are followed by a batch's readings (batch)"""
+        field = {name: i for i, name in enumerate(DAY_FIELDS)}
+        merged = list(batch)
+        for name in ('row_count',) + COUNT_NAMES:
+            merged[field[name]] += stored[field[name]]
+        merged[field['hour_bits']] |= stored[field['hour_bits']]
+        merged[field['first_ts']] = stored[field['first_ts']]
+        merged[field['first_battery']] = stored[field['first_battery']]
+        jump = abs(batch[field['first_battery']] - stored[field['last_battery']]) > self.rules.thresholds['erratic_battery_kwh']
+        merged[field['erratic_battery']] = int(bool(stored[field['erratic_battery']] or batch[field['erratic_battery']] or jump))
+        return tuple(merged)
+
+    def _ingest(self, site, columns):
+        seconds = columns['timestamp'].astype('datetime64[s]').astype(np.int64)
+        if len(seconds) == 0:
+            return
+        if np.any(np.diff(seconds) <= 0):
+            # Time order, and the last of any repeated timestamp, as the upsert keeps it
+            order = np.argsort(seconds, kind='stable')
+            seconds = seconds[order]
+            keep = np.append(seconds[1:] != seconds[:-1], True)
+            columns = {name: values[order][keep] for name, values in columns.items()}
+            seconds = seconds[keep]
+        columns = dict(columns, timestamp=seconds.astype('datetime64[s]'), hour=seconds // SECONDS_PER_HOUR % 24)
+        values = np.column_stack([columns[name] for name in LOG_COLUMNS]).tolist()
+        self._db.executemany(
+            f"INSERT OR REPLACE INTO readings (site, ts, {', '.join(LOG_COLUMNS)}) "
+            f"VALUES (?, ?{', ?' * len(LOG_COLUMNS)})",
+            [(site, ts, *row) for ts, row in zip(seconds.tolist(), values)]
+        )
+        stored = {row[0]: row for row in self._db.execute(
+            f"SELECT {', '.join(DAY_FIELDS)} FROM daily WHERE site = ? AND day BETWEEN ? AND ?",
+            (site, int(seconds[0]) // SECONDS_PER_DAY, int(seconds[-1]) // SECONDS_PER_DAY)
+        ).fetchall()}
+        merged, stale = [], []
+        last_ts = DAY_FIELDS.index('last_ts')
+        for row in day_aggregates(columns, self.rules.thresholds):
+            previous = stored.get(row[0])
+            if previous is None:
+                merged.append(row)
+            elif row[DAY_FIELDS.index('first_ts')] > previous[last_ts]:
+                merged.append(self._merge(previous, row))
+            else:
+                # The batch overlaps or precedes stored readings of the day
+                stale.append(row[0])
+        self._write_days(site, merged)
+        for day in stale:
+            self._update_days(site, day, day)
+
+    def ingest(self, site, columns):
+        """Store a columnar batch of readings for site and update the aggregates of its days"""
+        self.ingest_many([(site, columns)])
+
+    def ingest_many(self, batches):
+        """Store (site, columns) batches in order, in one transaction"""
+        with self._lock:
+            for site, columns in batches:
+                self._ingest(site, columns)
+            self._db.commit()
+
+    def readings(self, site, start=None, end=None):
+        """A site's readings with start <= ts < end as a time-sorted columnar log"""
+        with self._lock:
+            return self._select(site, start, end)
+
+    def sites(self):
+        """Every site with its reading count and first/last timestamp"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT site, SUM(row_count), MIN(first_ts), MAX(last_ts) FROM daily GROUP BY site ORDER BY site"
+            ).fetchall()
+        return [{"site": site, "row_count": count, "from": str(np.datetime64(first, 's')).replace('T', ' '),
+                 "to": str(np.datetime64(last, 's')).replace('T', ' ')} for site, count, first, last in rows]
+
+    def analyze(self, site, start=None, end=None):
+        """Rule-based analysis of a site's readings with start <= ts < end (epoch seconds, None for open).
+
+        Returns (analysis results or None if there are no readings, row count,
+        source) where source says whether the result was assembled from the
+        daily aggregates or had to read every reading in the range.
+        """
+        with self._lock:
+            first_full = None if start is None else -(-start // SECONDS_PER_DAY)
+            last_full = None if end is None else end // SECONDS_PER_DAY - 1
+            query = f"SELECT {', '.join(DAY_FIELDS)} FROM daily WHERE site = ?"
+            params = [site]
+            if first_full is not None:
+                query += " AND day >= ?"
+                params.append(first_full)
+            if last_full is not None:
+                query += " AND day <= ?"
+                params.append(last_full)
+            days = self._db.execute(query + " ORDER BY day", params).fetchall()
+            # The partial days at either end come from the raw readings
+            head = tail = []
+            if start is not None and start % SECONDS_PER_DAY:
+                head = day_aggregates(self._select(site, start, min(first_full * SECONDS_PER_DAY, end or np.inf)),
+                                      self.rules.thresholds)
+            if end is not None and end % SECONDS_PER_DAY and (start is None or end // SECONDS_PER_DAY >= first_full):
+                tail = day_aggregates(self._select(site, (last_full + 1) * SECONDS_PER_DAY, end),
+                                      self.rules.thresholds)
+            days = head + days + tail
+            if not days:
+                return None, 0, "aggregates"
+            if days[0][DAY_FIELDS.index('first_ts')] % SECONDS_PER_HOUR:
+                # Hourly slots then start off the hour; only the readings themselves say which are filled
+                accumulator = IndicatorAccumulator(self.rules.thresholds)
+                accumulator.update(self._select(site, start, end))
+                indicators, row_count, source = accumulator.indicators(), accumulator.row_count, "readings"
+            else:
+                indicators, row_count, source = self._combine(days), sum(day[1] for day in days), "aggregates"
+        return report_indicators(indicators, self.rules, verbose=False), row_count, source
+
+    def _combine(self, days):
+        """Indicators of consecutive day aggregates, the same as IndicatorAccumulator over their readings"""
+        t = self.rules.thresholds
+        field = {name: i for i, name in enumerate(DAY_FIELDS)}
+        row_count = sum(day[field['row_count']] for day in days)
+        counts = {name: sum(day[field[name]] for day in days) for name in COUNT_NAMES}
+
+        start, end = days[0][field['first_ts']], days[-1][field['last_ts']]
+        missing_count = peak_missing = 0
+        if row_count >= 2:
+            last_slot = (end - start) // SECONDS_PER_HOUR
+            peak_bits = sum(1 << hour for hour in t['peak_hours'])
+            seen = sum(bin(day[field['hour_bits']]).count('1') for day in days)
+            peak_seen = sum(bin(day[field['hour_bits']] & peak_bits).count('1') for day in days)
+            start_hour = start // SECONDS_PER_HOUR % 24
+            missing_count = last_slot + 1 - seen
+            peak_missing = int(hours_in_slots(start_hour, last_slot + 1, t['peak_hours'])) - peak_seen
+
+        erratic = any(day[field['erratic_battery']] for day in days)
+        erratic |= any(abs(day[field['first_battery']] - previous[field['last_battery']]) > t['erratic_battery_kwh']
+                       for previous, day in zip(days, days[1:]))
+        return build_indicators(row_count, counts, missing_count, peak_missing, erratic and row_count >= 3, t)
+
+
+class StoreIngest:
+    """Observer for analyze_log_stream that writes every parsed batch of a log to a TelemetryStore"""
+
+    def __init__(self, store, site):
+        self.store = store
+        self.site = site
+        self.row_count = 0
+        self.seconds = 0.0
+
+    def update(self, columns):
+        start = time.perf_counter()
+        self.store.ingest(self.site, columns)
+        self.row_count += len(columns['timestamp'])
+        self.seconds += time.perf_counter() - start
+
+
+class StoreWriter:
+    """Writes batches to a TelemetryStore from a background thread, off the request path.
+
+    Batches queued while a write is in progress are written together, in
+    one transaction, so a burst of small live-feed posts costs one commit.
+    flush() waits until everything submitted so far is stored.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="telemetry-writer", daemon=True).start()
+
+    def submit(self, site, columns):
+        if len(columns['timestamp']):
+            self._queue.put((site, columns))
+
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batches = [self._queue.get()]
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.store.ingest_many(batches)
+            except Exception as e:
+                print(f"Telemetry store write of {len(batches)} batches failed: {e}")
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
@@ -0,0 +1,86 @@
+"""Compare rows/sec of the columnar parse_csv_log against the old dict-of-rows parser.
+
+Usage (from API/testing_scripts):
+    python benchmark_parse.py --days 14 --repeat 5
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from der_logs import parse_csv_log  # noqa: E402
+
+HEADER = "Timestamp,Solar_Generation_kW,Home_Load_kW,Tesla_Charger_kW,Battery_Charge_kWh,Battery_Discharge_kW,Grid_Import_kW,Grid_Export_kW"
+
+
+def parse_csv_log_rows(log_data):
+    """The original dict-of-rows parser, kept here as the benchmark baseline"""
+    reader = csv.reader(StringIO(log_data))
+    headers = next(reader)
+    parsed_data = []
+    for row in reader:
+        try:
+            timestamp = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S')
+            numerical_values = [float(val) if val != '' else 0.0 for val in row[1:]]
+            parsed_data.append({
+                'timestamp': timestamp,
+                'hour': timestamp.hour,
+                'solar_generation': numerical_values[0],
+                'home_load': numerical_values[1],
+                'tesla_charger': numerical_values[2],
+                'battery_charge': numerical_values[3],
+                'battery_discharge': numerical_values[4],
+                'grid_import': numerical_values[5],
+                'grid_export': numerical_values[6]
+            })
+        except (ValueError, IndexError):
+            continue
+    return {'headers': headers, 'rows': parsed_data, 'row_count': len(parsed_data)}
+
+
+def synthetic_log(days, step_minutes, seed=0):
+    """Build a CSV log string with the same layout as the Data2 simulation logs"""
+    rng = np.random.default_rng(seed)
+    n = days * 24 * 60 // step_minutes
+    start = datetime(2025, 4, 1)
+    values = np.round(rng.uniform(0.0, 8.0, size=(n, 7)), 2)
+    lines = [HEADER]
+    for i in range(n):
+        timestamp = (start + timedelta(minutes=i * step_minutes)).strftime('%Y-%m-%d %H:%M:%S')
+        lines.append(timestamp + "," + ",".join(str(v) for v in values[i]))
+    return "\n".join(lines) + "\n"
+
+
+def time_parser(parser, log, repeat):
+    """Return the best wall time over `repeat` runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser(log)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=14, help="days of telemetry per synthetic log")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per parser (best time is reported)")
+    args = parser.parse_args()
+
+    for label, step in (("hourly", 60), ("1-minute", 1)):
+        log = synthetic_log(args.days, step)
+        rows = parse_csv_log(log)['row_count']
+        old = time_parser(parse_csv_log_rows, log, args.repeat)
+        new = time_parser(parse_csv_log, log, args.repeat)
+        print(f"{label:>8} ({rows} rows): dict-of-rows {rows / old:>12,.0f} rows/s | "
+              f"columnar {rows / new:>12,.0f} rows/s | speedup {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
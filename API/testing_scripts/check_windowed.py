@@ -0,0 +1,101 @@
+"""Regression checks for sliding-window detection (windowed.py).
+
+1. Coverage: for random log lengths, windows and strides no longer than
+   the window, every reading falls inside at least one window.
+2. Last hour: an attack planted in the last hour of a 30-hour log is found
+   with stride 1 and with a stride that does not divide the log (5).
+3. Parity: for the one-day Data2/Logs2 logs, a single 24-hour window gives
+   the same likely attack as analyze_log_data.
+
+Exits with status 1 if any check fails.
+
+Usage (from API/testing_scripts):
+    python check_windowed.py
+"""
+import contextlib
+import glob
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from der_logs import parse_csv_log  # noqa: E402
+from indicators import SECONDS_PER_HOUR, analyze_log_data  # noqa: E402
+from windowed import detect_windows, window_bounds  # noqa: E402
+
+LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Data2', 'Logs2')
+
+
+def check_coverage(trials=2000, seed=0):
+    """Every reading's hour lies in some [start, start + window), for strides up to the window length"""
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for _ in range(trials):
+        first = int(rng.integers(0, 10 ** 6)) * 60
+        last = first + int(rng.integers(0, 24 * 90)) * 60 * int(rng.integers(1, 60))
+        window_hours = int(rng.integers(1, 72))
+        stride_hours = int(rng.integers(1, window_hours + 1))
+        starts = window_bounds(first, last, window_hours, stride_hours)
+        # Consecutive windows overlap or touch, so only the two ends can be uncovered
+        if starts[0] > first or starts[-1] + window_hours * SECONDS_PER_HOUR <= last:
+            failures += 1
+    return failures
+
+
+def thirty_hour_log():
+    """30 hourly readings from two clean logs, with a negative grid import in the last hour"""
+    paths = sorted(glob.glob(os.path.join(LOGS_DIR, 'clean', '*.csv')))
+    with open(paths[0]) as f:
+        day = parse_csv_log(f.read())['columns']
+    with open(paths[1]) as f:
+        morning = {name: values[:6] for name, values in parse_csv_log(f.read())['columns'].items()}
+    morning['timestamp'] = morning['timestamp'] + np.timedelta64(1, 'D')
+    columns = {name: np.concatenate([day[name], morning[name]]) for name in day}
+    columns['grid_import'][-1] = -3.0
+    return columns
+
+
+def check_last_hour():
+    columns = thirty_hour_log()
+    last = str(columns['timestamp'][-1]).replace('T', ' ')
+    failures = 0
+    for stride in (1, 5):
+        intervals = detect_windows(columns, 24, stride)['intervals']
+        found = any(i['label'] == "Grid Manipulation" and i.get('evidence_to') == last for i in intervals)
+        print(f"    stride {stride}: {'found' if found else 'MISSED'} attack at {last}")
+        failures += not found
+    return failures
+
+
+def check_parity():
+    failures = 0
+    paths = sorted(glob.glob(os.path.join(LOGS_DIR, '*', '*.csv')))
+    for path in paths:
+        with open(path) as f:
+            parsed = parse_csv_log(f.read())
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = analyze_log_data(parsed)['likely_attack']
+        result = detect_windows(parsed['columns'], 24, 1, include_windows=True)
+        if result['windows'] == 1 and result['window_scores'][0]['likely_attack'] != expected:
+            failures += 1
+    return failures, len(paths)
+
+
+def main():
+    failed = False
+    failures = check_coverage()
+    print(f"[{'✓' if not failures else '✗'}] coverage: {failures} of 2000 random logs with an uncovered reading")
+    failed |= bool(failures)
+    failures = check_last_hour()
+    print(f"[{'✓' if not failures else '✗'}] last hour of a 30-hour log: {failures} of 2 strides missed the attack")
+    failed |= bool(failures)
+    failures, total = check_parity()
+    print(f"[{'✓' if not failures else '✗'}] parity: {failures} of {total} one-day logs differ from analyze_log_data")
+    failed |= bool(failures)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Measure accuracy and speed of the detector over the labelled Data2/Logs2 corpus.
+
+The label of each log is its directory name (bd, clean, dos, gm, mitm).
+Every log goes through parse_csv_log + analyze_log_data; with --llm the
+full classification pipeline of openai_api3 runs as well, normally against
+a local stub server given by --llm-base-url.
+
+Reports per-class precision/recall, the confusion matrix, per-stage latency
+percentiles and files/sec, and writes everything to a JSON baseline.
+--compare checks a run against an earlier baseline and exits with status 1
+if accuracy or any class recall dropped.
+
+Usage (from API/testing_scripts):
+    python evaluate.py --out output/baseline.json
+    python evaluate.py --compare output/baseline.json
+    python evaluate.py --llm --llm-base-url http://127.0.0.1:8001/v1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import numpy as np
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, API_DIR)
+from der_logs import parse_csv_log  # noqa: E402
+from indicators import analyze_log_data, DEFAULT_RULES  # noqa: E402
+from log_summary import LogSummary  # noqa: E402
+
+DEFAULT_DATA_DIR = os.path.join(API_DIR, '..', 'Data2', 'Logs2')
+
+# Corpus directory name -> classification label
+LABELS = {
+    'bd': "Battery Drain",
+    'clean': "Clean",
+    'dos': "Denial of Service",
+    'gm': "Grid Manipulation",
+    'mitm': "Man-in-the-Middle"
+}
+
+
+def corpus_files(data_dir):
+    """Yield (relative path, label) for every CSV in a labelled directory"""
+    for directory, label in sorted(LABELS.items()):
+        path = os.path.join(data_dir, directory)
+        if not os.path.isdir(path):
+            continue
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.csv'):
+                yield os.path.join(directory, name), label
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds"""
+    ms = np.asarray(samples) * 1000
+    return {
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3)
+    }
+
+
+def class_metrics(truth, predicted):
+    """Per-class precision/recall/support, and the confusion matrix as nested dicts"""
+    confusion = defaultdict(Counter)
+    for t, p in zip(truth, predicted):
+        confusion[t][p] += 1
+    metrics = {}
+    for label in LABELS.values():
+        true_positive = confusion[label][label]
+        predicted_count = sum(confusion[t][label] for t in confusion)
+        support = sum(confusion[label].values())
+        metrics[label] = {
+            "precision": round(true_positive / predicted_count, 4) if predicted_count else 0.0,
+            "recall": round(true_positive / support, 4) if support else 0.0,
+            "support": support
+        }
+    return metrics, {t: dict(row) for t, row in confusion.items()}
+
+
+def evaluate(data_dir, use_llm=False):
+    """Run the detector over the corpus and return the baseline dict"""
+    if use_llm:
+        import openai_api3
+    stage_times = defaultdict(list)
+    truth, predicted, predictions = [], [], {}
+    started = time.perf_counter()
+
+    for relpath, label in corpus_files(data_dir):
+        start = time.perf_counter()
+        with open(os.path.join(data_dir, relpath), 'r') as f:
+            log = f.read()
+        stage_times['read'].append(time.perf_counter() - start)
+
+        # The detector prints its progress; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            parsed_log = parse_csv_log(log)
+            stage_times['parse'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            analysis_results = analyze_log_data(parsed_log)
+            stage_times['analyze'].append(time.perf_counter() - start)
+            classification = analysis_results['likely_attack']
+
+            if use_llm:
+                start = time.perf_counter()
+                log_sample = openai_api3.sample_from_parsed(log, parsed_log)
+                summary = None
+                if openai_api3.PROMPT_MODE == 'compact':
+                    summary = LogSummary()
+                    summary.update(parsed_log['columns'])
+                result_dict, _ = openai_api3.classify_log(log_sample, analysis_results, summary)
+                stage_times['llm'].append(time.perf_counter() - start)
+                classification = result_dict['classification'] if result_dict else "Unknown"
+
+        stage_times['total'].append(sum(stage_times[stage][-1] for stage in stage_times if stage != 'total'))
+        truth.append(label)
+        predicted.append(classification)
+        predictions[relpath] = classification
+
+    elapsed = time.perf_counter() - started
+    if not truth:
+        raise SystemExit(f"No labelled logs found under {data_dir}")
+
+    per_class, confusion = class_metrics(truth, predicted)
+    baseline = {
+        "created": datetime.now().isoformat(timespec='seconds'),
+        "mode": "llm" if use_llm else "rules",
+        "rules_fingerprint": DEFAULT_RULES.fingerprint,
+        "files": len(truth),
+        "files_per_second": round(len(truth) / elapsed, 2),
+        "accuracy": round(sum(t == p for t, p in zip(truth, predicted)) / len(truth), 4),
+        "per_class": per_class,
+        "confusion": confusion,
+        "latency_ms": {stage: percentiles(samples) for stage, samples in stage_times.items()},
+        "predictions": predictions
+    }
+    if use_llm:
+        baseline["prompt_version"] = openai_api3.PROMPT_VERSION
+        baseline["model"] = openai_api3.OPENAI_MODEL
+    return baseline
+
+
+def print_report(baseline):
+    labels = list(LABELS.values())
+    print(f"{baseline['files']} files ({baseline['mode']}), {baseline['files_per_second']} files/s, "
+          f"accuracy {baseline['accuracy']:.1%}\n")
+
+    print(f"{'class':<20}{'precision':>10}{'recall':>10}{'support':>9}")
+    for label, m in baseline['per_class'].items():
+        print(f"{label:<20}{m['precision']:>10.1%}{m['recall']:>10.1%}{m['support']:>9}")
+
+    columns = labels + sorted({p for row in baseline['confusion'].values() for p in row} - set(labels))
+    print("\nconfusion (rows: true, columns: predicted)")
+    print(f"{'':<20}" + "".join(f"{c[:10]:>12}" for c in columns))
+    for label in labels:
+        row = baseline['confusion'].get(label, {})
+        print(f"{label:<20}" + "".join(f"{row.get(c, 0):>12}" for c in columns))
+
+    print(f"\n{'stage':<10}{'mean ms':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, p in baseline['latency_ms'].items():
+        print(f"{stage:<10}{p['mean']:>10.3f}{p['p50']:>10.3f}{p['p95']:>10.3f}{p['p99']:>10.3f}")
+
+
+def compare(baseline, previous, tolerance):
+    """Print differences from an earlier baseline; return False on an accuracy regression"""
+    ok = True
+    drop = previous['accuracy'] - baseline['accuracy']
+    print(f"\naccuracy {previous['accuracy']:.1%} -> {baseline['accuracy']:.1%}")
+    if drop > tolerance:
+        ok = False
+    for label, m in baseline['per_class'].items():
+        before = previous['per_class'].get(label, {}).get('recall', 0.0)
+        if before - m['recall'] > tolerance:
+            print(f"  recall regression for {label}: {before:.1%} -> {m['recall']:.1%}")
+            ok = False
+
+    changed = {path: (previous['predictions'][path], label) for path, label in baseline['predictions'].items()
+               if path in previous['predictions'] and previous['predictions'][path] != label}
+    for path, (before, after) in sorted(changed.items()):
+        print(f"  {path}: {before} -> {after}")
+
+    speed = baseline['files_per_second'] / previous['files_per_second'] if previous['files_per_second'] else 0
+    print(f"throughput {previous['files_per_second']} -> {baseline['files_per_second']} files/s ({speed:.2f}x)")
+    if previous.get('rules_fingerprint') != baseline['rules_fingerprint']:
+        print("detection rules changed since the baseline")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DEFAULT_DATA_DIR, help="directory with one sub-directory per label")
+    parser.add_argument('--out', help="write the JSON baseline to this file")
+    parser.add_argument('--compare', help="baseline JSON to check this run against")
+    parser.add_argument('--tolerance', type=float, default=0.0, help="allowed drop in accuracy/recall (fraction)")
+    parser.add_argument('--llm', action='store_true', help="also run the LLM classification pipeline")
+    parser.add_argument('--llm-base-url', help="OpenAI-compatible endpoint for --llm, e.g. a local stub server")
+    args = parser.parse_args()
+
+    if args.llm_base_url:
+        os.environ['OPENAI_BASE_URL'] = args.llm_base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    baseline = evaluate(args.data, use_llm=args.llm)
+    print_report(baseline)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        if not compare(baseline, previous, args.tolerance):
+            print("Regression against baseline")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
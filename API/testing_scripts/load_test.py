@@ -0,0 +1,103 @@
+"""Drive /ask_llm at a target request rate and report throughput and latency percentiles.
+
+Requests are sent open-loop: request i is scheduled at start + i / rps no
+matter how slowly earlier ones return, and its latency is measured from
+that scheduled time, so a saturated server shows up as growing latency
+instead of a silently lower request rate. Logs are taken round-robin from
+the Data2/Logs2 corpus; --unique makes every request's content distinct
+so the classification cache cannot answer it.
+
+Usage (from API/testing_scripts, with the API running against mock_llm_server.py):
+    python load_test.py --rps 20 --duration 30 --unique
+"""
+import argparse
+import glob
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Data2', 'Logs2')
+
+
+def load_logs(data_dir):
+    paths = sorted(glob.glob(os.path.join(data_dir, '*', '*.csv')))
+    if not paths:
+        raise SystemExit(f"No CSV logs found under {data_dir}")
+    logs = []
+    for path in paths:
+        with open(path, 'r') as f:
+            logs.append(f.read())
+    return logs
+
+
+def make_unique(log, i):
+    """Tag the header line so the content hash (and cache key) differs per request"""
+    header, _, rest = log.partition("\n")
+    return f"{header},load_test_{i}\n{rest}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default="http://127.0.0.1:8000/ask_llm")
+    parser.add_argument('--rps', type=float, default=10.0, help="target requests per second")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument('--concurrency', type=int, default=256, help="maximum requests in flight")
+    parser.add_argument('--timeout', type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument('--data', default=DEFAULT_DATA_DIR, help="directory of labelled logs to send")
+    parser.add_argument('--unique', action='store_true', help="make every request bypass the result cache")
+    args = parser.parse_args()
+
+    logs = load_logs(args.data)
+    total = int(args.rps * args.duration)
+    latencies = []
+    outcomes = Counter()
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(i, scheduled):
+        # One keep-alive session per worker thread
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        log = logs[i % len(logs)]
+        if args.unique:
+            log = make_unique(log, i)
+        try:
+            response = local.session.post(args.url, json={'file': log}, timeout=args.timeout)
+            outcome = str(response.status_code)
+        except requests.RequestException as e:
+            outcome = type(e).__name__
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            outcomes[outcome] += 1
+            if outcome == '200':
+                latencies.append(elapsed)
+
+    print(f"Sending {total} requests to {args.url} at {args.rps} req/s")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for i in range(total):
+            scheduled = start + i / args.rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, i, scheduled)
+        send_time = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+
+    ok = outcomes.get('200', 0)
+    print(f"sent {total} in {send_time:.1f}s ({total / send_time:.1f} req/s offered), finished after {elapsed:.1f}s")
+    print(f"completed {ok} ok, throughput {ok / elapsed:.1f} req/s")
+    print(f"outcomes: {dict(outcomes)}")
+    if latencies:
+        ms = np.asarray(latencies) * 1000
+        print(f"latency ms: mean {ms.mean():.1f} | p50 {np.percentile(ms, 50):.1f} | "
+              f"p95 {np.percentile(ms, 95):.1f} | p99 {np.percentile(ms, 99):.1f} | max {ms.max():.1f}")
+
+
+if __name__ == '__main__':
+    main()
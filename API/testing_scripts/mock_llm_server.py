@@ -0,0 +1,218 @@
+"""Deterministic stand-in for the LLM backends, for load tests and offline evaluation.
+
+Speaks the OpenAI chat-completions protocol (POST /v1/chat/completions) and
+the Ollama generate protocol (POST /api/generate) and always answers in the
+CLASSIFICATION / DESCRIPTION / CONFIDENCE format the API parses.
+
+The classification is a pure function of the prompt: with --label-mode rules
+the indicator block of the smart prompt is re-scored with the detection
+rules, otherwise (or when the prompt has no indicator block) a label is
+picked from a hash of the prompt. --accuracy keeps that label for that
+fraction of prompts and swaps in another one, chosen by hash, for the rest.
+--sample-noise makes repeated requests of a prompt (ensemble samples)
+disagree: the n-th request of a prompt is answered with another label,
+chosen by a hash of the prompt and n, for that fraction of requests, so
+every run sees the same split votes. Latency and injected errors come from
+a seeded RNG.
+
+Usage (from API/testing_scripts):
+    python mock_llm_server.py --port 8001 --latency lognormal --latency-ms 800 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python ../openai_api3.py
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from flask import Flask, request, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from indicators import DEFAULT_RULES  # noqa: E402
+
+LABELS = ["Battery Drain", "Denial of Service", "Grid Manipulation", "Man-in-the-Middle", "Clean"]
+
+DESCRIPTIONS = {
+    "Battery Drain": "Home load stays above 3kW and the Tesla charger runs outside the normal charging hours.",
+    "Denial of Service": "Readings are missing during peak hours and several critical values are zeroed.",
+    "Grid Manipulation": "Grid import values are negative or amplified well beyond the household demand.",
+    "Man-in-the-Middle": "Solar generation is reported at night and the battery readings fluctuate erratically.",
+    "Clean": "Solar follows the daily curve, charging happens in the normal hours and the energy balance holds."
+}
+
+# Lines of the smart prompt's indicator block -> indicator name
+PROMPT_INDICATORS = {
+    "Complete data coverage": 'complete_data',
+    "Tesla charging outside normal hours": 'tesla_charging_outside_normal',
+    "High home load percentage": 'high_home_load_pct',
+    "Missing data count": 'missing_data_count',
+    "Peak hour missing data": 'peak_hour_missing_data',
+    "Multiple zeroed critical values": 'multiple_zeroed_values',
+    "Negative grid values count": 'negative_grid_values_count',
+    "High grid values count": 'high_grid_values_count',
+    "Nighttime solar generation count": 'night_solar_count',
+    "Erratic battery behavior": 'erratic_battery'
+}
+INDICATOR_LINE = re.compile(r"^- (" + "|".join(map(re.escape, PROMPT_INDICATORS)) + r"): (.+)$", re.MULTILINE)
+# The compact prompt lists them on one line as name=value pairs
+COMPACT_INDICATORS = re.compile(r"^Rule indicators: (.+)$", re.MULTILINE)
+
+
+def prompt_hash(prompt, salt=''):
+    return int.from_bytes(hashlib.sha256((salt + prompt).encode('utf-8')).digest()[:8], 'big')
+
+
+def parse_value(text):
+    if text in ("True", "False"):
+        return text == "True"
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def rules_label(prompt):
+    """Re-score the indicator block of a smart or compact prompt, or None if there is none"""
+    indicators = {}
+    compact = COMPACT_INDICATORS.search(prompt)
+    if compact:
+        pairs = [item.split("=", 1) for item in compact.group(1).split("; ") if "=" in item]
+    else:
+        pairs = [(PROMPT_INDICATORS[phrase], value) for phrase, value in INDICATOR_LINE.findall(prompt)]
+    for name, value in pairs:
+        try:
+            indicators[name] = parse_value(value.strip())
+        except ValueError:
+            return None
+    if len(indicators) != len(PROMPT_INDICATORS):
+        return None
+    _, likely_attack = DEFAULT_RULES.score(indicators)
+    return likely_attack if likely_attack in LABELS else "Clean"
+
+
+class MockLLM:
+    """Answer generation plus the latency/error model, shared by both protocols"""
+
+    def __init__(self, args):
+        self.args = args
+        self._rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        # Requests seen per prompt, for --sample-noise
+        self._repeats = {}
+
+    def answer(self, prompt):
+        label = rules_label(prompt) if self.args.label_mode == 'rules' else None
+        if self.args.label_mode == 'fixed':
+            label = self.args.label
+        if label is None:
+            label = LABELS[prompt_hash(prompt, 'label') % len(LABELS)]
+        # Deterministically answer a fraction of prompts with another label
+        if (prompt_hash(prompt, 'accuracy') % 10000) / 10000 >= self.args.accuracy:
+            others = [l for l in LABELS if l != label]
+            label = others[prompt_hash(prompt, 'wrong') % len(others)]
+        if self.args.sample_noise > 0:
+            key = prompt_hash(prompt)
+            with self._lock:
+                n = self._repeats.get(key, 0)
+                self._repeats[key] = n + 1
+            if (prompt_hash(prompt, f'noise{n}') % 10000) / 10000 < self.args.sample_noise:
+                others = [l for l in LABELS if l != label]
+                label = others[prompt_hash(prompt, f'noise-label{n}') % len(others)]
+        confidence = 70 + prompt_hash(prompt, 'confidence') % 26
+        return f"CLASSIFICATION: {label}\nDESCRIPTION: {DESCRIPTIONS[label]}\nCONFIDENCE: {confidence}%"
+
+    def delay(self):
+        """Sample one latency (seconds) and whether to fail this request"""
+        args = self.args
+        mean = args.latency_ms / 1000
+        with self._lock:
+            self.requests += 1
+            if args.latency == 'fixed':
+                seconds = mean
+            elif args.latency == 'uniform':
+                seconds = self._rng.uniform(0, 2 * mean)
+            elif args.latency == 'exponential':
+                seconds = self._rng.expovariate(1 / mean) if mean else 0.0
+            else:
+                # Log-normal with the requested mean; sigma sets the tail
+                sigma = args.latency_sigma
+                seconds = self._rng.lognormvariate(0, sigma) * mean / math.exp(sigma * sigma / 2)
+            fail = self._rng.random() < args.error_rate
+            self.errors += fail
+        return seconds, fail
+
+
+def create_app(args):
+    app = Flask(__name__)
+    llm = MockLLM(args)
+
+    def simulate():
+        seconds, fail = llm.delay()
+        time.sleep(seconds)
+        return fail
+
+    @app.route('/v1/chat/completions', methods=['POST'])
+    @app.route('/chat/completions', methods=['POST'])
+    def chat_completions():
+        data = request.get_json()
+        if simulate():
+            return jsonify({"error": {"message": "Injected failure", "type": "server_error"}}), args.error_status
+        prompt = "\n".join(m.get('content', '') for m in data.get('messages', []))
+        content = llm.answer(prompt)
+        return jsonify({
+            "id": f"chatcmpl-mock-{prompt_hash(prompt) % 10 ** 12}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": data.get('model', "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        })
+
+    @app.route('/api/generate', methods=['POST'])
+    def generate():
+        data = request.get_json()
+        if simulate():
+            return jsonify({"error": "Injected failure"}), args.error_status
+        return jsonify({
+            "model": data.get('model', "mock"),
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "response": llm.answer(data.get('prompt', '')),
+            "done": True
+        })
+
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        return jsonify({"requests": llm.requests, "errors": llm.errors})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--label-mode', choices=['rules', 'hash', 'fixed'], default='rules',
+                        help="how the classification is chosen from the prompt")
+    parser.add_argument('--label', choices=LABELS, default="Clean", help="answer for --label-mode fixed")
+    parser.add_argument('--accuracy', type=float, default=1.0, help="fraction of prompts answered with the chosen label")
+    parser.add_argument('--sample-noise', type=float, default=0.0,
+                        help="fraction of repeated requests of a prompt answered with another label")
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'exponential', 'lognormal'], default='lognormal')
+    parser.add_argument('--latency-ms', type=float, default=500.0, help="mean response latency")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="spread of the lognormal distribution")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument('--error-status', type=int, default=500, help="HTTP status of injected failures (e.g. 429)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    create_app(args).run(port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Feed replayed telemetry streams into the /monitor endpoints and report throughput and latency.
+
+Opens --streams SSE streams on replay_server.py, each covering its own range
+of --sites-per-stream fleet sites, and forwards every message's readings to
+POST /monitor/<prefix>-<site>, one request per site and message, as the
+sites' gateways would. Reports the readings per second delivered, the
+/monitor latency percentiles, the replay lag, and the classification of
+each session at the end.
+
+Usage (from API/testing_scripts, with openai_api3.py and replay_server.py running):
+    python replay_monitor.py --streams 10 --sites-per-stream 10 --days 1 --resolution 5 --speed 3600 \
+        --attack "gm:0-9:2025-04-01T10:00/2025-04-01T18:00"
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+def read_events(response):
+    """Yield (event, data) pairs of a Server-Sent Events response"""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith('event:'):
+            event = line.split(':', 1)[1].strip()
+        elif line.startswith('data:'):
+            yield event, json.loads(line.split(':', 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replay', default="http://127.0.0.1:8002/replay/sse")
+    parser.add_argument('--monitor', default="http://127.0.0.1:8000/monitor")
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--sites-per-stream', type=int, default=5)
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--resolution', type=int, default=60, help="minutes per reading")
+    parser.add_argument('--speed', type=float, default=3600.0, help="replay speed-up, 1 to 10000")
+    parser.add_argument('--overflow', choices=['block', 'skip'], default='block')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--attack', action='append', default=[], help="ATTACK:SITES:START/END, as fleet.py takes it")
+    parser.add_argument('--prefix', default="replay", help="monitor session id prefix")
+    args = parser.parse_args()
+
+    latencies = []
+    lags = []
+    counts = Counter()
+    lock = threading.Lock()
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.streams))
+
+    def run_stream(index):
+        first = index * args.sites_per_stream
+        params = {'sites': f"{first}-{first + args.sites_per_stream - 1}", 'days': args.days, 'seed': args.seed,
+                  'resolution': args.resolution, 'speed': args.speed, 'overflow': args.overflow,
+                  'attack': args.attack}
+        with requests.get(args.replay, params=params, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for event, data in read_events(response):
+                if event != 'readings':
+                    continue
+                for site, rows in data['sites'].items():
+                    start = time.perf_counter()
+                    reply = session.post(f"{args.monitor}/{args.prefix}-{site}", json={'rows': rows}, timeout=60)
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        counts['readings'] += len(rows)
+                        counts['ok' if reply.ok else f"HTTP {reply.status_code}"] += 1
+                with lock:
+                    lags.append(data['lag'])
+                    counts['skipped'] += data['skipped']
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.streams) as pool:
+        for future in [pool.submit(run_stream, i) for i in range(args.streams)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    labels = Counter()
+    for site in range(args.streams * args.sites_per_stream):
+        reply = session.get(f"{args.monitor}/{args.prefix}-{site}", timeout=60)
+        labels[reply.json().get('likely_attack', 'no session') if reply.ok else 'no session'] += 1
+        session.delete(f"{args.monitor}/{args.prefix}-{site}", timeout=60)
+
+    print(f"Streams:       {args.streams} x {args.sites_per_stream} sites at {args.speed:g}x for {elapsed:.1f}s")
+    print(f"Readings:      {counts['readings']} ({counts['readings'] / elapsed:.0f}/s), {counts['skipped']} skipped")
+    print("Requests:      " + ", ".join(f"{k}: {v}" for k, v in counts.items() if k not in ('readings', 'skipped')))
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        print(f"Latency (ms):  p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}  max {max(latencies) * 1000:.1f}")
+    if lags:
+        print(f"Replay lag:    max {max(lags):.2f}s")
+    print("Sessions:      " + ", ".join(f"{label}: {n}" for label, n in labels.most_common()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""Replay simulated DER telemetry as a live feed over Server-Sent Events or WebSocket.
+
+Readings are sent at the pace of their timestamps divided by `speed`
+(1 = real time, up to 10000), so one process can stand in for many sites
+reporting continuously. Each message carries every reading that has come
+due since the previous one, grouped by site, in the same row format that
+POST /monitor/<session> accepts:
+
+    {"sites": {"3": [["2025-04-01 10:00:00", 4.6, 1.4, 0.0, 4.2, 0.0, 0.27, 2.0], ...]},
+     "lag": 0.01, "skipped": 0}
+
+Sources (query parameter `source`):
+    fleet   readings generated on the fly with Data2/fleet.py (default);
+            sites=0-99, days, resolution (minutes), seed, start and
+            attack=ATTACK:SITES:START/END windows as fleet.py takes them
+    log     CSV logs under Data2/Logs2, log=gm/gm_simulation_log_1.csv
+            (repeatable; each log is one site)
+    shards  a fleet.py output directory under Data2, shards=fleet&sites=0-9
+
+Backpressure: messages are only produced as fast as the client takes them.
+With overflow=block (default) a slow client falls behind the schedule and
+catches up in batches of at most max_batch readings; with overflow=skip the
+oldest due readings are dropped instead so the stream stays on time, and
+the message says how many. DER_REPLAY_MAX_STREAMS caps concurrent streams.
+
+Usage (from API/testing_scripts):
+    uvicorn replay_server:app --port 8002
+    curl -N "http://127.0.0.1:8002/replay/sse?sites=0-9&speed=3600"
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from argparse import ArgumentTypeError
+from datetime import datetime
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Data2')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, DATA_DIR)
+from der_logs import LOG_COLUMNS, parse_csv_log  # noqa: E402
+from fleet import RESOLUTIONS, inject_attacks, parse_attack, parse_sites, sample_sites, simulate_chunk  # noqa: E402
+from generate2 import HOURS_PER_DAY, INITIAL_BATTERY_LEVEL, START_TIME  # noqa: E402
+from generate_shards import load_manifest, load_shard  # noqa: E402
+
+MAX_STREAMS = int(os.getenv('DER_REPLAY_MAX_STREAMS', 1000))
+MAX_SPEED = 10000
+TICK_SECONDS = 0.05  # shortest pause between messages
+
+
+class ReplayStats:
+    def __init__(self):
+        self.active = 0
+        self.started = 0
+        self.readings = 0
+        self.skipped = 0
+        self.max_lag = 0.0
+
+    def as_dict(self):
+        return {"active_streams": self.active, "max_streams": MAX_STREAMS, "started": self.started,
+                "readings_sent": self.readings, "readings_skipped": self.skipped, "max_lag_seconds": round(self.max_lag, 3)}
+
+
+stats = ReplayStats()
+
+
+def flat_chunk(timestamps, site_ids, values):
+    """A source chunk: readings of all sites in time order"""
+    order = np.argsort(timestamps, kind='stable')
+    return {'timestamp': timestamps[order], 'site': site_ids[order], 'values': values[order]}
+
+
+def fleet_chunks(site_ids, days, resolution, start_time, seed, windows):
+    """Generate each day of the requested fleet sites as it is needed.
+
+    Site parameters are drawn as fleet.py draws them for the same seed.
+    """
+    site_seed, _, chunk_seed = np.random.SeedSequence(seed).spawn(3)
+    sites = {name: values[site_ids] for name, values in
+             sample_sites(max(site_ids) + 1, np.random.default_rng(site_seed)).items()}
+    rng = np.random.default_rng(chunk_seed)
+    site_ids = np.asarray(site_ids)
+    state = {'battery_level': np.full(len(site_ids), INITIAL_BATTERY_LEVEL)}
+    steps_per_hour = 60 // resolution
+    for day in range(days):
+        data = simulate_chunk(sites, day, 1, steps_per_hour, start_time, rng, state)
+        timestamps = (np.datetime64(start_time, 's') + np.timedelta64(day, 'D')
+                      + (np.arange(HOURS_PER_DAY * steps_per_hour) * resolution).astype('timedelta64[m]'))
+        reported, _ = inject_attacks(data, windows, site_ids, timestamps, rng)
+        # Time-major so readings come out in timestamp order
+        step_index, site_index = np.nonzero(reported.T)
+        values = np.stack([data[name][site_index, step_index] for name in LOG_COLUMNS], axis=-1)
+        yield {'timestamp': timestamps[step_index], 'site': site_ids[site_index], 'values': values}
+
+
+def log_chunks(paths):
+    """Every log is one site, numbered in the order given"""
+    timestamps, site_ids, values = [], [], []
+    for site, path in enumerate(paths):
+        with open(path) as f:
+            parsed = parse_csv_log(f.read())
+        if not parsed or parsed['row_count'] == 0:
+            continue
+        columns = parsed['columns']
+        timestamps.append(columns['timestamp'])
+        site_ids.append(np.full(parsed['row_count'], site))
+        values.append(np.stack([columns[name] for name in LOG_COLUMNS], axis=-1))
+    if timestamps:
+        yield flat_chunk(np.concatenate(timestamps), np.concatenate(site_ids), np.concatenate(values))
+
+
+def shard_chunks(shard_dir, manifest, site_ids):
+    """Replay fleet.py shards chunk by chunk, keeping only the requested sites"""
+    wanted = np.asarray(site_ids)
+    for chunk in sorted({shard['chunk'] for shard in manifest['shards']}):
+        parts = []
+        for shard in manifest['shards']:
+            first, last = shard['sites']
+            if shard['chunk'] == chunk and ((wanted >= first) & (wanted <= last)).any():
+                columns = load_shard(os.path.join(shard_dir, shard['path']))
+                keep = np.isin(columns['site_id'], wanted)
+                parts.append((columns['timestamp'][keep], columns['site_id'][keep],
+                              np.stack([columns[name][keep] for name in LOG_COLUMNS], axis=-1).astype(float)))
+        if parts:
+            yield flat_chunk(*(np.concatenate(part) for part in zip(*parts)))
+
+
+def within(base, relative):
+    """Resolve relative under base, refusing paths that escape it"""
+    path = os.path.realpath(os.path.join(base, relative))
+    if not path.startswith(os.path.realpath(base) + os.sep):
+        raise ValueError(f"{relative!r} is outside the data directory")
+    return path
+
+
+def requested_sites(params):
+    """Site ids of the sites= parameter; raises ValueError for an empty or malformed list"""
+    text = params.get('sites', '0')
+    try:
+        site_ids = parse_sites(text)
+    except ValueError:
+        raise ValueError(f"sites must be ids and ranges like 0-9,15, not {text!r}")
+    if not site_ids or min(site_ids) < 0:
+        raise ValueError(f"sites {text!r} names no site")
+    return site_ids
+
+
+def open_source(params):
+    """Chunk iterator for the query parameters of a stream request.
+
+    The sources are generators that only read or generate data once the
+    stream runs, so everything that can fail (paths, manifest, sites) is
+    checked here, while the request can still be refused with a 400.
+    """
+    source = params.get('source', 'fleet')
+    if source == 'fleet':
+        try:
+            windows = [parse_attack(spec) for spec in params.getlist('attack')]
+        except (ValueError, ArgumentTypeError) as e:
+            raise ValueError(f"attack must be ATTACK:SITES:START/END ({e})")
+        resolution = int(params.get('resolution', 60))
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {RESOLUTIONS} minutes")
+        start = datetime.fromisoformat(params.get('start', START_TIME.date().isoformat()))
+        return fleet_chunks(requested_sites(params), int(params.get('days', 1)), resolution,
+                            datetime(start.year, start.month, start.day), int(params.get('seed', 0)), windows)
+    if source == 'log':
+        paths = [within(os.path.join(DATA_DIR, 'Logs2'), log) for log in params.getlist('log')]
+        if not paths:
+            raise ValueError("source=log needs at least one log=<attack>/<file>.csv")
+        for log, path in zip(params.getlist('log'), paths):
+            if not os.path.isfile(path):
+                raise ValueError(f"no log {log!r} under Data2/Logs2")
+        return log_chunks(paths)
+    if source == 'shards':
+        shards = params.get('shards', 'fleet')
+        shard_dir = within(DATA_DIR, shards)
+        try:
+            manifest = load_manifest(shard_dir)
+        except (OSError, ValueError):
+            raise ValueError(f"{shards!r} is not a fleet.py shard directory under Data2")
+        site_ids = requested_sites(params)
+        if not any(first <= site <= last for shard in manifest['shards'] for first, last in [shard['sites']]
+                   for site in site_ids):
+            raise ValueError(f"no shard of {shards!r} holds sites {params.get('sites', '0')!r}")
+        return shard_chunks(shard_dir, manifest, site_ids)
+    raise ValueError(f"unknown source {source!r}")
+
+
+def encode_rows(chunk, start, end):
+    """{site: rows} for readings start..end-1 of a chunk, rows as POST /monitor expects"""
+    timestamps = np.char.replace(np.datetime_as_string(chunk['timestamp'][start:end], unit='s'), 'T', ' ').tolist()
+    values = np.round(chunk['values'][start:end], 4).tolist()
+    sites = {}
+    for timestamp, site, row in zip(timestamps, chunk['site'][start:end].tolist(), values):
+        sites.setdefault(str(site), []).append([timestamp] + row)
+    return sites
+
+
+async def replay(chunks, speed, overflow, max_batch):
+    """Yield message dicts at the pace of the readings' timestamps divided by speed.
+
+    The caller awaits the send of each message before asking for the next,
+    which is what applies backpressure.
+    """
+    loop = asyncio.get_running_loop()
+    start_wall = first_time = None
+    lag = 0.0
+    while True:
+        # Generating a chunk (a simulated day) can take a while; keep the loop free
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            return
+        seconds = chunk['timestamp'].astype(np.int64)
+        if start_wall is None and len(seconds):
+            start_wall, first_time = loop.time(), seconds[0]
+        i = 0
+        while i < len(seconds):
+            due = start_wall + (seconds[i] - first_time) / speed
+            now = loop.time()
+            if due > now:
+                await asyncio.sleep(max(due - now, TICK_SECONDS))
+                now = loop.time()
+            # Everything whose time has come, at least one reading
+            end = max(int(np.searchsorted(seconds, first_time + (now - start_wall) * speed, side='right')), i + 1)
+            skipped = 0
+            if end - i > max_batch:
+                if overflow == 'skip':
+                    skipped = end - max_batch - i
+                    i = end - max_batch
+                else:
+                    end = i + max_batch
+            lag = max(now - (start_wall + (seconds[i] - first_time) / speed), 0.0)
+            stats.readings += end - i
+            stats.skipped += skipped
+            stats.max_lag = max(stats.max_lag, lag)
+            yield {"sites": encode_rows(chunk, i, end), "lag": round(lag, 3), "skipped": skipped}
+            i = end
+
+
+def stream_options(params):
+    speed = float(params.get('speed', 1))
+    if not 1 <= speed <= MAX_SPEED:
+        raise ValueError(f"speed must be between 1 and {MAX_SPEED}")
+    overflow = params.get('overflow', 'block')
+    if overflow not in ('block', 'skip'):
+        raise ValueError("overflow must be 'block' or 'skip'")
+    return speed, overflow, max(int(params.get('max_batch', 5000)), 1)
+
+
+async def replay_sse(request):
+    """Server-Sent Events stream: one 'readings' event per message, then an 'end' event"""
+    try:
+        chunks = open_source(request.query_params)
+        speed, overflow, max_batch = stream_options(request.query_params)
+    except (ValueError, OSError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if stats.active >= MAX_STREAMS:
+        return JSONResponse({"error": "Too many replay streams."}, status_code=503)
+
+    async def events():
+        stats.active += 1
+        stats.started += 1
+        sent = 0
+        start = time.perf_counter()
+        try:
+            async for message in replay(chunks, speed, overflow, max_batch):
+                sent += sum(len(rows) for rows in message['sites'].values())
+                yield f"event: readings\ndata: {json.dumps(message)}\n\n"
+            summary = {"readings": sent, "seconds": round(time.perf_counter() - start, 3)}
+            yield f"event: end\ndata: {json.dumps(summary)}\n\n"
+        finally:
+            stats.active -= 1
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+async def replay_ws(websocket):
+    """WebSocket stream: one JSON text message per message, then {"end": {...}}"""
+    await websocket.accept()
+    try:
+        chunks = open_source(websocket.query_params)
+        speed, overflow, max_batch = stream_options(websocket.query_params)
+    except (ValueError, OSError) as e:
+        await websocket.send_json({"error": str(e)})
+        await websocket.close(code=1008)
+        return
+    if stats.active >= MAX_STREAMS:
+        await websocket.send_json({"error": "Too many replay streams."})
+        await websocket.close(code=1013)
+        return
+
+    stats.active += 1
+    stats.started += 1
+    sent = 0
+    start = time.perf_counter()
+    try:
+        async for message in replay(chunks, speed, overflow, max_batch):
+            sent += sum(len(rows) for rows in message['sites'].values())
+            await websocket.send_json(message)
+        await websocket.send_json({"end": {"readings": sent, "seconds": round(time.perf_counter() - start, 3)}})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stats.active -= 1
+
+
+async def replay_stats(request):
+    return JSONResponse(stats.as_dict())
+
+
+app = Starlette(routes=[
+    Route('/replay/sse', replay_sse, methods=['GET']),
+    WebSocketRoute('/replay/ws', replay_ws),
+    Route('/replay/stats', replay_stats, methods=['GET'])
+])
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=int(os.getenv('DER_REPLAY_PORT', 8002)))
@@ -0,0 +1,12 @@
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:  # not installed, or the encoding cannot be downloaded
+    _encoding = None
+
+
+def count_tokens(text):
+    """Tokens in text: exact with tiktoken installed, otherwise about 4 characters per token"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
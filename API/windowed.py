@@ -0,0 +1,240 @@
+"""Sliding-window detection over long logs.
+
+The whole-log analysis reads a log as one day: a single attacked hour in a
+month-long log is diluted, and the result cannot say when it happened.
+Here the indicators are computed for every window of window_hours,
+starting every stride_hours, and scored with the same rules. Per-reading
+masks, hourly slot occupancy and battery jumps are turned into cumulative
+sums once, so each window's indicators are a few differences: O(n) for the
+log plus O(1) per window, however much the windows overlap. Consecutive
+windows with the same attack label are merged into time intervals.
+
+Usage (from API/):
+    python windowed.py site_3.csv --window 24 --stride 1
+    python windowed.py site_3.derlog --window 6 --stride 1 --windows
+"""
+import argparse
+import json
+
+import numpy as np
+
+from der_logs import parse_csv_log
+from indicators import DEFAULT_RULES, INDICATOR_NAMES, SECONDS_PER_HOUR, hour_mask, hours_in_slots, indicator_masks
+from log_summary import FLAGS, reading_masks
+
+CLEAN_LABEL = "Clean"
+# Per-reading masks pointing at each attack, used to narrow an interval to its evidence
+EVIDENCE_MASKS = {}
+for _flag, (_, _label) in FLAGS.items():
+    EVIDENCE_MASKS.setdefault(_label, []).append(_flag)
+
+
+def format_seconds(seconds):
+    return str(np.datetime64(int(seconds), 's')).replace('T', ' ')
+
+
+def window_bounds(first, last, window_hours, stride_hours):
+    """Start times (epoch seconds) of the windows covering first..last, starting on the hour.
+
+    With a stride over an hour the last window can run past the last
+    reading; its hourly slots are clipped to the log like every window's.
+    """
+    origin = first - first % SECONDS_PER_HOUR
+    window, stride = window_hours * SECONDS_PER_HOUR, stride_hours * SECONDS_PER_HOUR
+    # Enough windows that the last one reaches the end of the last reading's hour
+    count = max(-(-(last + SECONDS_PER_HOUR - origin - window) // stride) + 1, 1)
+    return origin + np.arange(count, dtype=np.int64) * stride
+
+
+def window_indicators(columns, window_hours=24, stride_hours=1, thresholds=None):
+    """Indicators of every window of a columnar log, as a table plus the window row ranges.
+
+    Returns (starts, table, row_count, lo, hi, columns): window start times,
+    an (windows, len(INDICATOR_NAMES)) float table, readings per window, the
+    [lo, hi) row range of each window and the columns in time order.
+    Hourly slots are counted on the clock-hour grid between the window
+    edges, clipped to the first and last reading of the log, so for a
+    one-day log and a 24-hour window the single window gets the same
+    indicators as analyze_log_data.
+    complete_data compares the window's readings with its expected count
+    at the log's median reading interval.
+    """
+    t = thresholds or DEFAULT_RULES.thresholds
+    seconds = columns['timestamp'].astype('datetime64[s]').astype(np.int64)
+    order = np.argsort(seconds, kind='stable')
+    if np.any(order != np.arange(len(order))):
+        columns = {name: values[order] for name, values in columns.items()}
+        seconds = seconds[order]
+    first, last = int(seconds[0]), int(seconds[-1])
+    starts = window_bounds(first, last, window_hours, stride_hours)
+    ends = starts + window_hours * SECONDS_PER_HOUR
+    lo = np.searchsorted(seconds, starts, side='left')
+    hi = np.searchsorted(seconds, ends, side='left')
+    row_count = hi - lo
+
+    def window_sums(per_reading):
+        cumulative = np.concatenate(([0], np.cumsum(per_reading, dtype=np.int64)))
+        return cumulative[hi] - cumulative[lo]
+
+    masks = indicator_masks(columns, t)
+    counts = {name: window_sums(mask) for name, mask in masks.items()}
+
+    # Occupied clock hours, relative to the hour of the first reading
+    origin_hour = first // SECONDS_PER_HOUR
+    on_hour = seconds % SECONDS_PER_HOUR == 0
+    occupied = np.zeros(last // SECONDS_PER_HOUR - origin_hour + 1, dtype=np.int64)
+    occupied[seconds[on_hour] // SECONDS_PER_HOUR - origin_hour] = 1
+    peak = hour_mask((origin_hour + np.arange(len(occupied))) % 24, t['peak_hours'])
+    seen_total = np.concatenate(([0], np.cumsum(occupied)))
+    peak_total = np.concatenate(([0], np.cumsum(occupied & peak)))
+    # Slots from the window start (or first reading) to the window's last hour (or last reading)
+    first_slot = -(-np.maximum(starts, first) // SECONDS_PER_HOUR) - origin_hour
+    last_slot = np.minimum(ends - 1, last) // SECONDS_PER_HOUR - origin_hour
+    slots = np.maximum(last_slot - first_slot + 1, 0)
+    seen = seen_total[first_slot + slots] - seen_total[first_slot]
+    peak_seen = peak_total[first_slot + slots] - peak_total[first_slot]
+    missing = slots - seen
+    peak_missing = hours_in_slots((origin_hour + first_slot) % 24, slots, t['peak_hours']) - peak_seen
+
+    # A jump counts for a window when both of its readings are inside it
+    jumps = np.concatenate(([False], np.abs(np.diff(columns['battery_charge'])) > t['erratic_battery_kwh']))
+    cumulative_jumps = np.concatenate(([0], np.cumsum(jumps)))
+    erratic = (cumulative_jumps[hi] - cumulative_jumps[np.minimum(lo + 1, hi)] > 0) & (row_count >= 3)
+
+    intervals = np.diff(seconds)
+    resolution = float(np.median(intervals[intervals > 0])) if np.any(intervals > 0) else SECONDS_PER_HOUR
+    expected = slots * SECONDS_PER_HOUR / resolution
+    charging_unexpected = counts['charging'] - counts['charging_in_expected']
+    indicators = {
+        'complete_data': row_count >= expected * t['complete_data_ratio'],
+        'high_home_load_pct': counts['high_home_load'] / np.maximum(row_count, 1),
+        'tesla_charging_outside_normal': charging_unexpected > counts['charging_in_expected'],
+        'missing_data_count': missing,
+        'peak_hour_missing_data': peak_missing > len(t['peak_hours']) * t['peak_missing_ratio'],
+        'multiple_zeroed_values': counts['zeroed'] > t['zeroed_values_min_count'],
+        'negative_grid_values_count': counts['negative_grid'],
+        'high_grid_values_count': counts['high_grid'],
+        'night_solar_count': counts['night_solar'],
+        'erratic_battery': erratic
+    }
+    table = np.column_stack([np.asarray(indicators[name], dtype=np.float64) for name in INDICATOR_NAMES])
+    return starts, table, row_count, lo, hi, columns
+
+
+def detect_windows(columns, window_hours=24, stride_hours=1, rules=None, include_windows=False):
+    """Score every window of a columnar log and merge flagged windows into attack intervals.
+
+    Each interval runs from the first to the last reading of its windows
+    (the window edges if they hold no reading), with the best score any of
+    its windows gave the label. evidence_from/evidence_to narrow it to the
+    first and last reading flagged for that label, when the label has
+    per-reading flags.
+    """
+    rules = rules or DEFAULT_RULES
+    result = {'window_hours': window_hours, 'stride_hours': stride_hours, 'windows': 0, 'intervals': []}
+    if len(columns['timestamp']) == 0:
+        return result
+    starts, table, row_count, lo, hi, columns = window_indicators(columns, window_hours, stride_hours, rules.thresholds)
+    scores, likely = rules.score_table(table)
+    seconds = columns['timestamp'].astype(np.int64)
+    masks = None
+    label_index = {label: i for i, label in enumerate(rules.labels)}
+    window = window_hours * SECONDS_PER_HOUR
+    result['windows'] = len(starts)
+
+    k = 0
+    while k < len(starts):
+        label = likely[k]
+        if label == CLEAN_LABEL or label not in label_index:
+            k += 1
+            continue
+        run = k
+        while run + 1 < len(starts) and likely[run + 1] == label:
+            run += 1
+        first_row, last_row = lo[k], hi[run]
+        has_rows = last_row > first_row
+        interval = {
+            'label': label,
+            'from': format_seconds(seconds[first_row] if has_rows else starts[k]),
+            'to': format_seconds(seconds[last_row - 1] if has_rows else starts[run] + window),
+            'score': int(scores[k:run + 1, label_index[label]].max()),
+            'windows': run - k + 1,
+            'readings': int(last_row - first_row)
+        }
+        if label in EVIDENCE_MASKS and has_rows:
+            if masks is None:
+                masks = reading_masks(columns, rules.thresholds)
+            flagged = np.zeros(last_row - first_row, dtype=bool)
+            for flag in EVIDENCE_MASKS[label]:
+                flagged |= masks[flag][first_row:last_row]
+            hits = np.flatnonzero(flagged)
+            if len(hits):
+                interval['evidence_from'] = format_seconds(seconds[first_row + hits[0]])
+                interval['evidence_to'] = format_seconds(seconds[first_row + hits[-1]])
+        result['intervals'].append(interval)
+        k = run + 1
+
+    if include_windows:
+        result['window_scores'] = [
+            {'from': format_seconds(start), 'readings': int(count), 'likely_attack': label,
+             'attack_likelihood': {name: int(s) for name, s in zip(rules.labels, row)}}
+            for start, count, label, row in zip(starts.tolist(), row_count.tolist(), likely, scores)
+        ]
+    return result
+
+
+def window_options(args):
+    """(window_hours, stride_hours) from ?window=&stride= request arguments, or None without a window.
+
+    Raises ValueError for lengths that are not positive whole hours.
+    """
+    if not args.get('window'):
+        return None
+    window_hours, stride_hours = int(args['window']), int(args.get('stride') or 1)
+    if window_hours <= 0 or stride_hours <= 0:
+        raise ValueError("window and stride must be positive numbers of hours")
+    return window_hours, stride_hours
+
+
+class WindowedDetector:
+    """Observer for analyze_log_stream that keeps the parsed batches and runs detect_windows at the end.
+
+    Unlike the whole-log indicators this holds the log's columns in memory.
+    """
+
+    def __init__(self, window_hours=24, stride_hours=1, rules=None):
+        self.window_hours = window_hours
+        self.stride_hours = stride_hours
+        self.rules = rules or DEFAULT_RULES
+        self.batches = []
+
+    def update(self, columns):
+        if len(columns['timestamp']):
+            self.batches.append(columns)
+
+    def result(self, include_windows=False):
+        if not self.batches:
+            return detect_windows({'timestamp': np.empty(0, dtype='datetime64[s]')}, self.window_hours, self.stride_hours, self.rules)
+        columns = {name: np.concatenate([batch[name] for batch in self.batches]) for name in self.batches[0]}
+        return detect_windows(columns, self.window_hours, self.stride_hours, self.rules, include_windows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help="CSV log (or .derlog binary log)")
+    parser.add_argument('--window', type=int, default=24, help="window length in hours")
+    parser.add_argument('--stride', type=int, default=1, help="hours between window starts")
+    parser.add_argument('--windows', action='store_true', help="also print every window's scores")
+    args = parser.parse_args()
+
+    if args.log.endswith('.derlog'):
+        from der_binary import read_binary_log, records_to_columns
+        columns = records_to_columns(read_binary_log(args.log))
+    else:
+        with open(args.log) as f:
+            columns = parse_csv_log(f.read())['columns']
+    print(json.dumps(detect_windows(columns, args.window, args.stride, include_windows=args.windows), indent=2))
+
+
+if __name__ == '__main__':
+    main()
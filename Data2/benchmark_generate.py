@@ -0,0 +1,207 @@
+"""Compare the vectorized simulator in generate2.py with the original per-hour loop.
+
+Times both for the same number of runs per attack type, with and without
+writing the per-run CSV files, then times the vectorized simulator alone
+at a larger scale. Column means per attack type are printed side by side
+as a check that both produce the same distributions.
+
+Usage (from the repository root):
+    python Data2/benchmark_generate.py --runs 50 --scale-runs 100000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from generate2 import (
+    ATTACK_TYPES, BATTERY_CAPACITY, BATTERY_DISCHARGE_RATE, COLUMNS, HEADERS, HOME_BASE_LOAD,
+    HOURS_PER_DAY, TESLA_CHARGE_KW, WEATHER_OPTIONS, simulate_runs, write_csv_logs
+)
+
+
+# The original generate2.py loop, kept here as the benchmark baseline
+def solar_generation_loop(hour, weather):
+    max_solar_output = 6.5
+    if 6 <= hour <= 18:
+        base_solar = max_solar_output * np.sin(np.pi * (hour - 6) / 12)
+        if weather == "cloudy":
+            return base_solar * np.random.uniform(0.4, 0.7)
+        elif weather == "rainy":
+            return base_solar * np.random.uniform(0.1, 0.4)
+        return base_solar
+    else:
+        return 0.0
+
+
+def simulate_appliance_load_loop(hour, weather):
+    base = HOME_BASE_LOAD + np.random.normal(0., 0.1)
+    if weather in ["cloudy", "rainy"]:
+        base += np.random.uniform(0.1, 0.4)
+    if hour in [7, 8, 12, 18, 19]:
+        base += np.random.uniform(0.3, 0.6)
+    return round(base, 2)
+
+
+def tesla_charging_decision_loop(hour, day_of_week):
+    if 17 <= hour <= 22 and np.random.rand() < 0.3:
+        return TESLA_CHARGE_KW
+    elif hour in [11, 12, 13, 18, 19] and np.random.rand() < 0.2:
+        return TESLA_CHARGE_KW
+    return 0.0
+
+
+def apply_attack_loop(attack_type, data_entry, hour):
+    if attack_type == "mitm":
+        if 0 <= hour <= 5 or 20 <= hour <= 23:
+            data_entry[1] = np.random.uniform(1.5, 3.0)
+        else:
+            data_entry[1] *= np.random.uniform(0.6, 1.4)
+        data_entry[4] = data_entry[4] * np.random.uniform(0.7, 1.3)
+    elif attack_type == "dos":
+        if 10 <= hour <= 14 or 18 <= hour <= 20:
+            if np.random.rand() < 0.8:
+                return None
+        if np.random.rand() < 0.3:
+            data_entry[1] = 0.0
+            data_entry[4] = 0.0
+    elif attack_type == "bd":
+        data_entry[2] = HOME_BASE_LOAD + np.random.uniform(2.0, 3.5)
+        data_entry[3] = TESLA_CHARGE_KW
+        data_entry[4] = max(0.5, data_entry[4] - np.random.uniform(0.5, 1.0))
+    elif attack_type == "gm":
+        if np.random.rand() < 0.5:
+            data_entry[6] = -np.random.uniform(1.0, 5.0)
+        else:
+            multiplier = np.random.uniform(3.0, 8.0)
+            if np.random.rand() < 0.5:
+                data_entry[6] *= multiplier
+            else:
+                data_entry[7] *= multiplier
+    return data_entry
+
+
+def simulate_run_loop(attack_type):
+    start_time = datetime(2025, 4, 1, 0, 0, 0)
+    battery_level = 3.5
+    data = []
+    weather = np.random.choice(WEATHER_OPTIONS, p=[0.6, 0.3, 0.1])
+    for day in range(1):
+        for hour in range(HOURS_PER_DAY):
+            timestamp = start_time + timedelta(hours=day * 24 + hour)
+            solar_kW = round(solar_generation_loop(hour, weather), 2)
+            home_kW = simulate_appliance_load_loop(hour, weather)
+            tesla_kW = tesla_charging_decision_loop(hour, day % 7)
+
+            charge_power = 0.0
+            if solar_kW > (home_kW + tesla_kW):
+                charge_power = min(solar_kW - home_kW - tesla_kW, BATTERY_CAPACITY - battery_level)
+                battery_level += charge_power
+                battery_discharge_kW = 0.0
+            else:
+                needed_power = home_kW + tesla_kW - solar_kW
+                battery_discharge_kW = min(needed_power, battery_level, BATTERY_DISCHARGE_RATE)
+                battery_level -= battery_discharge_kW
+                needed_power -= battery_discharge_kW
+
+            grid_import_kW = max(0, needed_power)
+            grid_export_kW = max(0, solar_kW - home_kW - tesla_kW - (battery_level - charge_power))
+
+            data_entry = [
+                timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                round(solar_kW, 2),
+                round(home_kW, 2),
+                round(tesla_kW, 2),
+                round(battery_level, 2),
+                round(battery_discharge_kW, 2),
+                round(grid_import_kW, 2),
+                round(grid_export_kW, 2)
+            ]
+
+            modified_entry = apply_attack_loop(attack_type, data_entry, hour)
+            if modified_entry:
+                data.append(modified_entry)
+    return data
+
+
+def write_run_loop(data, attack_type, out_dir, i):
+    filename = os.path.join(out_dir, attack_type, f"{attack_type}_simulation_log_{i + 1}.csv")
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADERS)
+        writer.writerows(data)
+
+
+def loop_generate(runs, out_dir=None):
+    """All runs with the original loop; returns {attack: [rows]}"""
+    results = {}
+    for attack_type in ATTACK_TYPES:
+        results[attack_type] = []
+        if out_dir:
+            os.makedirs(os.path.join(out_dir, attack_type), exist_ok=True)
+        for i in range(runs):
+            data = simulate_run_loop(attack_type)
+            results[attack_type].extend(data)
+            if out_dir:
+                write_run_loop(data, attack_type, out_dir, i)
+    return results
+
+
+def vectorized_generate(runs, rng, out_dir=None):
+    results = {}
+    for attack_type in ATTACK_TYPES:
+        results[attack_type] = data = simulate_runs(attack_type, runs, rng)
+        if out_dir:
+            write_csv_logs(data, attack_type, out_dir)
+    return results
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=50, help="runs per attack type for the comparison")
+    parser.add_argument('--scale-runs', type=int, default=100000, help="runs per attack type for the vectorized-only timing")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    site_days = args.runs * len(ATTACK_TYPES)
+
+    loop_results, loop_seconds = timed(loop_generate, args.runs)
+    vector_results, vector_seconds = timed(vectorized_generate, args.runs, rng)
+    with tempfile.TemporaryDirectory() as out_dir:
+        _, loop_csv_seconds = timed(loop_generate, args.runs, os.path.join(out_dir, "loop"))
+        _, vector_csv_seconds = timed(vectorized_generate, args.runs, rng, os.path.join(out_dir, "vectorized"))
+
+    print(f"{site_days} site-days ({args.runs} runs x {len(ATTACK_TYPES)} attack types)")
+    print(f"{'':24}{'loop s':>10}{'vectorized s':>14}{'speedup':>10}")
+    for name, loop_s, vector_s in [("simulate", loop_seconds, vector_seconds),
+                                   ("simulate + write CSV", loop_csv_seconds, vector_csv_seconds)]:
+        print(f"{name:24}{loop_s:10.3f}{vector_s:14.3f}{loop_s / vector_s:10.1f}x")
+
+    scale_days = args.scale_runs * len(ATTACK_TYPES)
+    _, scale_seconds = timed(vectorized_generate, args.scale_runs, rng)
+    print(f"vectorized, {scale_days} site-days: {scale_seconds:.2f}s ({scale_days / scale_seconds:,.0f} site-days/s)")
+
+    print("\nColumn means, loop / vectorized:")
+    print(f"{'attack':8}{'rows':>14}" + "".join(f"{name[:12]:>16}" for name in COLUMNS))
+    for attack_type in ATTACK_TYPES:
+        loop_values = np.array([row[1:] for row in loop_results[attack_type]], dtype=float)
+        data = vector_results[attack_type]
+        reported = data['reported']
+        vector_means = [data[name][reported].mean() for name in COLUMNS]
+        cells = "".join(f"{a:8.2f}/{b:<7.2f}" for a, b in zip(loop_values.mean(axis=0), vector_means))
+        print(f"{attack_type:8}{len(loop_values):>7}/{int(reported.sum()):<6}{cells}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""Simulate a fleet of DER sites reporting continuously, with attacks in chosen windows.
+
+N sites x D days at a resolution from one reading per hour down to one per
+minute. Every site gets its own battery capacity, discharge rate, PV size,
+charger power and base load. Attacks from generate2.py are applied only
+inside the given windows of the given sites, and every reading carries the
+label of the attack active at that moment ('clean' otherwise).
+
+Sites are split into blocks simulated in parallel worker processes; each
+worker walks through time in chunks of --chunk-days, carrying the battery
+state from one chunk to the next, and writes every chunk as its own .npz
+shard (same fields as generate_shards.py, with site_id instead of run_id),
+so memory is bounded by one chunk per worker whatever the fleet size.
+Sites, attack windows and shards are listed in manifest.json.
+
+Usage (from the repository root):
+    python Data2/fleet.py --sites 1000 --days 365 --resolution 1 --random-attacks 200 --out ./Data2/fleet
+    python Data2/fleet.py --sites 20 --days 7 --attack "gm:0-4:2025-04-03T10:00/2025-04-03T18:00"
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from generate2 import (
+    ATTACK_TYPES, COLUMNS, HOURS_PER_DAY, INITIAL_BATTERY_LEVEL, START_TIME, WEATHER_PROBABILITIES,
+    WEATHER_SOLAR_FACTOR, apply_attack, battery_dispatch, tesla_charging_decision
+)
+
+RESOLUTIONS = (1, 2, 5, 10, 15, 20, 30, 60)  # minutes per reading; all divide an hour
+# (low, high) per site parameter
+SITE_PARAMETER_RANGES = {
+    'battery_capacity': (5.0, 13.5),  # kWh
+    'discharge_rate': (2.0, 5.0),  # kW
+    'pv_kw': (3.0, 10.0),  # peak solar output
+    'base_load': (1.0, 2.0),  # kW
+}
+CHARGER_OPTIONS = [3.7, 7.7, 11.5]  # kW
+SHARD_FIELDS = ['timestamp', 'hour'] + COLUMNS + ['label', 'site_id']
+
+
+def sample_sites(count, rng):
+    """Per-site parameters as arrays of length count"""
+    sites = {name: rng.uniform(low, high, size=count) for name, (low, high) in SITE_PARAMETER_RANGES.items()}
+    sites['charger_kw'] = rng.choice(CHARGER_OPTIONS, size=count)
+    return sites
+
+
+def parse_sites(text):
+    """'0-9,15' -> [0, 1, ..., 9, 15]"""
+    sites = []
+    for part in text.split(','):
+        first, _, last = part.partition('-')
+        sites.extend(range(int(first), int(last or first) + 1))
+    return sites
+
+
+def parse_attack(spec):
+    """'ATTACK:SITES:START/END', e.g. 'dos:0-9:2025-04-03T10:00/2025-04-03T16:00', as a window dict"""
+    attack_type, sites, period = spec.split(':', 2)
+    start, end = period.split('/')
+    if attack_type not in ATTACK_TYPES[1:]:
+        raise argparse.ArgumentTypeError(f"unknown attack type {attack_type!r}")
+    return {'attack': attack_type, 'sites': parse_sites(sites), 'start': start, 'end': end}
+
+
+def random_windows(count, sites, start_time, days, rng, max_hours=24):
+    """count attack windows of 1..max_hours whole hours at random sites and times"""
+    windows = []
+    for _ in range(count):
+        hours = int(rng.integers(1, max_hours + 1))
+        offset = int(rng.integers(0, max(days * HOURS_PER_DAY - hours, 0) + 1))
+        start = start_time + timedelta(hours=offset)
+        windows.append({'attack': str(rng.choice(ATTACK_TYPES[1:])), 'sites': [int(rng.integers(sites))],
+                        'start': start.isoformat(), 'end': (start + timedelta(hours=hours)).isoformat()})
+    return windows
+
+
+def simulate_chunk(sites, first_day, days, steps_per_hour, start_time, rng, state):
+    """Clean readings of every site for days [first_day, first_day + days); each column is (sites, steps)"""
+    count = len(sites['pv_kw'])
+    hour_index = np.arange(days * HOURS_PER_DAY)
+    hours = hour_index % HOURS_PER_DAY
+    day_of_week = (start_time.weekday() + first_day + hour_index // HOURS_PER_DAY) % 7
+
+    # Weather is drawn per site and day; cloud cover, load and charging per site and hour
+    weather = np.repeat(rng.choice(len(WEATHER_PROBABILITIES), size=(count, days), p=WEATHER_PROBABILITIES),
+                        HOURS_PER_DAY, axis=1)
+    low, high = WEATHER_SOLAR_FACTOR[weather, 0], WEATHER_SOLAR_FACTOR[weather, 1]
+    cloud_factor = rng.uniform(low, high)
+    load = sites['base_load'][:, None] + rng.normal(0., 0.1, size=weather.shape)
+    load += (weather > 0) * rng.uniform(0.1, 0.4, size=weather.shape)
+    load += np.isin(hours, [7, 8, 12, 18, 19]) * rng.uniform(0.3, 0.6, size=weather.shape)
+    tesla = tesla_charging_decision(hours, day_of_week, count, rng, sites['charger_kw'][:, None])
+
+    # Solar follows the sun within the hour; the hourly draws hold for every reading in the hour
+    hour_of_day = (np.arange(days * HOURS_PER_DAY * steps_per_hour) / steps_per_hour) % HOURS_PER_DAY
+    daylight = (hour_of_day >= 6) & (hour_of_day <= 18)
+    sun = np.where(daylight, np.sin(np.pi * (hour_of_day - 6) / 12), 0.0)
+    solar_kW = np.round(sites['pv_kw'][:, None] * sun * np.repeat(cloud_factor, steps_per_hour, axis=1), 2)
+    home_kW = np.round(np.repeat(load, steps_per_hour, axis=1), 2)
+    tesla_kW = np.repeat(tesla, steps_per_hour, axis=1)
+    battery_level, discharge_kW, grid_import_kW, grid_export_kW = battery_dispatch(
+        solar_kW, home_kW, tesla_kW, capacity=sites['battery_capacity'], discharge_rate=sites['discharge_rate'],
+        step_hours=1 / steps_per_hour, state=state)
+
+    return {
+        'solar_generation': solar_kW,
+        'home_load': home_kW,
+        'tesla_charger': tesla_kW,
+        'battery_charge': np.round(battery_level, 2),
+        'battery_discharge': np.round(discharge_kW, 2),
+        'grid_import': np.round(grid_import_kW, 2),
+        'grid_export': np.round(grid_export_kW, 2)
+    }
+
+
+def inject_attacks(data, windows, site_ids, timestamps, rng):
+    """Apply each window's attack to its sites and times in this chunk; returns (reported, label) masks"""
+    shape = data['solar_generation'].shape
+    reported = np.ones(shape, dtype=bool)
+    label = np.zeros(shape, dtype=np.int8)
+    hours = ((timestamps - timestamps.astype('datetime64[D]')).astype(np.int64) // 3600)
+    for window in windows:
+        active = (timestamps >= np.datetime64(window['start'], 's')) & (timestamps < np.datetime64(window['end'], 's'))
+        rows = np.flatnonzero(np.isin(site_ids, window['sites']))
+        if not active.any() or len(rows) == 0:
+            continue
+        steps = np.flatnonzero(active)
+        block = np.ix_(rows, steps)
+        attacked = {name: data[name][block].copy() for name in COLUMNS}
+        still_reported = apply_attack(window['attack'], attacked, hours[steps], rng)
+        for name in COLUMNS:
+            data[name][block] = attacked[name]
+        reported[block] &= still_reported
+        label[block] = ATTACK_TYPES.index(window['attack'])
+    return reported, label
+
+
+def simulate_block(block, site_ids, sites, windows, days, chunk_days, resolution, start_time, seed_sequence, out_dir, dtype):
+    """Simulate one block of sites chunk by chunk, writing a shard per chunk; runs in a worker process"""
+    rng = np.random.default_rng(seed_sequence)
+    steps_per_hour = 60 // resolution
+    site_ids = np.asarray(site_ids)
+    state = {'battery_level': np.full(len(site_ids), INITIAL_BATTERY_LEVEL)}
+    shards = []
+    for chunk, first_day in enumerate(range(0, days, chunk_days)):
+        chunk_len = min(chunk_days, days - first_day)
+        data = simulate_chunk(sites, first_day, chunk_len, steps_per_hour, start_time, rng, state)
+        steps = chunk_len * HOURS_PER_DAY * steps_per_hour
+        timestamps = (np.datetime64(start_time, 's') + np.timedelta64(first_day, 'D')
+                      + (np.arange(steps) * resolution).astype('timedelta64[m]'))
+        reported, label = inject_attacks(data, windows, site_ids, timestamps, rng)
+
+        # Site-major rows: each site's readings of the chunk in time order
+        site_index, step_index = np.nonzero(reported)
+        columns = {
+            'timestamp': timestamps[step_index],
+            'hour': (np.arange(steps) * resolution // 60 % HOURS_PER_DAY).astype(np.int8)[step_index],
+            'label': label[site_index, step_index],
+            'site_id': site_ids[site_index].astype(np.int32)
+        }
+        for name in COLUMNS:
+            columns[name] = data[name][site_index, step_index].astype(dtype)
+        path = os.path.join(out_dir, f"fleet-b{block:04d}-c{chunk:05d}.npz")
+        np.savez(path, labels=np.array(ATTACK_TYPES), **columns)
+        shards.append({'path': os.path.basename(path), 'block': block, 'chunk': chunk,
+                       'sites': [int(site_ids[0]), int(site_ids[-1])], 'start': str(timestamps[0]),
+                       'end': str(timestamps[-1]), 'rows': len(site_index)})
+    return shards
+
+
+def simulate_fleet(site_count, days, resolution, start_time, seed, windows, random_attacks, sites_per_block,
+                   chunk_days, workers, out_dir, dtype='float32'):
+    """Simulate the whole fleet into out_dir and write manifest.json; returns the manifest"""
+    if resolution not in RESOLUTIONS:
+        raise SystemExit(f"--resolution must be one of {RESOLUTIONS} minutes")
+    # Chunks are whole days starting at midnight
+    start_time = datetime(start_time.year, start_time.month, start_time.day)
+    os.makedirs(out_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(out_dir, 'fleet-*.npz')):
+        os.remove(stale)
+    site_seed, attack_seed, block_seed = np.random.SeedSequence(seed).spawn(3)
+    sites = sample_sites(site_count, np.random.default_rng(site_seed))
+    windows = list(windows) + random_windows(random_attacks, site_count, start_time, days,
+                                             np.random.default_rng(attack_seed))
+
+    blocks = [list(range(first, min(first + sites_per_block, site_count)))
+              for first in range(0, site_count, sites_per_block)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for block, (site_ids, seed_sequence) in enumerate(zip(blocks, block_seed.spawn(len(blocks)))):
+            block_sites = {name: values[site_ids] for name, values in sites.items()}
+            block_windows = [w for w in windows if set(w['sites']) & set(site_ids)]
+            futures.append(pool.submit(simulate_block, block, site_ids, block_sites, block_windows, days, chunk_days,
+                                       resolution, start_time, seed_sequence, out_dir, dtype))
+        shards = [shard for future in futures for shard in future.result()]
+
+    manifest = {
+        'sites': site_count, 'days': days, 'resolution_minutes': resolution, 'start': start_time.isoformat(),
+        'seed': seed, 'labels': ATTACK_TYPES, 'fields': SHARD_FIELDS, 'dtype': dtype,
+        'site_parameters': {name: values.round(3).tolist() for name, values in sites.items()},
+        'attack_windows': windows, 'shards': shards
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sites', type=int, default=100)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--resolution', type=int, default=60, help="minutes between readings")
+    parser.add_argument('--start', type=datetime.fromisoformat, default=START_TIME, help="first day (from midnight)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--attack', type=parse_attack, action='append', default=[],
+                        help="ATTACK:SITES:START/END, e.g. dos:0-9:2025-04-03T10:00/2025-04-03T16:00 (repeatable)")
+    parser.add_argument('--random-attacks', type=int, default=0, help="also inject this many random attack windows")
+    parser.add_argument('--sites-per-block', type=int, default=250)
+    parser.add_argument('--chunk-days', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32')
+    parser.add_argument('--out', default="./Data2/fleet")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = simulate_fleet(args.sites, args.days, args.resolution, args.start, args.seed, args.attack,
+                              args.random_attacks, args.sites_per_block, args.chunk_days, args.workers,
+                              args.out, args.dtype)
+    rows = sum(shard['rows'] for shard in manifest['shards'])
+    elapsed = time.perf_counter() - start
+    print(f"[✓] {args.sites} sites x {args.days} days, {rows:,} readings in {len(manifest['shards'])} shards "
+          f"saved to {args.out} in {elapsed:.1f}s ({rows / elapsed:,.0f} readings/s)")
+
+
+if __name__ == '__main__':
+    main()
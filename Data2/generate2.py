@@ -1,7 +1,16 @@
-import csv
+"""Simulate one day of household DER telemetry per run, clean or under attack.
+
+All runs of a scenario are generated together as (runs, hours) arrays from
+one seeded np.random.Generator; only the battery state recurrence steps
+through the hours, and each step is vectorized across runs.
+
+Usage (from the repository root):
+    python Data2/generate2.py --runs 50 --seed 0
+"""
+import argparse
 import os
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # Simulation parameters
 DAYS = 1
@@ -11,143 +20,209 @@ BATTERY_CAPACITY = 7.0
 BATTERY_DISCHARGE_RATE = 2.0
 TESLA_CHARGE_KW = 7.7
 HOME_BASE_LOAD = 1.5
+INITIAL_BATTERY_LEVEL = 3.5
+START_TIME = datetime(2025, 4, 1, 0, 0, 0)
 
 ATTACK_TYPES = ["clean", "mitm", "dos", "bd", "gm"]
 WEATHER_OPTIONS = ["sunny", "cloudy", "rainy"]
+WEATHER_PROBABILITIES = [0.6, 0.3, 0.1]
+# Solar output factor range per weather option
+WEATHER_SOLAR_FACTOR = np.array([[1.0, 1.0], [0.4, 0.7], [0.1, 0.4]])
 
-def solar_generation(hour, weather):
-    max_solar_output = 6.5
-    if 6 <= hour <= 18:
-        # Scale to π from 6 AM to 6 PM (12-hour daylight window)
-        base_solar = max_solar_output * np.sin(np.pi * (hour - 6) / 12)
-        if weather == "cloudy":
-            return base_solar * np.random.uniform(0.4, 0.7)
-        elif weather == "rainy":
-            return base_solar * np.random.uniform(0.1, 0.4)
-        return base_solar
-    else:
-        return 0.0  # Nighttime
-
-def simulate_appliance_load(hour, weather):
-    base = HOME_BASE_LOAD + np.random.normal(0., 0.1)
-
-    if weather in ["cloudy", "rainy"]:
-        base += np.random.uniform(0.1, 0.4)
-
-    if hour in [7, 8, 12, 18, 19]:
-        base += np.random.uniform(0.3, 0.6)
+COLUMNS = ["solar_generation", "home_load", "tesla_charger", "battery_charge",
+           "battery_discharge", "grid_import", "grid_export"]
+HEADERS = ["Timestamp", "Solar_Generation_kW", "Home_Load_kW", "Tesla_Charger_kW", "Battery_Charge_kWh",
+           "Battery_Discharge_kW", "Grid_Import_kW", "Grid_Export_kW"]
 
-    return round(base, 2)
-
-def tesla_charging_decision(hour, day_of_week):
-    if 17 <= hour <= 22 and np.random.rand() < 0.3:
-        return TESLA_CHARGE_KW
-    elif hour in [11, 12, 13, 18, 19] and np.random.rand() < 0.2:
-        return TESLA_CHARGE_KW
-    return 0.0
 
+def solar_generation(hours, weather, rng):
+    """Solar output (runs, hours) for the hour of day of each step and each run's weather index"""
+    max_solar_output = 6.5
+    # Scale to π from 6 AM to 6 PM (12-hour daylight window), zero at night
+    daylight = (hours >= 6) & (hours <= 18)
+    base_solar = np.where(daylight, max_solar_output * np.sin(np.pi * (hours - 6) / 12), 0.0)
+    low, high = WEATHER_SOLAR_FACTOR[weather].T
+    factor = rng.uniform(low[:, None], high[:, None], size=(len(weather), len(hours)))
+    return base_solar * factor
+
+
+def simulate_appliance_load(hours, weather, rng):
+    runs = len(weather)
+    base = HOME_BASE_LOAD + rng.normal(0., 0.1, size=(runs, len(hours)))
+    # Cloudy or rainy days keep more appliances on
+    base += (weather > 0)[:, None] * rng.uniform(0.1, 0.4, size=(runs, len(hours)))
+    # Morning, lunch and evening peaks
+    base += np.isin(hours, [7, 8, 12, 18, 19]) * rng.uniform(0.3, 0.6, size=(runs, len(hours)))
+    return np.round(base, 2)
+
+
+# Probability of starting to charge in an evening hour / a midday hour, weekday vs weekend
+EVENING_CHARGING = {'weekday': 0.3, 'weekend': 0.2}
+MIDDAY_CHARGING = {'weekday': 0.2, 'weekend': 0.35}
+
+
+def tesla_charging_decision(hours, day_of_week, runs, rng, charger_kw=TESLA_CHARGE_KW):
+    """Charger power (runs, hours); people charge at home more around midday at weekends.
+
+    charger_kw may be a scalar or one value per run, shaped (runs, 1).
+    """
+    weekend = np.asarray(day_of_week) >= 5
+    evening_p = np.where(weekend, EVENING_CHARGING['weekend'], EVENING_CHARGING['weekday'])
+    midday_p = np.where(weekend, MIDDAY_CHARGING['weekend'], MIDDAY_CHARGING['weekday'])
+    evening = (hours >= 17) & (hours <= 22) & (rng.random((runs, len(hours))) < evening_p)
+    midday = np.isin(hours, [11, 12, 13, 18, 19]) & (rng.random((runs, len(hours))) < midday_p)
+    return np.where(evening | midday, charger_kw, 0.0)
+
+
+def battery_dispatch(solar_kW, home_kW, tesla_kW, battery_level=INITIAL_BATTERY_LEVEL,
+                     capacity=BATTERY_CAPACITY, discharge_rate=BATTERY_DISCHARGE_RATE, step_hours=1.0, state=None):
+    """Charge the battery from surplus solar and discharge it to cover demand.
+
+    Steps through time (axis 1) once, vectorized across runs. capacity and
+    discharge_rate may be scalars or one value per run; step_hours is the
+    length of a step. Returns (battery level, battery discharge, grid
+    import, grid export), each (runs, steps). As in the original loop, a
+    step with surplus solar reports the previous deficit as grid import.
+    If a dict is passed as state, dispatch starts from its 'battery_level'
+    and 'needed_power' (when present) and leaves the final ones there, so
+    a long simulation can be run in chunks.
+    """
+    runs, steps = solar_kW.shape
+    state = {} if state is None else state
+    level = np.array(np.broadcast_to(state.get('battery_level', battery_level), runs), dtype=float)
+    needed_power = np.array(np.broadcast_to(state.get('needed_power', 0.0), runs), dtype=float)
+    capacity = np.broadcast_to(capacity, runs)
+    discharge_rate = np.broadcast_to(discharge_rate, runs)
+    battery = np.empty((runs, steps))
+    discharge = np.empty((runs, steps))
+    grid_import = np.empty((runs, steps))
+    grid_export = np.empty((runs, steps))
+    surplus = solar_kW - home_kW - tesla_kW
+    for step in range(steps):
+        s = surplus[:, step]
+        charging = s > 0
+        charge_power = np.where(charging, np.minimum(s, (capacity - level) / step_hours), 0.0)
+        discharge_kW = np.where(charging, 0.0, np.minimum(np.minimum(-s, level / step_hours), discharge_rate))
+        level = level + (charge_power - discharge_kW) * step_hours
+        needed_power = np.where(charging, needed_power, -s - discharge_kW)
+        battery[:, step] = level
+        discharge[:, step] = discharge_kW
+        grid_import[:, step] = np.maximum(needed_power, 0)
+        grid_export[:, step] = np.maximum(s - (level - charge_power * step_hours), 0)
+    state['battery_level'] = level
+    state['needed_power'] = needed_power
+    return battery, discharge, grid_import, grid_export
+
+
+def apply_attack(attack_type, data, hours, rng):
+    """Tamper with the columns in data in place; returns the mask of readings that are still reported"""
+    runs, steps = data['solar_generation'].shape
+    shape = (runs, steps)
+    reported = np.ones(shape, dtype=bool)
 
-def apply_attack(attack_type, data_entry, hour):
     if attack_type == "mitm":
         # MITM strictly alters solar data in impossible ways (night solar) and makes inconsistent battery readings
-        if 0 <= hour <= 5 or 20 <= hour <= 23:  # Night hours
-            # Add impossible solar generation at night
-            data_entry[1] = np.random.uniform(1.5, 3.0)
-        else:
-            # Alter daytime solar by random factors
-            data_entry[1] *= np.random.uniform(0.6, 1.4)
-        
+        night = (hours <= 5) | (hours >= 20)
+        data['solar_generation'] = np.where(night, rng.uniform(1.5, 3.0, size=shape),
+                                            data['solar_generation'] * rng.uniform(0.6, 1.4, size=shape))
         # Erratic battery behavior - inconsistent with energy equations
-        data_entry[4] = data_entry[4] * np.random.uniform(0.7, 1.3)
+        data['battery_charge'] = data['battery_charge'] * rng.uniform(0.7, 1.3, size=shape)
 
     elif attack_type == "dos":
         # DoS strictly removes data points or zeros critical values
-        if 10 <= hour <= 14 or 18 <= hour <= 20:
-            # Higher chance of complete data loss during peak hours
-            if np.random.rand() < 0.8:
-                return None
-        
+        peak = ((hours >= 10) & (hours <= 14)) | ((hours >= 18) & (hours <= 20))
+        # Higher chance of complete data loss during peak hours
+        reported = ~(peak & (rng.random(shape) < 0.8))
         # Sometimes zero out critical values
-        if np.random.rand() < 0.3:
-            data_entry[1] = 0.0  # Solar
-            data_entry[4] = 0.0  # Battery
+        zeroed = rng.random(shape) < 0.3
+        data['solar_generation'] = np.where(zeroed, 0.0, data['solar_generation'])
+        data['battery_charge'] = np.where(zeroed, 0.0, data['battery_charge'])
 
     elif attack_type == "bd":  # Battery Drain
         # Always force high home load and constant Tesla charging
-        data_entry[2] = HOME_BASE_LOAD + np.random.uniform(2.0, 3.5)  # High home load
-        data_entry[3] = TESLA_CHARGE_KW  # Always charging Tesla
-        
+        data['home_load'] = HOME_BASE_LOAD + rng.uniform(2.0, 3.5, size=shape)
+        data['tesla_charger'] = np.full(shape, TESLA_CHARGE_KW)
         # Battery depletes faster
-        data_entry[4] = max(0.5, data_entry[4] - np.random.uniform(0.5, 1.0))
+        data['battery_charge'] = np.maximum(0.5, data['battery_charge'] - rng.uniform(0.5, 1.0, size=shape))
 
     elif attack_type == "gm":  # Grid Manipulation
         # Always create grid anomalies - either negative values or very high values
-        if np.random.rand() < 0.5:
-            # Impossible negative grid import values
-            data_entry[6] = -np.random.uniform(1.0, 5.0)
-        else:
-            # Abnormally high grid values
-            multiplier = np.random.uniform(3.0, 8.0)
-            if np.random.rand() < 0.5:
-                data_entry[6] *= multiplier  # Import
-            else:
-                data_entry[7] *= multiplier  # Export
-
-    return data_entry
-
-# Ensure output directory exists
-os.makedirs("./Data2/Logs2", exist_ok=True)
-
-# Run simulation for each attack type, 10 times each
-for attack_type in ATTACK_TYPES:
-    for i in range(50):
-        start_time = datetime(2025, 4, 1, 0, 0, 0)
-        battery_level = 3.5
-        data = []
-
-        weather = np.random.choice(WEATHER_OPTIONS, p=[0.6, 0.3, 0.1])
-
-        for day in range(DAYS):
-            for hour in range(HOURS_PER_DAY):
-                timestamp = start_time + timedelta(hours=day * 24 + hour)
-                solar_kW = round(solar_generation(hour, weather), 2)
-                home_kW = simulate_appliance_load(hour, weather)
-                tesla_kW = tesla_charging_decision(hour, day % 7)
-
-                charge_power = 0.0
-                if solar_kW > (home_kW + tesla_kW):
-                    charge_power = min(solar_kW - home_kW - tesla_kW, BATTERY_CAPACITY - battery_level)
-                    battery_level += charge_power
-                    battery_discharge_kW = 0.0
-                else:
-                    needed_power = home_kW + tesla_kW - solar_kW
-                    battery_discharge_kW = min(needed_power, battery_level, BATTERY_DISCHARGE_RATE)
-                    battery_level -= battery_discharge_kW
-                    needed_power -= battery_discharge_kW
-
-                grid_import_kW = max(0, needed_power)
-                grid_export_kW = max(0, solar_kW - home_kW - tesla_kW - (battery_level - charge_power))
-
-                data_entry = [
-                    timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    round(solar_kW, 2),
-                    round(home_kW, 2),
-                    round(tesla_kW, 2),
-                    round(battery_level, 2),
-                    round(battery_discharge_kW, 2),
-                    round(grid_import_kW, 2),
-                    round(grid_export_kW, 2)
-                ]
-
-                modified_entry = apply_attack(attack_type, data_entry, hour)
-                if modified_entry:
-                    data.append(modified_entry)
-
-        # Write to CSV with a numbered suffix
-        filename = f"./Data2/Logs2/{attack_type}/{attack_type}_simulation_log_{i+1}.csv"
+        negative = rng.random(shape) < 0.5
+        multiplier = rng.uniform(3.0, 8.0, size=shape)
+        on_import = rng.random(shape) < 0.5
+        grid_import = data['grid_import']
+        data['grid_import'] = np.where(negative, -rng.uniform(1.0, 5.0, size=shape),
+                                       np.where(on_import, grid_import * multiplier, grid_import))
+        data['grid_export'] = np.where(~negative & ~on_import, data['grid_export'] * multiplier, data['grid_export'])
+
+    return reported
+
+
+def simulate_runs(attack_type, runs, rng, days=DAYS, start_time=START_TIME):
+    """Simulate `runs` independent households for one scenario.
+
+    Returns a dict with 'timestamp' (datetime64[s], one per step), each of
+    COLUMNS as a (runs, steps) array, 'reported' (False where the reading
+    was dropped by the attack) and 'weather' (index into WEATHER_OPTIONS
+    per run).
+    """
+    steps = np.arange(days * HOURS_PER_DAY)
+    hours = steps % HOURS_PER_DAY
+    day_of_week = (start_time.weekday() + steps // HOURS_PER_DAY) % 7
+    timestamps = np.datetime64(start_time, 's') + steps.astype('timedelta64[h]')
+
+    weather = rng.choice(len(WEATHER_OPTIONS), size=runs, p=WEATHER_PROBABILITIES)
+    solar_kW = np.round(solar_generation(hours, weather, rng), 2)
+    home_kW = simulate_appliance_load(hours, weather, rng)
+    tesla_kW = tesla_charging_decision(hours, day_of_week, runs, rng)
+    battery_level, discharge_kW, grid_import_kW, grid_export_kW = battery_dispatch(solar_kW, home_kW, tesla_kW)
+
+    data = {
+        'solar_generation': solar_kW,
+        'home_load': home_kW,
+        'tesla_charger': tesla_kW,
+        'battery_charge': np.round(battery_level, 2),
+        'battery_discharge': np.round(discharge_kW, 2),
+        'grid_import': np.round(grid_import_kW, 2),
+        'grid_export': np.round(grid_export_kW, 2)
+    }
+    data['reported'] = apply_attack(attack_type, data, hours, rng)
+    data['timestamp'] = timestamps
+    data['weather'] = weather
+    return data
+
+
+def write_csv_logs(data, attack_type, out_dir, first_index=1):
+    """Write one CSV per run as <out_dir>/<attack>/<attack>_simulation_log_<n>.csv; returns the paths"""
+    os.makedirs(os.path.join(out_dir, attack_type), exist_ok=True)
+    timestamps = np.char.replace(np.datetime_as_string(data['timestamp'], unit='s'), 'T', ' ')
+    values = np.stack([data[name] for name in COLUMNS], axis=-1)
+    paths = []
+    for run in range(values.shape[0]):
+        rows = np.flatnonzero(data['reported'][run])
+        lines = [",".join(HEADERS)]
+        lines.extend(f"{timestamps[i]},{','.join(map(str, values[run, i].tolist()))}" for i in rows)
+        filename = os.path.join(out_dir, attack_type, f"{attack_type}_simulation_log_{first_index + run}.csv")
         with open(filename, "w", newline="") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Timestamp", "Solar_Generation_kW", "Home_Load_kW", "Tesla_Charger_kW", "Battery_Charge_kWh", "Battery_Discharge_kW", "Grid_Import_kW", "Grid_Export_kW"])
-            writer.writerows(data)
+            file.write("\n".join(lines) + "\n")
+        paths.append(filename)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=50, help="runs per attack type")
+    parser.add_argument('--days', type=int, default=DAYS)
+    parser.add_argument('--seed', type=int, default=None, help="seed for np.random.default_rng")
+    parser.add_argument('--out', default="./Data2/Logs2")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for attack_type in ATTACK_TYPES:
+        data = simulate_runs(attack_type, args.runs, rng, days=args.days)
+        paths = write_csv_logs(data, attack_type, args.out)
+        print(f"[✓] {len(paths)} logs saved to {os.path.join(args.out, attack_type)}")
+
 
-        print(f"[✓] Log saved: {filename}")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Generate a labelled dataset as a few large columnar shards instead of one CSV per run.
+
+Runs are split into shards of --runs-per-shard runs of one attack type, and
+the shards are simulated in a process pool. Each shard draws from its own
+np.random.Generator spawned from --seed, so the dataset is reproducible
+whatever the number of workers.
+
+A shard holds only the reported readings, flattened: 'timestamp'
+(datetime64[s]), 'hour', the seven telemetry columns, 'label' (index into
+'labels') and 'run_id' (unique across the dataset). Shards are .npz by
+default or Parquet with --format parquet (needs pyarrow). manifest.json
+lists the shards. --csv exports the old per-run CSV layout as well.
+
+Usage (from the repository root):
+    python Data2/generate_shards.py --model generate2 --runs 20000 --workers 8 --out ./Data2/shards
+    python Data2/generate_shards.py --export-csv ./Data2/shards --out ./Data2/Logs2
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import generate
+import generate2
+from generate2 import ATTACK_TYPES, COLUMNS, HEADERS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # only needed for --format parquet
+    pyarrow = None
+
+MODELS = {'generate': generate.simulate_runs, 'generate2': generate2.simulate_runs}
+SHARD_FIELDS = ['timestamp', 'hour'] + COLUMNS + ['label', 'run_id']
+
+
+def shard_tasks(runs, runs_per_shard, seed):
+    """(attack type, first run id, runs, seed sequence) per shard, run ids numbered across the dataset"""
+    tasks = []
+    for attack_index, attack_type in enumerate(ATTACK_TYPES):
+        for start in range(0, runs, runs_per_shard):
+            tasks.append([attack_type, attack_index * runs + start, min(runs_per_shard, runs - start)])
+    for task, seed_sequence in zip(tasks, np.random.SeedSequence(seed).spawn(len(tasks))):
+        task.append(seed_sequence)
+    return tasks
+
+
+def flatten_runs(data, attack_type, first_run_id):
+    """(runs, steps) simulator output -> one row per reported reading"""
+    runs, steps = data['reported'].shape
+    run_index, step_index = np.nonzero(data['reported'])
+    timestamps = data['timestamp'][step_index]
+    columns = {
+        'timestamp': timestamps,
+        'hour': ((timestamps - timestamps.astype('datetime64[D]')).astype(np.int64) // 3600).astype(np.int8)
+    }
+    for name in COLUMNS:
+        columns[name] = np.broadcast_to(data[name], (runs, steps))[run_index, step_index]
+    columns['label'] = np.full(len(run_index), ATTACK_TYPES.index(attack_type), dtype=np.int8)
+    columns['run_id'] = (first_run_id + run_index).astype(np.int64)
+    return columns
+
+
+def write_shard(columns, path, fmt):
+    if fmt == 'parquet':
+        table = pyarrow.table({name: columns[name] for name in SHARD_FIELDS})
+        table = table.replace_schema_metadata({'labels': json.dumps(ATTACK_TYPES)})
+        pyarrow.parquet.write_table(table, path)
+    else:
+        np.savez(path, labels=np.array(ATTACK_TYPES), **columns)
+
+
+def generate_shard(model, attack_type, first_run_id, runs, seed_sequence, days, path, fmt):
+    """Simulate and write one shard; runs in a worker process"""
+    rng = np.random.default_rng(seed_sequence)
+    data = MODELS[model](attack_type, runs, rng, days=days)
+    columns = flatten_runs(data, attack_type, first_run_id)
+    write_shard(columns, path, fmt)
+    return {'path': os.path.basename(path), 'label': attack_type, 'first_run_id': first_run_id,
+            'runs': runs, 'rows': len(columns['run_id'])}
+
+
+def load_shard(path):
+    """Columns of one shard as a dict of arrays, plus the label names under 'labels'"""
+    if path.endswith('.parquet'):
+        table = pyarrow.parquet.read_table(path)
+        columns = {name: table.column(name).to_numpy() for name in table.column_names}
+        columns['labels'] = np.array(json.loads(table.schema.metadata[b'labels']))
+        return columns
+    with np.load(path) as shard:
+        return {name: shard[name] for name in shard.files}
+
+
+def load_manifest(shard_dir):
+    with open(os.path.join(shard_dir, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def run_bounds(run_ids):
+    """(start, end) row range of each run; the rows of a run are contiguous and in time order"""
+    starts = np.flatnonzero(np.diff(run_ids, prepend=-1))
+    return zip(starts.tolist(), np.append(starts[1:], len(run_ids)).tolist())
+
+
+def iter_runs(columns):
+    """Yield (run_id, label, columns) per run of a loaded shard, columns shaped like der_logs.parse_csv_log's"""
+    for start, end in run_bounds(columns['run_id']):
+        label = str(columns['labels'][columns['label'][start]])
+        yield int(columns['run_id'][start]), label, {name: columns[name][start:end] for name in ['timestamp', 'hour'] + COLUMNS}
+
+
+def export_csv(shard_dir, out_dir):
+    """Write every run of a shard dataset as <out_dir>/<attack>/<attack>_simulation_log_<n>.csv"""
+    manifest = load_manifest(shard_dir)
+    written = 0
+    for shard in manifest['shards']:
+        columns = load_shard(os.path.join(shard_dir, shard['path']))
+        timestamps = np.char.replace(np.datetime_as_string(columns['timestamp'], unit='s'), 'T', ' ')
+        values = np.stack([columns[name] for name in COLUMNS], axis=-1)
+        os.makedirs(os.path.join(out_dir, shard['label']), exist_ok=True)
+        for start, end in run_bounds(columns['run_id']):
+            lines = [",".join(HEADERS)]
+            lines.extend(f"{timestamps[i]},{','.join(map(str, values[i].tolist()))}" for i in range(start, end))
+            # Numbered from 1 within each attack type, as generate2.py names them
+            number = int(columns['run_id'][start]) % manifest['runs_per_label'] + 1
+            filename = os.path.join(out_dir, shard['label'], f"{shard['label']}_simulation_log_{number}.csv")
+            with open(filename, "w", newline="") as f:
+                f.write("\n".join(lines) + "\n")
+            written += 1
+    return written
+
+
+def generate_dataset(model, runs, runs_per_shard, days, seed, workers, out_dir, fmt):
+    """Generate all shards in a process pool and write manifest.json; returns the manifest"""
+    if fmt == 'parquet' and pyarrow is None:
+        raise SystemExit("--format parquet needs pyarrow installed")
+    os.makedirs(out_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(out_dir, 'shard-*')):
+        os.remove(stale)
+    suffix = '.parquet' if fmt == 'parquet' else '.npz'
+    tasks = shard_tasks(runs, runs_per_shard, seed)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(generate_shard, model, attack_type, first_run_id, count, seed_sequence, days,
+                               os.path.join(out_dir, f"shard-{i:05d}{suffix}"), fmt)
+                   for i, (attack_type, first_run_id, count, seed_sequence) in enumerate(tasks)]
+        shards = [future.result() for future in futures]
+    manifest = {'model': model, 'runs_per_label': runs, 'days': days, 'seed': seed, 'format': fmt,
+                'labels': ATTACK_TYPES, 'fields': SHARD_FIELDS, 'shards': shards}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=sorted(MODELS), default='generate2')
+    parser.add_argument('--runs', type=int, default=1000, help="runs per attack type")
+    parser.add_argument('--runs-per-shard', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=generate2.DAYS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz')
+    parser.add_argument('--out', default="./Data2/shards")
+    parser.add_argument('--csv', metavar='DIR', help="also export the per-run CSV layout to DIR")
+    parser.add_argument('--export-csv', metavar='SHARD_DIR', help="only export an existing shard dataset to --out as CSVs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.export_csv:
+        written = export_csv(args.export_csv, args.out)
+        print(f"[✓] {written} logs exported to {args.out} in {time.perf_counter() - start:.1f}s")
+        return
+
+    manifest = generate_dataset(args.model, args.runs, args.runs_per_shard, args.days, args.seed,
+                                args.workers, args.out, args.format)
+    rows = sum(shard['rows'] for shard in manifest['shards'])
+    print(f"[✓] {len(manifest['shards'])} shards, {rows:,} rows saved to {args.out} in {time.perf_counter() - start:.1f}s")
+    if args.csv:
+        written = export_csv(args.out, args.csv)
+        print(f"[✓] {written} logs exported to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()